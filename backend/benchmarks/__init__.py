@@ -0,0 +1 @@
+# Performance benchmarks for the backend API (run from backend/: python -m benchmarks.<name>)
@@ -0,0 +1,205 @@
+"""
+In-process load test for the device API.
+
+Drives src.main:app over ASGI (no network) against the in-memory backend and the
+fake Cosmos DB client, at configurable dataset sizes, and reports throughput and
+p50/p95/p99 latency per scenario. Each backend/dataset combination runs in its own
+subprocess because the repository backend is selected from the environment.
+
+Run from backend/:
+    uv run --with httpx python -m benchmarks.api_bench
+    uv run --with httpx python -m benchmarks.api_bench --backend memory --dataset-size 1000 --dataset-size 100000
+    uv run --with httpx python -m benchmarks.api_bench --save-baseline benchmarks/baselines/local.json
+    uv run --with httpx python -m benchmarks.api_bench --compare benchmarks/baselines/local.json
+    uv run --with httpx python -m benchmarks.api_bench --list-cache
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+from typing import Dict, List
+
+from benchmarks.harness import (
+    compare_to_baseline,
+    print_table,
+    run_load,
+    run_metadata,
+    save_results,
+)
+
+BACKENDS: Dict[str, Dict[str, str]] = {
+    "memory": {"TEST_MODE": "true"},
+    "fake-cosmos": {"TEST_MODE": "false", "COSMOS_ENDPOINT": "fake://bench"},
+}
+
+SCENARIOS = ("crud-mix", "deep-pagination", "large-list")
+
+
+def _crud_mix(client, device_ids: List[str], rng: random.Random):
+    """60% point reads, 20% first-page lists, 10% updates, 5% creates, 5% deletes."""
+    created: List[str] = []
+
+    async def operation(index: int) -> bool:
+        roll = rng.random()
+        if roll < 0.60:
+            response = await client.get(f"/devices/{rng.choice(device_ids)}")
+        elif roll < 0.80:
+            response = await client.get("/devices", params={"limit": 20})
+        elif roll < 0.90:
+            response = await client.put(
+                f"/devices/{rng.choice(device_ids)}",
+                json={"assigned_to": f"User-{rng.randrange(1000)}"},
+            )
+        elif roll < 0.95 or not created:
+            response = await client.post("/devices", json={"name": f"Bench-{index}"})
+            if response.status_code == 201:
+                created.append(response.json()["id"])
+        else:
+            response = await client.delete(f"/devices/{created.pop()}")
+        return response.status_code < 400
+
+    return operation
+
+
+def _deep_pagination(client, device_ids: List[str], rng: random.Random):
+    """Pages of 50 from the last 10% of the listing."""
+    total = len(device_ids)
+
+    async def operation(index: int) -> bool:
+        skip = rng.randrange(int(total * 0.9), max(int(total * 0.9) + 1, total - 50))
+        response = await client.get("/devices", params={"skip": skip, "limit": 50})
+        return response.status_code == 200
+
+    return operation
+
+
+def _large_list(client, device_ids: List[str], rng: random.Random):
+    """First page with up to 1000 devices."""
+    limit = min(1000, len(device_ids))
+
+    async def operation(index: int) -> bool:
+        response = await client.get("/devices", params={"limit": limit})
+        return response.status_code == 200
+
+    return operation
+
+
+_SCENARIO_FACTORIES = {
+    "crud-mix": _crud_mix,
+    "deep-pagination": _deep_pagination,
+    "large-list": _large_list,
+}
+
+
+async def _seed(count: int, seed: int) -> List[str]:
+    from src.seeding import seed_devices
+
+    return await seed_devices(count, random_seed=seed)
+
+
+async def _run_child(args) -> Dict[str, dict]:
+    """Benchmark one backend/dataset size inside this (already configured) process."""
+    import httpx
+
+    from src.main import app
+
+    rng = random.Random(args.seed)
+    results = {}
+    async with app.router.lifespan_context(app):
+        device_ids = await _seed(args.dataset_size[0], args.seed)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in args.scenario:
+                operation = _SCENARIO_FACTORIES[scenario](client, device_ids, rng)
+                results[scenario] = await run_load(
+                    operation,
+                    total=args.requests,
+                    concurrency=args.concurrency,
+                    warmup=min(50, args.requests // 10),
+                )
+    return results
+
+
+def _spawn_child(backend: str, dataset_size: int, args) -> Dict[str, dict]:
+    command = [
+        sys.executable, "-m", "benchmarks.api_bench", "--child",
+        "--backend", backend,
+        "--dataset-size", str(dataset_size),
+        "--requests", str(args.requests),
+        "--concurrency", str(args.concurrency),
+        "--seed", str(args.seed),
+    ]
+    for scenario in args.scenario:
+        command += ["--scenario", scenario]
+    if args.verbose:
+        command.append("--verbose")
+
+    # Results come back on stdout, so application logs go to stderr. Repeated
+    # listings would otherwise be served from the list cache, not the repository
+    env = {
+        **os.environ,
+        **BACKENDS[backend],
+        "LOG_STREAM": "stderr",
+        "LIST_CACHE_ENABLED": "true" if args.list_cache else "false",
+    }
+    output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(output.stdout)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", action="append", choices=sorted(BACKENDS), help="Backend(s) to benchmark (default: all)")
+    parser.add_argument("--dataset-size", action="append", type=int, help="Devices seeded before measuring (default: 1000 and 10000)")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="Scenario(s) to run (default: all)")
+    parser.add_argument("--requests", type=int, default=2000, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent in-flight requests")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for request mixes")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write results as a new baseline JSON")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with a baseline JSON and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (default: 0.2)")
+    parser.add_argument("--list-cache", action="store_true", help="Serve repeated listings from the list cache")
+    parser.add_argument("--verbose", action="store_true", help="Keep application INFO logging enabled")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    args.scenario = args.scenario or list(SCENARIOS)
+
+    if args.child:
+        if not args.verbose:
+            logging.disable(logging.INFO)
+        results = asyncio.run(_run_child(args))
+        json.dump(results, sys.stdout)
+        return 0
+
+    results: Dict[str, dict] = {}
+    for backend in args.backend or list(BACKENDS):
+        for dataset_size in args.dataset_size or [1000, 10000]:
+            print(f"Running {backend} with {dataset_size} devices...", file=sys.stderr)
+            for scenario, result in _spawn_child(backend, dataset_size, args).items():
+                results[f"{backend}/n={dataset_size}/{scenario}"] = result
+
+    print_table(results)
+
+    meta = run_metadata(requests=args.requests, concurrency=args.concurrency, seed=args.seed, list_cache=args.list_cache)
+    for path in filter(None, (args.output, args.save_baseline)):
+        save_results(path, results, meta)
+        print(f"Results written to {path}", file=sys.stderr)
+
+    if args.compare:
+        regressions = compare_to_baseline(results, args.compare, threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
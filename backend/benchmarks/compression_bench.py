@@ -0,0 +1,95 @@
+"""
+Bytes saved vs. CPU spent by response compression.
+
+Renders `GET /devices` pages of several sizes from a seeded in-memory dataset,
+then for each encoding available in this process (gzip, plus br/zstd when the
+brotli/zstandard packages are installed) reports:
+- ratio and bytes saved per response
+- CPU time to compress one response (median of --repeat runs)
+- end-to-end p50 latency and throughput over ASGI with that Accept-Encoding
+
+Run from backend/:
+    uv run --with httpx python -m benchmarks.compression_bench
+    uv run --with httpx --with brotli --with zstandard python -m benchmarks.compression_bench --page-size 100 --page-size 1000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+from benchmarks.harness import print_table, run_load, run_metadata, save_results
+
+
+async def _run(args) -> Dict[str, dict]:
+    import httpx
+
+    from src.main import app
+    from src.middleware.compression import _Compressor, available_encodings, get_compression_config
+    from src.seeding import seed_devices
+
+    config = get_compression_config()
+    results: Dict[str, dict] = {}
+    async with app.router.lifespan_context(app):
+        await seed_devices(args.dataset_size, random_seed=42)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for page_size in args.page_size:
+                params = {"limit": page_size}
+                raw = (await client.get("/devices", params=params, headers={"accept-encoding": "identity"})).content
+
+                for encoding in ["identity"] + available_encodings():
+                    if encoding == "identity":
+                        size, cpu_ms = len(raw), 0.0
+                    else:
+                        timings: List[float] = []
+                        for _ in range(args.repeat):
+                            started = time.process_time()
+                            compressor = _Compressor(encoding, config)
+                            size = len(compressor.compress(raw, flush=False) + compressor.finish())
+                            timings.append((time.process_time() - started) * 1000)
+                        cpu_ms = statistics.median(timings)
+
+                    async def operation(index: int, encoding=encoding) -> bool:
+                        response = await client.get("/devices", params=params, headers={"accept-encoding": encoding})
+                        return response.status_code == 200
+
+                    load = await run_load(operation, total=args.requests, concurrency=args.concurrency, warmup=10)
+                    results[f"page={page_size}/{encoding}"] = {
+                        "bytes": size,
+                        "ratio": round(len(raw) / size, 2),
+                        "saved_kb": round((len(raw) - size) / 1024, 1),
+                        "cpu_ms": round(cpu_ms, 3),
+                        "p50_ms": load["p50_ms"],
+                        "throughput_rps": load["throughput_rps"],
+                    }
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, action="append", help="Devices per page (repeatable, default: 100 and 1000)")
+    parser.add_argument("--dataset-size", type=int, default=5000, help="Devices seeded before measuring")
+    parser.add_argument("--repeat", type=int, default=50, help="Compressions per encoding for the CPU median")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per encoding for latency/throughput")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent in-flight requests")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    args = parser.parse_args(argv)
+    args.page_size = args.page_size or [100, 1000]
+
+    os.environ.setdefault("TEST_MODE", "true")
+    os.environ.setdefault("REPOSITORY_BACKEND", "memory")
+    logging.disable(logging.INFO)
+
+    results = asyncio.run(_run(args))
+    print_table(results, columns=("bytes", "ratio", "saved_kb", "cpu_ms", "p50_ms", "throughput_rps"))
+    if args.output:
+        save_results(args.output, results, run_metadata(**vars(args)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
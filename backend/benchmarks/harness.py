@@ -0,0 +1,123 @@
+"""
+Shared helpers for the benchmark scripts: load generation, latency statistics
+and baseline comparison.
+"""
+import asyncio
+import json
+import math
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+# An operation returns True on success; raising also counts as an error
+Operation = Callable[[int], Awaitable[bool]]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies_ms: List[float], errors: int, elapsed_s: float) -> dict:
+    """Throughput and latency percentiles for one benchmark run."""
+    ordered = sorted(latencies_ms)
+    count = len(ordered)
+    return {
+        "requests": count,
+        "errors": errors,
+        "elapsed_s": round(elapsed_s, 4),
+        "throughput_rps": round(count / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+        "mean_ms": round(sum(ordered) / count, 4) if count else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 4),
+        "p95_ms": round(percentile(ordered, 95), 4),
+        "p99_ms": round(percentile(ordered, 99), 4),
+        "max_ms": round(ordered[-1], 4) if count else 0.0,
+    }
+
+
+async def run_load(operation: Operation, total: int, concurrency: int, warmup: int = 0) -> dict:
+    """
+    Run `total` operations across `concurrency` workers (closed loop) and summarize.
+    The first `warmup` operations are executed but not measured.
+    """
+    for i in range(warmup):
+        await operation(-1 - i)
+
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index, errors
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                ok = await operation(index)
+            except Exception:
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def run_metadata(**extra) -> dict:
+    """Environment details stored alongside results."""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        **extra,
+    }
+
+
+def print_table(results: Dict[str, dict], columns=("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "errors")) -> None:
+    """Print results as an aligned text table."""
+    width = max([len("benchmark")] + [len(name) for name in results])
+    print(f"{'benchmark':<{width}}  " + "  ".join(f"{c:>14}" for c in columns))
+    for name, result in results.items():
+        print(f"{name:<{width}}  " + "  ".join(f"{str(result.get(c, '')):>14}" for c in columns))
+
+
+def save_results(path: str, results: Dict[str, dict], meta: dict) -> None:
+    """Write results (and run metadata) as JSON."""
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(json.dumps({"meta": meta, "results": results}, indent=2) + "\n")
+
+
+def compare_to_baseline(
+    results: Dict[str, dict],
+    baseline_path: str,
+    threshold: float = 0.2,
+    lower_is_better=("p95_ms", "p99_ms"),
+    higher_is_better=("throughput_rps",),
+) -> List[str]:
+    """
+    Compare results with a saved baseline.
+    Returns a description of every metric that regressed by more than `threshold`.
+    """
+    baseline = json.loads(Path(baseline_path).read_text())["results"]
+    regressions = []
+    for name, result in results.items():
+        base: Optional[dict] = baseline.get(name)
+        if base is None:
+            continue
+        for metric in lower_is_better:
+            if base.get(metric) and result[metric] > base[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {result[metric]}")
+        for metric in higher_is_better:
+            if base.get(metric) and result[metric] < base[metric] * (1 - threshold):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {result[metric]}")
+    return regressions
@@ -0,0 +1,157 @@
+"""
+Event-loop stall caused by logging to a slow stdout.
+
+Each mode runs in a child process whose stdout is a pipe drained slowly by this
+process, like a container log driver under pressure. The child logs one JSON
+line per simulated request from the event loop while a ticker task measures
+loop lag:
+- "sync": StreamHandler writing to stdout on the caller's thread (previous setup)
+- "queue": src.logging_config (queue + background writer thread)
+
+Reports time spent inside log calls and the loop lag they cause.
+
+Run from backend/:
+    python -m benchmarks.logging_stall
+    python -m benchmarks.logging_stall --lines 50000 --drain-delay-ms 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import List
+
+from benchmarks.harness import percentile, print_table, run_metadata, save_results
+
+MODES = ("sync", "queue")
+
+
+def _configure(mode: str, queue_size: int) -> None:
+    from src.logging_config import JsonFormatter, configure_logging
+
+    if mode == "sync":
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.INFO)
+    else:
+        configure_logging({"level": "INFO", "format": "json", "queue_size": queue_size, "sample_rates": {}})
+
+
+async def _run_child(args) -> dict:
+    _configure(args.mode, args.queue_size)
+    logger = logging.getLogger("src.repositories.bench")
+    device_ids = [str(uuid.uuid4()) for _ in range(1000)]
+
+    lags: List[float] = []
+    done = False
+
+    async def ticker() -> None:
+        interval = 0.001
+        while not done:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+
+    call_ms: List[float] = []
+    started = time.perf_counter()
+    for i in range(args.lines):
+        call_started = time.perf_counter()
+        logger.info("Created device: %s", device_ids[i % len(device_ids)])
+        call_ms.append((time.perf_counter() - call_started) * 1000)
+        # One log line per request; let other tasks run in between
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    done = True
+    await tick_task
+
+    from src import metrics
+
+    call_ms.sort()
+    lags.sort()
+    dropped = metrics.snapshot("log_records_dropped_total").get("log_records_dropped_total", {}).get("value", 0)
+    return {
+        "lines": args.lines,
+        "elapsed_s": round(elapsed, 3),
+        "log_call_p50_ms": round(percentile(call_ms, 50), 4),
+        "log_call_p99_ms": round(percentile(call_ms, 99), 4),
+        "log_call_max_ms": round(call_ms[-1], 4),
+        "stall_total_ms": round(sum(call_ms), 1),
+        "loop_lag_p99_ms": round(percentile(lags, 99), 3),
+        "loop_lag_max_ms": round(lags[-1], 3) if lags else 0.0,
+        "dropped": int(dropped),
+    }
+
+
+def _drain_slowly(stream, chunk_size: int, delay_s: float) -> None:
+    while stream.read(chunk_size):
+        time.sleep(delay_s)
+
+
+def _spawn_child(mode: str, args) -> dict:
+    command = [
+        sys.executable, "-m", "benchmarks.logging_stall", "--child",
+        "--mode", mode,
+        "--lines", str(args.lines),
+        "--queue-size", str(args.queue_size),
+    ]
+    child = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    drainer = threading.Thread(
+        target=_drain_slowly,
+        args=(child.stdout, args.drain_chunk_bytes, args.drain_delay_ms / 1000),
+        daemon=True,
+    )
+    drainer.start()
+    # stdout is consumed by the drainer; results arrive on stderr
+    stderr = child.stderr.read()
+    child.wait()
+    drainer.join()
+    if child.returncode:
+        raise RuntimeError(f"{mode} run failed:\n{stderr.decode()}")
+    return json.loads(stderr.decode().strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", action="append", choices=MODES, help="Logging setup(s) to measure (default: all)")
+    parser.add_argument("--lines", type=int, default=20000, help="Log lines per run")
+    parser.add_argument("--queue-size", type=int, default=10000, help="LOG_QUEUE_SIZE for the queue mode")
+    parser.add_argument("--drain-chunk-bytes", type=int, default=4096, help="Bytes the slow reader takes at a time")
+    parser.add_argument("--drain-delay-ms", type=float, default=2.0, help="Pause of the slow reader after each chunk")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        args.mode = args.mode[0]
+        result = asyncio.run(_run_child(args))
+        from src.logging_config import stop_logging
+
+        stop_logging()
+        print(json.dumps(result), file=sys.stderr)
+        return 0
+
+    results = {}
+    for mode in args.mode or MODES:
+        print(f"Measuring {mode}...", file=sys.stderr)
+        results[mode] = _spawn_child(mode, args)
+
+    print_table(
+        results,
+        columns=("log_call_p99_ms", "log_call_max_ms", "stall_total_ms", "loop_lag_p99_ms", "loop_lag_max_ms", "dropped"),
+    )
+    if args.output:
+        save_results(args.output, results, run_metadata(**vars(args)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
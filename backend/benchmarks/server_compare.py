@@ -0,0 +1,166 @@
+"""
+Throughput comparison of server setups over real HTTP.
+
+Starts each setup as a subprocess on a free port and drives it with several
+client processes:
+- "single": plain `uvicorn src.main:app` (the previous Dockerfile command)
+- "production": `python -m src.server` (workers per CPU, uvloop, httptools)
+
+The backend defaults to REPOSITORY_BACKEND=shared_memory with TEST_MODE=true so
+every worker serves the same data without Azure access.
+
+Run from backend/:
+    uv run --with httpx python -m benchmarks.server_compare
+    uv run --with httpx python -m benchmarks.server_compare --duration-requests 20000 --client-processes 4 --workers 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.harness import print_table, run_metadata, save_results, summarize
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not become ready")
+
+
+def _client_process(base_url: str, requests: int, concurrency: int, queue) -> None:
+    """Closed-loop load from one process; reports raw latencies."""
+    import httpx
+
+    async def run() -> None:
+        latencies: List[float] = []
+        errors = 0
+        remaining = requests
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+            device_ids = [d["id"] for d in (await client.get("/devices")).json()]
+
+            async def worker(n: int) -> None:
+                nonlocal remaining, errors
+                while remaining > 0:
+                    remaining -= 1
+                    started = time.perf_counter()
+                    try:
+                        # Mostly point reads with some first-page lists
+                        if remaining % 5:
+                            response = await client.get(f"/devices/{device_ids[remaining % len(device_ids)]}")
+                        else:
+                            response = await client.get("/devices", params={"limit": 20})
+                        ok = response.status_code == 200
+                    except httpx.HTTPError:
+                        ok = False
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    errors += not ok
+
+            await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        queue.put((latencies, errors))
+
+    asyncio.run(run())
+
+
+def _measure(command: List[str], env: Dict[str, str], args) -> dict:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**env, "PORT": str(port)}
+    server = subprocess.Popen(
+        [part.replace("{port}", str(port)) for part in command],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_ready(base_url)
+        queue = multiprocessing.Queue()
+        per_client = args.requests // args.client_processes
+        clients = [
+            multiprocessing.Process(
+                target=_client_process,
+                args=(base_url, per_client, args.concurrency, queue),
+            )
+            for _ in range(args.client_processes)
+        ]
+        started = time.perf_counter()
+        for client in clients:
+            client.start()
+        reports = [queue.get() for _ in clients]
+        elapsed = time.perf_counter() - started
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies = [latency for report, _ in reports for latency in report]
+    errors = sum(errors for _, errors in reports)
+    return summarize(latencies, errors, elapsed)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10000, help="Total requests per setup")
+    parser.add_argument("--client-processes", type=int, default=2, help="Load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Connections per client process")
+    parser.add_argument("--workers", type=int, help="WEB_CONCURRENCY for the production setup (default: CPU count)")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_env = {
+            **os.environ,
+            "TEST_MODE": "true",
+            "REPOSITORY_BACKEND": os.environ.get("REPOSITORY_BACKEND", "shared_memory"),
+            "ACCESS_LOG": "false",
+        }
+        setups = {
+            "single": (
+                [sys.executable, "-m", "uvicorn", "src.main:app", "--port", "{port}", "--no-access-log"],
+                {**base_env, "SHARED_STORE_PATH": os.path.join(tmp, "single.log")},
+            ),
+            "production": (
+                [sys.executable, "-m", "src.server"],
+                {
+                    **base_env,
+                    "HOST": "127.0.0.1",
+                    "SHARED_STORE_PATH": os.path.join(tmp, "production.log"),
+                    **({"WEB_CONCURRENCY": str(args.workers)} if args.workers else {}),
+                },
+            ),
+        }
+
+        results = {}
+        for name, (command, env) in setups.items():
+            print(f"Measuring {name}...", file=sys.stderr)
+            results[name] = _measure(command, env, args)
+
+    print_table(results)
+    if args.output:
+        save_results(args.output, results, run_metadata(cpus=os.cpu_count(), **vars(args)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
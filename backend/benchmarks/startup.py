@@ -0,0 +1,126 @@
+"""
+Startup-time measurement for cold starts (e.g. Container Apps scale from zero).
+
+For each backend, in fresh subprocesses:
+- import_ms: time to `import src.main`
+- first_request_ms: time from launching the server process until the first
+  successful `GET /devices` response
+- azure_sdk_loaded: whether the Azure SDK was imported at all
+
+Results can be saved and compared across releases like the API benchmarks.
+
+Run from backend/:
+    uv run --with httpx python -m benchmarks.startup
+    uv run --with httpx python -m benchmarks.startup --save-baseline benchmarks/baselines/startup.json
+    uv run --with httpx python -m benchmarks.startup --compare benchmarks/baselines/startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict
+
+from benchmarks.harness import compare_to_baseline, print_table, run_metadata, save_results
+
+BACKENDS: Dict[str, Dict[str, str]] = {
+    "memory": {"TEST_MODE": "true", "REPOSITORY_BACKEND": "memory"},
+    "fake-cosmos": {"TEST_MODE": "false", "REPOSITORY_BACKEND": "cosmos", "COSMOS_ENDPOINT": "fake://startup"},
+}
+
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import src.main
+elapsed = (time.perf_counter() - started) * 1000
+print(json.dumps({"import_ms": elapsed, "azure_sdk_loaded": any(m.startswith("azure") for m in sys.modules)}))
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _measure_import(env: Dict[str, str]) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE],
+        env=env, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def _measure_first_request(env: Dict[str, str], timeout: float = 60.0) -> float:
+    import httpx
+
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/devices", timeout=5.0).status_code == 200:
+                    return (time.perf_counter() - started) * 1000
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("Server did not answer GET /devices in time")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", action="append", choices=sorted(BACKENDS), help="Backend(s) to measure (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per backend (median is reported)")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write results as a new baseline JSON")
+    parser.add_argument("--compare", metavar="PATH", help="Compare with a baseline JSON and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for backend in args.backend or list(BACKENDS):
+        # The import probe reports on stdout, so application logs go to stderr
+        env = {**os.environ, **BACKENDS[backend], "LOG_STREAM": "stderr"}
+        imports = [_measure_import(env) for _ in range(args.runs)]
+        first_requests = [_measure_first_request(env) for _ in range(args.runs)]
+        results[backend] = {
+            "import_ms": round(statistics.median(r["import_ms"] for r in imports), 1),
+            "first_request_ms": round(statistics.median(first_requests), 1),
+            "azure_sdk_loaded": imports[0]["azure_sdk_loaded"],
+        }
+
+    print_table(results, columns=("import_ms", "first_request_ms", "azure_sdk_loaded"))
+
+    meta = run_metadata(runs=args.runs)
+    for path in filter(None, (args.output, args.save_baseline)):
+        save_results(path, results, meta)
+
+    if args.compare:
+        regressions = compare_to_baseline(
+            results,
+            args.compare,
+            threshold=args.threshold,
+            lower_is_better=("import_ms", "first_request_ms"),
+            higher_is_better=(),
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
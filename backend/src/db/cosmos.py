@@ -2,14 +2,16 @@
 Cosmos DB client with lazy initialization and DefaultAzureCredential.
 Uses system-assigned managed identity when running in Azure.
 Skipped entirely in TEST_MODE.
+
+The Azure SDK is imported inside get_cosmos_client() so that processes which
+never talk to Cosmos DB (TEST_MODE, other backends) don't pay for the import.
 """
 import os
 import logging
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
-from azure.cosmos.aio import CosmosClient
-from azure.cosmos import DatabaseProxy, ContainerProxy
-from azure.identity.aio import DefaultAzureCredential
+if TYPE_CHECKING:
+    from azure.cosmos.aio import CosmosClient, ContainerProxy, DatabaseProxy
 
 logger = logging.getLogger(__name__)
 
@@ -17,8 +19,11 @@ logger = logging.getLogger(__name__)
 TEST_MODE = os.environ.get("TEST_MODE", "false").lower() == "true"
 
 # Global client instance (lazy-loaded)
-_cosmos_client: Optional[CosmosClient] = None
-_credential: Optional[DefaultAzureCredential] = None
+_cosmos_client: Optional["CosmosClient"] = None
+_credential = None
+
+# Endpoints with this scheme use the in-process fake client (src/db/fake_cosmos.py)
+FAKE_ENDPOINT_SCHEME = "fake://"
 
 
 def get_cosmos_config() -> dict:
@@ -27,10 +32,54 @@ def get_cosmos_config() -> dict:
         "endpoint": os.environ.get("COSMOS_ENDPOINT", ""),
         "database_name": os.environ.get("COSMOS_DB_NAME", "inventory"),
         "devices_container": os.environ.get("COSMOS_DEVICES_CONTAINER", "devices"),
+        # Device history (partitioned by /device_id); empty disables recording it
+        "events_container": os.environ.get("COSMOS_EVENTS_CONTAINER", "device-events"),
+        # Document field the devices container is partitioned by: "id" or "site"
+        # (must match the container's partition key path in cosmos.bicep)
+        "partition_key": os.environ.get("COSMOS_PARTITION_KEY", "id").lower(),
+        # Point-read micro-batching: reads arriving while a fetch is in flight wait
+        # up to this long to share the next one; a lone read is sent at once.
+        # A window of 0 disables batching
+        "read_batch_window_ms": float(os.environ.get("COSMOS_READ_BATCH_WINDOW_MS", "2")),
+        "read_batch_max_size": int(os.environ.get("COSMOS_READ_BATCH_MAX_SIZE", "100")),
+        # Write-behind coalescing of updates (see src/repositories/write_behind.py);
+        # a window of 0 writes every update through
+        "write_behind_window_ms": float(os.environ.get("COSMOS_WRITE_BEHIND_WINDOW_MS", "0")),
+        # "durable": acknowledge updates once the merged write commits;
+        # "buffered": acknowledge at once, losing up to one window if the worker dies
+        "write_behind_ack": os.environ.get("COSMOS_WRITE_BEHIND_ACK", "durable").lower(),
+        "write_behind_max_pending": int(os.environ.get("COSMOS_WRITE_BEHIND_MAX_PENDING", "1000")),
+        "write_behind_max_attempts": int(os.environ.get("COSMOS_WRITE_BEHIND_MAX_ATTEMPTS", "3")),
+        # IDs per multi-item query for GET /devices?ids=...
+        "multi_get_chunk_size": int(os.environ.get("COSMOS_MULTI_GET_CHUNK_SIZE", "100")),
+        # 429 handling (see src/db/throttling.py); the SDK's own throttle retries are disabled
+        "retry_budget_ms": float(os.environ.get("COSMOS_RETRY_BUDGET_MS", "5000")),
+        "retry_base_delay_ms": float(os.environ.get("COSMOS_RETRY_BASE_DELAY_MS", "50")),
+        "retry_max_delay_ms": float(os.environ.get("COSMOS_RETRY_MAX_DELAY_MS", "2000")),
+        "initial_concurrency": int(os.environ.get("COSMOS_INITIAL_CONCURRENCY", "16")),
+        "min_concurrency": int(os.environ.get("COSMOS_MIN_CONCURRENCY", "1")),
+        "max_concurrency": int(os.environ.get("COSMOS_MAX_CONCURRENCY", "128")),
+        # Token caching (see src/db/credentials.py); refresh well before the SDK's 5-minute window
+        "token_cache_enabled": os.environ.get("COSMOS_TOKEN_CACHE_ENABLED", "true").lower() == "true",
+        "token_refresh_margin_s": float(os.environ.get("COSMOS_TOKEN_REFRESH_MARGIN_SECONDS", "600")),
+        "token_retry_interval_s": float(os.environ.get("COSMOS_TOKEN_RETRY_INTERVAL_SECONDS", "10")),
+        # Same override the SDK honors
+        "aad_scope_override": os.environ.get("AZURE_COSMOS_AAD_SCOPE_OVERRIDE", ""),
+        # Fake client behavior (only used with a fake:// endpoint)
+        "fake_latency_ms": float(os.environ.get("COSMOS_FAKE_LATENCY_MS", "0")),
+        "fake_latency_jitter_ms": float(os.environ.get("COSMOS_FAKE_LATENCY_JITTER_MS", "0")),
+        "fake_ru_per_second": float(os.environ.get("COSMOS_FAKE_RU_PER_SECOND", "0")),
+        "fake_throttle_rate": float(os.environ.get("COSMOS_FAKE_THROTTLE_RATE", "0")),
+        "fake_retry_after_ms": float(os.environ.get("COSMOS_FAKE_RETRY_AFTER_MS", "100")),
+        # Cross-partition queries pay the per-query charge once per physical partition
+        "fake_physical_partitions": int(os.environ.get("COSMOS_FAKE_PHYSICAL_PARTITIONS", "4")),
+        # > 0 authenticates fake calls with a FakeCredential of this acquisition latency
+        "fake_token_latency_ms": float(os.environ.get("COSMOS_FAKE_TOKEN_LATENCY_MS", "0")),
+        "fake_token_lifetime_s": float(os.environ.get("COSMOS_FAKE_TOKEN_LIFETIME_SECONDS", "3600")),
     }
 
 
-async def get_cosmos_client() -> CosmosClient:
+async def get_cosmos_client() -> "CosmosClient":
     """
     Get or create the Cosmos DB client using DefaultAzureCredential.
     Uses lazy initialization to avoid blocking at import time.
@@ -49,33 +98,122 @@ async def get_cosmos_client() -> CosmosClient:
         if not endpoint:
             raise ValueError("COSMOS_ENDPOINT environment variable is required")
         
-        logger.info(f"Initializing Cosmos DB client for endpoint: {endpoint}")
-        
+        logger.info("Initializing Cosmos DB client for endpoint: %s", endpoint)
+
+        if endpoint.startswith(FAKE_ENDPOINT_SCHEME):
+            # Local stand-in for offline performance testing; a credential is
+            # only used when simulating token acquisition latency
+            from src.db.credentials import FakeCredential, cosmos_scope
+            from src.db.fake_cosmos import FakeCosmosBehavior, FakeCosmosClient
+            from src.repositories.naming import unique_names_enforced
+
+            if config["fake_token_latency_ms"] > 0:
+                _credential = _wrap_credential(
+                    FakeCredential(config["fake_token_latency_ms"], config["fake_token_lifetime_s"]),
+                    config,
+                )
+
+            _cosmos_client = FakeCosmosClient(
+                endpoint,
+                partition_key_paths={
+                    config["devices_container"]: f"/{config['partition_key']}",
+                    config["events_container"]: "/device_id",
+                },
+                # cosmos.bicep adds the /name unique key when names must be unique
+                unique_key_paths={config["devices_container"]: ["/name"]} if unique_names_enforced() else {},
+                behavior=FakeCosmosBehavior(
+                    latency_ms=config["fake_latency_ms"],
+                    latency_jitter_ms=config["fake_latency_jitter_ms"],
+                    ru_per_second=config["fake_ru_per_second"],
+                    throttle_rate=config["fake_throttle_rate"],
+                    retry_after_ms=config["fake_retry_after_ms"],
+                    physical_partitions=config["fake_physical_partitions"],
+                    credential=_credential,
+                    scope=cosmos_scope(endpoint, config["aad_scope_override"]),
+                ),
+            )
+            logger.info("Using fake Cosmos DB client")
+            return _cosmos_client
+
+        from azure.cosmos import documents
+        from azure.cosmos.aio import CosmosClient
+        from azure.identity.aio import DefaultAzureCredential
+
         # DefaultAzureCredential will use:
         # - Managed Identity in Azure Container Apps
         # - Azure CLI credentials locally
-        _credential = DefaultAzureCredential()
-        _cosmos_client = CosmosClient(endpoint, credential=_credential)
+        _credential = _wrap_credential(DefaultAzureCredential(), config)
+
+        # 429s are retried by src.db.throttling within a latency budget,
+        # so the SDK must surface them instead of sleeping internally
+        connection_policy = documents.ConnectionPolicy()
+        connection_policy.RetryOptions = documents.RetryOptions(max_retry_attempt_count=0)
+
+        _cosmos_client = CosmosClient(
+            endpoint,
+            credential=_credential,
+            connection_policy=connection_policy,
+        )
         
         logger.info("Cosmos DB client initialized successfully")
     
     return _cosmos_client
 
 
-async def get_database() -> DatabaseProxy:
+def _wrap_credential(credential, config: dict):
+    """Serve tokens from a background-refreshed cache unless disabled."""
+    if not config["token_cache_enabled"]:
+        return credential
+    from src.db.credentials import CachedTokenCredential
+
+    return CachedTokenCredential(
+        credential,
+        refresh_margin_s=config["token_refresh_margin_s"],
+        retry_interval_s=config["token_retry_interval_s"],
+    )
+
+
+async def warm_up_credential() -> None:
+    """
+    Acquire the Cosmos DB token before the first request.
+    With token caching this also starts the background refresh.
+    """
+    if _credential is None:
+        return
+    from src.db.credentials import cosmos_scope
+
+    config = get_cosmos_config()
+    scope = cosmos_scope(config["endpoint"], config["aad_scope_override"])
+    warm_up = getattr(_credential, "warm_up", None)
+    if warm_up is not None:
+        await warm_up(scope)
+    else:
+        await _credential.get_token(scope)
+
+
+async def get_database() -> "DatabaseProxy":
     """Get the Cosmos database proxy."""
     client = await get_cosmos_client()
     config = get_cosmos_config()
     return client.get_database_client(config["database_name"])
 
 
-async def get_devices_container() -> ContainerProxy:
+async def get_devices_container() -> "ContainerProxy":
     """Get the devices container proxy."""
     database = await get_database()
     config = get_cosmos_config()
     return database.get_container_client(config["devices_container"])
 
 
+async def get_events_container() -> Optional["ContainerProxy"]:
+    """Get the device history container proxy (None when COSMOS_EVENTS_CONTAINER is empty)."""
+    config = get_cosmos_config()
+    if not config["events_container"]:
+        return None
+    database = await get_database()
+    return database.get_container_client(config["events_container"])
+
+
 async def close_cosmos_client():
     """Close the Cosmos DB client and release resources."""
     global _cosmos_client, _credential
@@ -0,0 +1,161 @@
+"""
+Token management for Cosmos DB authentication.
+Wraps an Azure credential so tokens are acquired once at startup, refreshed in the
+background before they expire, and served from cache on the request path.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from azure.core.credentials import AccessToken
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+_CacheKey = Tuple[Tuple[str, ...], Tuple[Tuple[str, Any], ...]]
+
+
+def cosmos_scope(endpoint: str, scope_override: str = "") -> str:
+    """AAD scope the Cosmos SDK requests for an account endpoint."""
+    if scope_override:
+        return scope_override
+    parts = urlsplit(endpoint)
+    return f"{parts.scheme}://{parts.hostname}/.default"
+
+
+class CachedTokenCredential:
+    """
+    AsyncTokenCredential that answers get_token from a cache.
+
+    The first get_token (or warm_up) per scope waits for the wrapped credential;
+    afterwards a background task re-acquires the token `refresh_margin_s` before
+    it expires, retrying every `retry_interval_s` on failure, so callers only
+    block when the cached token is about to expire and every refresh has failed.
+    `clock` and `sleep` (wall-clock seconds, like token expiry times) can be
+    replaced to drive refreshes without waiting.
+    """
+
+    def __init__(
+        self,
+        credential: Any,
+        refresh_margin_s: float = 600.0,
+        retry_interval_s: float = 10.0,
+        min_validity_s: float = 30.0,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self._credential = credential
+        self._clock = clock
+        self._sleep = sleep
+        self.refresh_margin_s = refresh_margin_s
+        self.retry_interval_s = retry_interval_s
+        self.min_validity_s = min_validity_s
+        self._tokens: Dict[_CacheKey, AccessToken] = {}
+        self._locks: Dict[_CacheKey, asyncio.Lock] = {}
+        self._refresh_tasks: Dict[_CacheKey, asyncio.Task] = {}
+
+        self._acquire_ms = metrics.histogram("cosmos_token_acquire_ms", description="Time to acquire an AAD token")
+        self._misses = metrics.counter("cosmos_token_cache_misses_total", "get_token calls that waited for the credential")
+        self._refresh_failures = metrics.counter("cosmos_token_refresh_failures_total", "Failed background token refreshes")
+
+    def _valid(self, token: Optional[AccessToken]) -> bool:
+        return token is not None and token.expires_on - self._clock() > self.min_validity_s
+
+    async def get_token(self, *scopes: str, claims: Optional[str] = None, tenant_id: Optional[str] = None, **kwargs) -> AccessToken:
+        if claims or tenant_id:
+            # Claims challenges and cross-tenant requests need a fresh, specific token
+            return await self._credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+
+        key = (scopes, tuple(sorted(kwargs.items())))
+        token = self._tokens.get(key)
+        if self._valid(token):
+            return token
+
+        self._misses.inc()
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            # Another caller may have fetched it while we waited
+            token = self._tokens.get(key)
+            if self._valid(token):
+                return token
+            token = await self._fetch(key, scopes, kwargs)
+
+        if key not in self._refresh_tasks:
+            self._refresh_tasks[key] = asyncio.create_task(self._refresh_loop(key, scopes, kwargs))
+        return token
+
+    async def warm_up(self, *scopes: str) -> None:
+        """Acquire tokens for `scopes` now and start refreshing them in the background."""
+        started = time.perf_counter()
+        await self.get_token(*scopes)
+        logger.info("Acquired token for %s in %.0f ms", ", ".join(scopes), (time.perf_counter() - started) * 1000)
+
+    async def _fetch(self, key: _CacheKey, scopes: Tuple[str, ...], kwargs: dict) -> AccessToken:
+        started = time.perf_counter()
+        token = await self._credential.get_token(*scopes, **kwargs)
+        self._acquire_ms.observe((time.perf_counter() - started) * 1000)
+        self._tokens[key] = token
+        return token
+
+    async def _refresh_loop(self, key: _CacheKey, scopes: Tuple[str, ...], kwargs: dict) -> None:
+        while True:
+            remaining = self._tokens[key].expires_on - self._clock()
+            # Tokens that expire sooner than the margin refresh at half-life
+            delay = remaining - self.refresh_margin_s if remaining > self.refresh_margin_s else remaining / 2
+            await self._sleep(max(delay, 1.0))
+            while True:
+                try:
+                    async with self._locks[key]:
+                        await self._fetch(key, scopes, kwargs)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._refresh_failures.inc()
+                    logger.warning("Background token refresh failed, retrying in %.0fs: %s", self.retry_interval_s, e)
+                    await self._sleep(self.retry_interval_s)
+
+    async def close(self) -> None:
+        """Stop background refreshes and close the wrapped credential."""
+        for task in self._refresh_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._refresh_tasks.values(), return_exceptions=True)
+        self._refresh_tasks.clear()
+        self._tokens.clear()
+        close = getattr(self._credential, "close", None)
+        if close is not None:
+            await close()
+
+    async def __aenter__(self) -> "CachedTokenCredential":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+
+class FakeCredential:
+    """
+    Stand-in for DefaultAzureCredential with configurable acquisition latency
+    and token lifetime, for exercising token handling without Azure.
+    """
+
+    def __init__(
+        self,
+        acquire_latency_ms: float = 0.0,
+        token_lifetime_s: float = 3600.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.acquire_latency = acquire_latency_ms / 1000.0
+        self.token_lifetime_s = token_lifetime_s
+        self._clock = clock
+        self.calls = 0
+
+    async def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        self.calls += 1
+        await asyncio.sleep(self.acquire_latency)
+        return AccessToken(f"fake-token-{self.calls}", int(self._clock() + self.token_lifetime_s))
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,461 @@
+"""
+Local in-process stand-in for the Cosmos DB async client.
+Selected by setting COSMOS_ENDPOINT to a fake:// URL. Implements the container
+operations the repositories use and the subset of the SQL query language they issue,
+with optional per-call latency, request unit (RU) accounting and 429 injection.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from azure.cosmos.exceptions import (
+    CosmosHttpResponseError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+from src import metrics
+
+# Approximate RU charges for ~1 KB items, modeled on published Cosmos DB costs
+POINT_READ_RU = 1.0
+WRITE_RU = 5.7
+REPLACE_RU = 10.7
+# Charged once per physical partition a query visits
+QUERY_BASE_RU = 2.3
+QUERY_PER_SCANNED_RU = 0.05
+QUERY_PER_RESULT_RU = 0.1
+
+# azure-core's BearerTokenCredentialPolicy refreshes tokens this close to expiry
+TOKEN_REFRESH_WINDOW_S = 300
+
+_QUERY_RE = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+c"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>.+?))?"
+    r"(?:\s+OFFSET\s+(?P<offset>\S+)\s+LIMIT\s+(?P<limit>\S+))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_ARRAY_CONTAINS_RE = re.compile(
+    r"^ARRAY_CONTAINS\(\s*(?P<array>\S+?)\s*,\s*c\.(?P<field>\w+)\s*\)$", re.IGNORECASE
+)
+_COMPARISON_RE = re.compile(
+    r"^c\.(?P<field>\w+)\s*(?P<op>=|!=|<>|<=|>=|<|>)\s*(?P<value>.+)$"
+)
+_AND_RE = re.compile(r"\s+AND\s+", re.IGNORECASE)
+
+_OPERATORS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+}
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    # Cosmos orders undefined/null before booleans, numbers and strings
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    return (3, str(value))
+
+
+class _Query:
+    """Parsed form of the supported `SELECT ... FROM c ...` queries."""
+
+    def __init__(self, query: str, parameters: Optional[List[dict]]):
+        match = _QUERY_RE.match(query)
+        if match is None:
+            raise ValueError(f"Unsupported query for fake Cosmos DB: {query}")
+
+        self._params = {p["name"]: p["value"] for p in parameters or []}
+        self.fields = self._parse_select(match.group("select"))
+        self.filters = self._parse_where(match.group("where"))
+        self.order = self._parse_order(match.group("order"))
+        self.offset = self._value(match.group("offset")) if match.group("offset") else 0
+        self.limit = self._value(match.group("limit")) if match.group("limit") else None
+
+    def _value(self, token: str) -> Any:
+        token = token.strip()
+        if token.startswith("@"):
+            return self._params[token]
+        if token.startswith(("'", '"')):
+            return token[1:-1]
+        lowered = token.lower()
+        if lowered in ("true", "false"):
+            return lowered == "true"
+        if lowered == "null":
+            return None
+        return float(token) if "." in token else int(token)
+
+    @staticmethod
+    def _parse_select(select: str) -> Optional[List[str]]:
+        select = select.strip()
+        if select == "*":
+            return None
+        fields = []
+        for part in select.split(","):
+            part = part.strip()
+            if not part.startswith("c."):
+                raise ValueError(f"Unsupported projection for fake Cosmos DB: {part}")
+            fields.append(part[2:])
+        return fields
+
+    def _parse_where(self, where: Optional[str]) -> list:
+        if not where:
+            return []
+        filters = []
+        for condition in _AND_RE.split(where.strip()):
+            condition = condition.strip()
+            match = _ARRAY_CONTAINS_RE.match(condition)
+            if match:
+                values = set(self._value(match.group("array")))
+                field = match.group("field")
+                filters.append(lambda doc, f=field, v=values: doc.get(f) in v)
+                continue
+            match = _COMPARISON_RE.match(condition)
+            if match:
+                field, op = match.group("field"), _OPERATORS[match.group("op")]
+                value = self._value(match.group("value"))
+                filters.append(lambda doc, f=field, o=op, v=value: o(doc.get(f), v))
+                continue
+            raise ValueError(f"Unsupported condition for fake Cosmos DB: {condition}")
+        return filters
+
+    @staticmethod
+    def _parse_order(order: Optional[str]) -> List[Tuple[str, bool]]:
+        if not order:
+            return []
+        keys = []
+        for part in order.split(","):
+            tokens = part.split()
+            field = tokens[0]
+            if not field.startswith("c."):
+                raise ValueError(f"Unsupported ORDER BY for fake Cosmos DB: {part}")
+            descending = len(tokens) > 1 and tokens[1].upper() == "DESC"
+            keys.append((field[2:], descending))
+        return keys
+
+    def execute(self, partitions: List[List[dict]]) -> Tuple[List[dict], int]:
+        """
+        Run the query over the documents of each partition it visits; returns
+        the results and the number of index entries read.
+        """
+        # Matches are served from the index, so skipped rows are read but later
+        # rows are not; each partition reads up to the end of the page itself
+        end = None if self.limit is None else self.offset + self.limit
+        results = []
+        scanned = 0
+        for docs in partitions:
+            matches = [doc for doc in docs if all(f(doc) for f in self.filters)]
+            scanned += len(matches) if end is None else min(len(matches), end)
+            results.extend(matches)
+
+        # Stable sorts applied from the last key to the first
+        for field, descending in reversed(self.order):
+            results.sort(key=lambda doc: _sort_key(doc.get(field)), reverse=descending)
+        results = results[self.offset:end]
+
+        if self.fields is None:
+            return [dict(doc) for doc in results], scanned
+        return [{f: doc[f] for f in self.fields if f in doc} for doc in results], scanned
+
+
+class FakeCosmosBehavior:
+    """
+    Latency, RU and throttling model shared by all containers of a fake client.
+
+    - `latency_ms` (+ up to `latency_jitter_ms`) is awaited on every call
+    - `ru_per_second` > 0 enables a token bucket; calls that exceed it get a 429
+      whose retry-after is the time until enough RUs have been refilled
+    - `throttle_rate` additionally answers that fraction of calls with a 429
+    - cross-partition queries visit each of `physical_partitions`, which hold
+      the logical partitions (partition key values) by hash, and pay for each
+    - with a `credential`, calls first get a token for `scope` the way the SDK's
+      bearer token policy does: lazily, blocking every caller while it refreshes
+      a token that is within TOKEN_REFRESH_WINDOW_S of expiring
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        latency_jitter_ms: float = 0.0,
+        ru_per_second: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after_ms: float = 100.0,
+        physical_partitions: int = 1,
+        seed: Optional[int] = None,
+        credential: Any = None,
+        scope: str = "",
+    ):
+        self.latency = latency_ms / 1000.0
+        self.latency_jitter = latency_jitter_ms / 1000.0
+        self.ru_per_second = ru_per_second
+        self.throttle_rate = throttle_rate
+        self.retry_after_ms = retry_after_ms
+        self.physical_partitions = max(1, physical_partitions)
+        self._random = random.Random(seed)
+        self._tokens = ru_per_second
+        self._refilled_at = time.monotonic()
+        self.credential = credential
+        self.scope = scope
+        self._token = None
+        self._token_lock = asyncio.Lock()
+
+        self.total_ru = 0.0
+        self._ru = metrics.counter("fake_cosmos_ru_total", "Request units charged by the fake Cosmos DB")
+        self._requests = metrics.counter("fake_cosmos_requests_total", "Calls made to the fake Cosmos DB")
+        self._throttled = metrics.counter("fake_cosmos_throttled_total", "Calls the fake Cosmos DB answered with 429")
+
+    async def authorize(self) -> None:
+        """Get a bearer token from the credential when the cached one is expiring."""
+        if self.credential is None:
+            return
+        if self._token is None or self._token.expires_on - time.time() < TOKEN_REFRESH_WINDOW_S:
+            async with self._token_lock:
+                if self._token is None or self._token.expires_on - time.time() < TOKEN_REFRESH_WINDOW_S:
+                    self._token = await self.credential.get_token(self.scope)
+
+    async def delay(self) -> None:
+        """Simulate the network round trip."""
+        await self.authorize()
+        self._requests.inc()
+        latency = self.latency
+        if self.latency_jitter:
+            latency += self._random.uniform(0, self.latency_jitter)
+        # Always yield so callers interleave as they would on a real client
+        await asyncio.sleep(latency)
+
+    def charge(self, request_charge: float) -> dict:
+        """Charge RUs for a call, raising a 429 when the call is throttled."""
+        if self.throttle_rate and self._random.random() < self.throttle_rate:
+            raise self._throttle(self.retry_after_ms)
+
+        if self.ru_per_second > 0:
+            now = time.monotonic()
+            self._tokens = min(
+                self.ru_per_second,
+                self._tokens + (now - self._refilled_at) * self.ru_per_second,
+            )
+            self._refilled_at = now
+            if request_charge > self._tokens:
+                deficit = request_charge - self._tokens
+                raise self._throttle(max(1.0, deficit / self.ru_per_second * 1000))
+            self._tokens -= request_charge
+
+        self.total_ru += request_charge
+        self._ru.inc(request_charge)
+        return {"x-ms-request-charge": f"{request_charge:.2f}"}
+
+    def _throttle(self, retry_after_ms: float) -> CosmosHttpResponseError:
+        self._throttled.inc()
+        error = CosmosHttpResponseError(
+            status_code=429,
+            message="Request rate is large. More Request Units may be needed.",
+        )
+        error.headers = {"x-ms-retry-after-ms": f"{retry_after_ms:.0f}"}
+        return error
+
+
+def _size_factor(doc: dict) -> float:
+    # Charges scale with item size, one unit per started KB
+    return max(1.0, len(json.dumps(doc, default=str)) / 1024)
+
+
+class FakeContainerProxy:
+    """In-memory container keyed by (partition key value, id)."""
+
+    def __init__(
+        self,
+        id: str,
+        partition_key_path: str = "/id",
+        behavior: Optional[FakeCosmosBehavior] = None,
+        unique_key_paths: Sequence[str] = (),
+    ):
+        self.id = id
+        self.partition_key_path = partition_key_path
+        self.behavior = behavior or FakeCosmosBehavior()
+        # Like a uniqueKeyPolicy: the values must be unique within a logical partition
+        self.unique_key_paths = list(unique_key_paths)
+        self.last_response_headers: dict = {}
+        self._items: Dict[Tuple[Any, str], dict] = {}
+        self._unique_owners: Dict[tuple, str] = {}
+
+    def _partition_value(self, body: dict) -> Any:
+        return body.get(self.partition_key_path.lstrip("/"))
+
+    def _unique_key(self, doc: dict) -> Optional[tuple]:
+        if not self.unique_key_paths:
+            return None
+        return (self._partition_value(doc),) + tuple(doc.get(path.lstrip("/")) for path in self.unique_key_paths)
+
+    def _store(self, key: Tuple[Any, str], body: dict) -> dict:
+        """Save a document, enforcing and updating the unique keys."""
+        unique_key = self._unique_key(body)
+        if unique_key is not None:
+            owner = self._unique_owners.get(unique_key)
+            if owner is not None and owner != body["id"]:
+                raise CosmosResourceExistsError(status_code=409, message="Unique index constraint violation.")
+            previous = self._items.get(key)
+            if previous is not None:
+                self._unique_owners.pop(self._unique_key(previous), None)
+            self._unique_owners[unique_key] = body["id"]
+        doc = self._stamp(body)
+        self._items[key] = doc
+        return doc
+
+    @staticmethod
+    def _stamp(body: dict) -> dict:
+        doc = dict(body)
+        doc["_ts"] = int(time.time())
+        doc["_etag"] = f'"{uuid.uuid4()}"'
+        return doc
+
+    def _not_found(self, item: str) -> CosmosResourceNotFoundError:
+        return CosmosResourceNotFoundError(
+            status_code=404, message=f"Entity with the specified id does not exist: {item}"
+        )
+
+    async def _call(self, request_charge: float) -> None:
+        await self.behavior.delay()
+        self.last_response_headers = self.behavior.charge(request_charge)
+
+    def _physical_partition(self, partition_key: Any) -> int:
+        return zlib.crc32(json.dumps(partition_key, default=str).encode()) % self.behavior.physical_partitions
+
+    async def read_item(self, item: str, partition_key: Any, **kwargs) -> dict:
+        await self.behavior.delay()
+        doc = self._items.get((partition_key, item))
+        self.last_response_headers = self.behavior.charge(POINT_READ_RU * (_size_factor(doc) if doc else 1.0))
+        if doc is None:
+            raise self._not_found(item)
+        return dict(doc)
+
+    async def query_items(
+        self,
+        query: str,
+        parameters: Optional[List[dict]] = None,
+        partition_key: Any = None,
+        **kwargs,
+    ) -> AsyncIterator[dict]:
+        parsed = _Query(query, parameters)
+        # The round trip comes first: results reflect the items at the time the query arrives
+        await self.behavior.delay()
+        if partition_key is None:
+            # Fanned out to every physical partition, whether it has matches or not
+            partitions: List[List[dict]] = [[] for _ in range(self.behavior.physical_partitions)]
+            for (pk, _), doc in self._items.items():
+                partitions[self._physical_partition(pk)].append(doc)
+        else:
+            partitions = [[doc for (pk, _), doc in self._items.items() if pk == partition_key]]
+        results, scanned = parsed.execute(partitions)
+
+        self.last_response_headers = self.behavior.charge(
+            QUERY_BASE_RU * len(partitions)
+            + QUERY_PER_SCANNED_RU * scanned
+            + QUERY_PER_RESULT_RU * len(results)
+        )
+        for doc in results:
+            yield doc
+
+    async def create_item(self, body: dict, **kwargs) -> dict:
+        await self._call(WRITE_RU * _size_factor(body))
+        key = (self._partition_value(body), body["id"])
+        if key in self._items:
+            raise CosmosResourceExistsError(
+                status_code=409, message="Entity with the specified id already exists in the system."
+            )
+        return dict(self._store(key, body))
+
+    async def upsert_item(self, body: dict, **kwargs) -> dict:
+        await self._call(REPLACE_RU * _size_factor(body))
+        return dict(self._store((self._partition_value(body), body["id"]), body))
+
+    async def replace_item(self, item: str, body: dict, **kwargs) -> dict:
+        await self._call(REPLACE_RU * _size_factor(body))
+        key = (self._partition_value(body), item)
+        if key not in self._items:
+            raise self._not_found(item)
+        return dict(self._store(key, body))
+
+    async def delete_item(self, item: str, partition_key: Any, **kwargs) -> None:
+        await self._call(WRITE_RU)
+        doc = self._items.pop((partition_key, item), None)
+        if doc is None:
+            raise self._not_found(item)
+        if self.unique_key_paths:
+            self._unique_owners.pop(self._unique_key(doc), None)
+
+
+class FakeDatabaseProxy:
+    """Database holding lazily created fake containers."""
+
+    def __init__(self, id: str, behavior: FakeCosmosBehavior):
+        self.id = id
+        self.behavior = behavior
+        # Definitions of containers created on first use (default: "/id", no unique keys)
+        self.partition_key_paths: Dict[str, str] = {}
+        self.unique_key_paths: Dict[str, List[str]] = {}
+        self._containers: Dict[str, FakeContainerProxy] = {}
+
+    def get_container_client(self, container: str) -> FakeContainerProxy:
+        if container not in self._containers:
+            self._containers[container] = FakeContainerProxy(
+                container,
+                partition_key_path=self.partition_key_paths.get(container, "/id"),
+                behavior=self.behavior,
+                unique_key_paths=self.unique_key_paths.get(container, ()),
+            )
+        return self._containers[container]
+
+
+# Process-wide data so that reconnecting clients see the same items
+_databases: Dict[str, FakeDatabaseProxy] = {}
+
+
+class FakeCosmosClient:
+    """Drop-in for azure.cosmos.aio.CosmosClient backed by process memory."""
+
+    def __init__(
+        self,
+        url: str,
+        behavior: Optional[FakeCosmosBehavior] = None,
+        partition_key_paths: Optional[Dict[str, str]] = None,
+        unique_key_paths: Optional[Dict[str, List[str]]] = None,
+        **kwargs,
+    ):
+        self.url = url
+        self.behavior = behavior or FakeCosmosBehavior()
+        # Stand in for the container definitions in cosmos.bicep
+        self.partition_key_paths = partition_key_paths or {}
+        self.unique_key_paths = unique_key_paths or {}
+
+    def get_database_client(self, database: str) -> FakeDatabaseProxy:
+        if database not in _databases:
+            _databases[database] = FakeDatabaseProxy(database, self.behavior)
+        _databases[database].partition_key_paths.update(self.partition_key_paths)
+        _databases[database].unique_key_paths.update(self.unique_key_paths)
+        # Reconnecting clients keep the data but apply their own behavior
+        _databases[database].behavior = self.behavior
+        for container in _databases[database]._containers.values():
+            container.behavior = self.behavior
+        return _databases[database]
+
+    async def close(self) -> None:
+        # Yield like the real client's network teardown would
+        await asyncio.sleep(0)
+
+
+def reset_fake_cosmos() -> None:
+    """Drop all fake databases and their items."""
+    _databases.clear()
@@ -0,0 +1,242 @@
+"""
+429-aware wrapper for Cosmos DB calls.
+Retries throttled requests with jittered backoff within a latency budget and
+adapts the number of in-flight Cosmos requests per process (AIMD).
+"""
+import asyncio
+import collections
+import logging
+import math
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from src import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+THROTTLED_STATUS_CODE = 429
+
+
+class CosmosThrottledError(Exception):
+    """Raised when a throttled Cosmos call could not complete within its latency budget."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Cosmos DB request throttled; retry after {retry_after:.3f}s")
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Value for the HTTP Retry-After header (whole seconds, at least 1)."""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits in-flight requests with an additive-increase / multiplicative-decrease window.
+
+    Every success grows the limit by roughly one per `limit` successes; other
+    failures leave it unchanged; a throttle shrinks it by `decrease_factor`, at
+    most once per `cooldown` seconds so that a burst of 429s from one overload
+    episode only backs off once.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 16,
+        min_limit: int = 1,
+        max_limit: int = 128,
+        decrease_factor: float = 0.7,
+        cooldown: float = 0.1,
+    ):
+        self._min_limit = max(1, min_limit)
+        self._max_limit = max(self._min_limit, max_limit)
+        self._limit = float(min(max(initial_limit, self._min_limit), self._max_limit))
+        self._decrease_factor = decrease_factor
+        self._cooldown = cooldown
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._waiters: collections.deque[asyncio.Future] = collections.deque()
+
+        self._limit_gauge = metrics.gauge(
+            "cosmos_concurrency_limit", "Current adaptive limit on in-flight Cosmos requests"
+        )
+        self._in_flight_gauge = metrics.gauge(
+            "cosmos_in_flight", "Cosmos requests currently in flight"
+        )
+        self._limit_gauge.set(self._limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        """Wait for a free slot under the current limit."""
+        if self._in_flight < self.limit and not self._waiters:
+            self._take_slot()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except BaseException:
+            # A slot may have been handed over right as we were cancelled
+            if future.done() and not future.cancelled():
+                self._release_slot()
+            else:
+                self._waiters.remove(future)
+            raise
+
+    def release(self, throttled: bool = False, success: bool = True) -> None:
+        """Return a slot and adjust the limit from the call's outcome."""
+        if throttled:
+            now = time.monotonic()
+            if now - self._last_decrease >= self._cooldown:
+                self._limit = max(self._min_limit, self._limit * self._decrease_factor)
+                self._last_decrease = now
+                logger.info("Cosmos concurrency limit decreased to %d", self.limit)
+        elif success:
+            self._limit = min(self._max_limit, self._limit + 1.0 / self._limit)
+        self._limit_gauge.set(self._limit)
+        self._release_slot()
+
+    def _take_slot(self) -> None:
+        self._in_flight += 1
+        self._in_flight_gauge.set(self._in_flight)
+
+    def _release_slot(self) -> None:
+        self._in_flight -= 1
+        self._in_flight_gauge.set(self._in_flight)
+        while self._waiters and self._in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._take_slot()
+                waiter.set_result(None)
+
+
+def _is_throttled(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == THROTTLED_STATUS_CODE
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read the server-suggested delay from a 429 response, if present."""
+    headers = getattr(error, "headers", None) or {}
+    for name in ("x-ms-retry-after-ms", "retry-after-ms"):
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return float(value) / 1000.0
+            except ValueError:
+                pass
+    return None
+
+
+class CosmosCallPolicy:
+    """Retry and concurrency policy applied to every Cosmos call in a process."""
+
+    def __init__(
+        self,
+        budget_ms: float = 5000,
+        base_delay_ms: float = 50,
+        max_delay_ms: float = 2000,
+        limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+    ):
+        self.budget = budget_ms / 1000.0
+        self.base_delay = base_delay_ms / 1000.0
+        self.max_delay = max_delay_ms / 1000.0
+        self.limiter = limiter or AdaptiveConcurrencyLimiter()
+
+        self._throttled = metrics.counter("cosmos_throttled_total", "Cosmos calls answered with 429")
+        self._retries = metrics.counter("cosmos_retries_total", "Cosmos calls retried after a 429")
+        self._exhausted = metrics.counter(
+            "cosmos_retry_budget_exhausted_total", "Cosmos calls that ran out of retry budget"
+        )
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        # Full jitter, but never sooner than the server asked for
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def call(self, operation: Callable[[], Awaitable[T]]) -> T:
+        """Run `operation` under the concurrency limit, retrying 429s within the budget."""
+        deadline = time.monotonic() + self.budget
+        attempt = 0
+
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                # Not wait_for: it can swallow a cancellation that arrives as the slot is granted
+                async with asyncio.timeout(max(remaining, 0)):
+                    await self.limiter.acquire()
+            except TimeoutError:
+                self._exhausted.inc()
+                raise CosmosThrottledError(retry_after=self.base_delay)
+
+            try:
+                result = await operation()
+            except BaseException as e:
+                if not _is_throttled(e):
+                    # Errors, timeouts and cancellations say nothing about spare
+                    # capacity, but the slot must still be returned
+                    self.limiter.release(success=False)
+                    raise
+                self.limiter.release(throttled=True)
+                self._throttled.inc()
+
+                delay = self._backoff(attempt, _retry_after_seconds(e))
+                if time.monotonic() + delay > deadline:
+                    self._exhausted.inc()
+                    raise CosmosThrottledError(retry_after=delay) from e
+
+                self._retries.inc()
+                attempt += 1
+                await asyncio.sleep(delay)
+            else:
+                self.limiter.release()
+                if attempt:
+                    tracing.set_attribute("cosmos.retries", attempt)
+                return result
+
+
+_policy: Optional[CosmosCallPolicy] = None
+
+
+def get_call_policy() -> CosmosCallPolicy:
+    """Get the process-wide Cosmos call policy, creating it from the Cosmos config."""
+    global _policy
+
+    if _policy is None:
+        # Imported here to keep this module free of Azure SDK imports
+        from src.db.cosmos import get_cosmos_config
+
+        config = get_cosmos_config()
+        _policy = CosmosCallPolicy(
+            budget_ms=config["retry_budget_ms"],
+            base_delay_ms=config["retry_base_delay_ms"],
+            max_delay_ms=config["retry_max_delay_ms"],
+            limiter=AdaptiveConcurrencyLimiter(
+                initial_limit=config["initial_concurrency"],
+                min_limit=config["min_concurrency"],
+                max_limit=config["max_concurrency"],
+            ),
+        )
+    return _policy
+
+
+async def cosmos_call(operation: Callable[[], Awaitable[T]], name: str = "call") -> T:
+    """
+    Run a Cosmos SDK call with 429-aware retries and adaptive concurrency.
+    `name` (e.g. "read_item") names its "cosmos.<name>" trace span.
+    """
+    with tracing.span(f"cosmos.{name}", kind=tracing.KIND_CLIENT, **{"db.system": "cosmosdb"}):
+        return await get_call_policy().call(operation)
@@ -0,0 +1,165 @@
+"""
+Non-blocking, structured logging.
+Log calls only put the record on an in-memory queue; a background thread
+formats it (JSON or text) and writes it to stdout, so a slow log pipe never
+blocks the event loop. High-volume INFO loggers can be sampled per logger.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import traceback
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from src import metrics
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# LogRecord attributes that are not user-supplied `extra` fields
+# (uvicorn adds an ANSI-colored copy of its messages as color_message)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "color_message"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def get_logging_config() -> dict:
+    """Get logging configuration from environment variables."""
+    return {
+        "level": os.environ.get("LOG_LEVEL", "INFO").upper(),
+        # "json" for log aggregation, "text" for reading locally
+        "format": os.environ.get("LOG_FORMAT", "json").lower(),
+        # "stderr" keeps stdout free for tools that print results there
+        "stream": os.environ.get("LOG_STREAM", "stdout").lower(),
+        # Records waiting for the writer thread; further records are dropped
+        "queue_size": int(os.environ.get("LOG_QUEUE_SIZE", "10000")),
+        # e.g. "src.repositories=0.01,src.seeding=0.1"
+        "sample_rates": parse_sample_rates(os.environ.get("LOG_SAMPLE_RATES", "")),
+    }
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """Parse "logger=rate,..." into {logger: rate}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra` fields are included as top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = "".join(traceback.format_exception(*record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of INFO-and-below records from the configured loggers
+    (and their children); warnings and errors always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float], seed: Optional[int] = None):
+        super().__init__()
+        self.rates = rates
+        self._random = random.Random(seed)
+        self._sampled_out = metrics.counter("log_records_sampled_out_total", "Log records dropped by sampling")
+
+    def _rate(self, name: str) -> float:
+        # Most specific configured logger wins
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or self._random.random() < rate:
+            return True
+        self._sampled_out.inc()
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks or formats on the caller's thread.
+    Records are handed over as-is (the writer thread does the %-formatting), and
+    are dropped and counted when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self._dropped = metrics.counter("log_records_dropped_total", "Log records dropped because the queue was full")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so nothing needs to be pickled
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._dropped.inc()
+
+
+def build_formatter(log_format: str) -> logging.Formatter:
+    if log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter(TEXT_FORMAT)
+
+
+def configure_logging(config: Optional[dict] = None, stream=None) -> None:
+    """
+    Route the root logger through a queue to a background writer thread.
+    Like logging.basicConfig, does nothing if the root logger already has handlers.
+    """
+    global _listener
+
+    root = logging.getLogger()
+    if root.handlers:
+        return
+
+    config = config or get_logging_config()
+    if stream is None:
+        stream = sys.stderr if config.get("stream") == "stderr" else sys.stdout
+    writer = logging.StreamHandler(stream)
+    writer.setFormatter(build_formatter(config["format"]))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=config["queue_size"])
+    handler = NonBlockingQueueHandler(log_queue)
+    if config["sample_rates"]:
+        handler.addFilter(SamplingFilter(config["sample_rates"]))
+
+    root.addHandler(handler)
+    root.setLevel(config["level"])
+
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
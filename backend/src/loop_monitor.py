@@ -0,0 +1,142 @@
+"""
+Event-loop lag and lock contention monitoring.
+All requests of a worker share one asyncio loop, so one slow synchronous call
+stalls them all. A probe task measures how late the loop wakes up; a watchdog
+thread notices when it is overdue by more than LOOP_BLOCK_THRESHOLD_MS and logs
+the loop thread's stack while it is still blocked. MonitoredLock records how
+long repository locks are waited for and held.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# Lock waits and holds are mostly microseconds; loop stalls start at milliseconds
+LOCK_MS_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+
+def get_loop_monitor_config() -> dict:
+    """Get event-loop monitor configuration from environment variables."""
+    return {
+        "enabled": os.environ.get("LOOP_MONITOR_ENABLED", "true").lower() == "true",
+        # How often the probe checks in; lag is measured at this resolution
+        "interval_ms": float(os.environ.get("LOOP_MONITOR_INTERVAL_MS", "100")),
+        # A loop overdue by more than this is reported as blocked, with its stack
+        "block_threshold_ms": float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS", "100")),
+        # Innermost frames of the blocked stack to log
+        "stack_depth": int(os.environ.get("LOOP_BLOCK_STACK_DEPTH", "20")),
+    }
+
+
+class LoopMonitor:
+    """Lag probe on the event loop plus a watchdog thread for blocked loops."""
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = config or get_loop_monitor_config()
+        self._interval = self.config["interval_ms"] / 1000.0
+        self._threshold = self.config["block_threshold_ms"] / 1000.0
+        # When the probe should next wake; read by the watchdog thread
+        self._due = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+        self._lag = metrics.histogram("event_loop_lag_ms", description="How late the loop ran a timer due now")
+        self._lag_gauge = metrics.gauge("event_loop_lag_last_ms", "Most recent event-loop lag")
+        self._blocked = metrics.counter(
+            "event_loop_blocked_total", "Times the loop ran late by more than LOOP_BLOCK_THRESHOLD_MS"
+        )
+        self._blocked_ms = metrics.histogram(
+            "event_loop_blocked_ms", description="Lag of each wakeup later than LOOP_BLOCK_THRESHOLD_MS"
+        )
+
+    def start(self) -> None:
+        """Start the probe on the running loop and the watchdog thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._due = time.monotonic() + self._interval
+        self._task = asyncio.get_running_loop().create_task(self._probe())
+        if self._threshold > 0:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+
+    async def _probe(self) -> None:
+        while True:
+            self._due = time.monotonic() + self._interval
+            await asyncio.sleep(self._interval)
+            lag_ms = max(0.0, time.monotonic() - self._due) * 1000
+            self._lag.observe(lag_ms)
+            self._lag_gauge.set(lag_ms)
+            if self._threshold > 0 and lag_ms > self._threshold * 1000:
+                self._blocked.inc()
+                self._blocked_ms.observe(lag_ms)
+
+    def _watch(self) -> None:
+        # Check often enough to catch a stall soon after it crosses the threshold
+        poll = max(0.005, self._threshold / 4)
+        reported_due = 0.0
+        while not self._stop.wait(poll):
+            due = self._due
+            overdue = time.monotonic() - due
+            if overdue > self._threshold and due != reported_due:
+                # Once per stall, while the culprit is still on the stack
+                reported_due = due
+                self._report(overdue)
+
+    def _report(self, overdue: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = "".join(traceback.format_stack(frame)[-self.config["stack_depth"]:])
+        logger.warning(
+            "Event loop blocked for over %.0f ms; loop thread is at:\n%s", overdue * 1000, stack
+        )
+
+
+class MonitoredLock:
+    """
+    asyncio.Lock that records wait time (`{name}_wait_ms`), hold time
+    (`{name}_hold_ms`) and how often it was already held (`{name}_contended_total`).
+    """
+
+    def __init__(self, name: str):
+        self._lock = asyncio.Lock()
+        self._acquired_at = 0.0
+        self._wait = metrics.histogram(f"{name}_wait_ms", LOCK_MS_BUCKETS, "Time spent waiting to acquire the lock")
+        self._hold = metrics.histogram(f"{name}_hold_ms", LOCK_MS_BUCKETS, "Time the lock was held")
+        self._contended = metrics.counter(f"{name}_contended_total", "Acquisitions that found the lock held")
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    async def __aenter__(self) -> None:
+        started = time.perf_counter()
+        if self._lock.locked():
+            self._contended.inc()
+        await self._lock.acquire()
+        # Only the holder writes this, so one slot per lock suffices
+        self._acquired_at = time.perf_counter()
+        self._wait.observe((self._acquired_at - started) * 1000)
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._hold.observe((time.perf_counter() - self._acquired_at) * 1000)
+        self._lock.release()
@@ -2,25 +2,56 @@
 FastAPI backend for device inventory management.
 Uses Cosmos DB with Azure managed identity for authentication.
 """
+import time
+
+# Start of app import, for startup-time tracking (see benchmarks/startup.py)
+_IMPORT_STARTED = time.perf_counter()
+
 import logging
 import os
 from contextlib import asynccontextmanager
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Union
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from src.db.cosmos import close_cosmos_client, get_cosmos_client
-from src.schemas import DeviceCreate, DeviceUpdate, DeviceResponse
+from src import metrics, tracing
+from src.db.cosmos import close_cosmos_client, get_cosmos_client, warm_up_credential
+from src.db.throttling import CosmosThrottledError
+from src.logging_config import configure_logging
+from src.loop_monitor import LoopMonitor, get_loop_monitor_config
+from src.middleware.admission import AdmissionControlMiddleware, get_admission_config
+from src.middleware.compression import CompressionMiddleware, get_compression_config
+from src.middleware.idempotency import IdempotencyMiddleware, device_id_for_key, get_idempotency_config
+from src.middleware.list_cache import ListCacheMiddleware, get_list_cache_config
+from src.middleware.profiling import ProfilingMiddleware, get_profiling_config
+from src.middleware.tracing import TracedRoute, TracingMiddleware
+from src.schemas import (
+    DeviceCreate,
+    DeviceUpdate,
+    DeviceResponse,
+    DeviceLookupResponse,
+    DeviceHistoryResponse,
+)
+from src.seeding import get_seed_config, seed_from_config
+from src.tracing import configure_tracing
+from src.repositories.history import as_of_key, check_as_of_sort
+from src.repositories.naming import DuplicateDeviceNameError
+from src.repositories.projection import parse_fields
+from src.repositories.sorting import DEFAULT_SORT, parse_sort
 import src.repositories as device_repo
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Configure logging: records are written to stdout by a background thread
+configure_logging()
+# Start the span exporter if TRACING_ENABLED (see src/tracing.py)
+configure_tracing()
 logger = logging.getLogger(__name__)
 
+# Upper bound on IDs accepted by a single GET /devices?ids=... lookup
+MAX_LOOKUP_IDS = int(os.environ.get("MAX_LOOKUP_IDS", "1000"))
+
 
 async def _seed_test_data():
     """Seed in-memory repository with sample devices for testing."""
@@ -36,33 +67,83 @@ async def _seed_test_data():
         device = DeviceCreate(**device_data)
         await device_repo.create_device(device)
     
-    logger.info(f"Seeded {len(test_devices)} test devices")
+    logger.info("Seeded %d test devices", len(test_devices))
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler for startup and shutdown."""
     logger.info("Starting application...")
+    startup_started = time.perf_counter()
+
+    # Import the selected repository backend (and only its dependencies) before serving
+    device_repo.get_backend()
+    logger.info("Using repository backend: %s", device_repo.get_backend_name())
 
     # Seed test data if in TEST_MODE
     TEST_MODE = os.environ.get("TEST_MODE", "false").lower() == "true"
     if TEST_MODE:
-        logger.info("TEST_MODE enabled: seeding test data...")
-        await _seed_test_data()
-    else:
-        # Test Cosmos DB connection on startup (but don't block if it fails)
+        # Stores shared between workers are seeded by the first worker only
+        claim_seed = getattr(device_repo, "claim_seed", None)
+        if claim_seed is None or await claim_seed():
+            seed_config = get_seed_config()
+            if seed_config["count"] > 0:
+                logger.info("TEST_MODE enabled: seeding %d synthetic devices...", seed_config["count"])
+                await seed_from_config(seed_config)
+            else:
+                logger.info("TEST_MODE enabled: seeding test data...")
+                await _seed_test_data()
+        # Finish indexing the seeded devices before taking traffic
+        warm_cache = getattr(device_repo, "warm_cache", None)
+        if warm_cache is not None:
+            await warm_cache()
+    elif device_repo.get_backend_name() in ("cosmos", "tiered"):
+        # Each worker process creates its own Cosmos client here, after the fork,
+        # and tests the connection on startup (but doesn't block if it fails)
         try:
             await get_cosmos_client()
             logger.info("Cosmos DB connection established")
         except Exception as e:
-            logger.warning(f"Could not connect to Cosmos DB at startup: {e}")
+            logger.warning("Could not connect to Cosmos DB at startup: %s", e)
             # Don't fail startup - let individual requests handle the error
+        else:
+            # Probe credential sources and fetch the token now instead of on
+            # the first request; it is then refreshed in the background
+            try:
+                await warm_up_credential()
+            except Exception as e:
+                logger.warning("Could not acquire Cosmos DB token at startup: %s", e)
+            # Load the hot devices into the in-process tier before taking traffic
+            warm_cache = getattr(device_repo, "warm_cache", None)
+            if warm_cache is not None:
+                try:
+                    await warm_cache()
+                except Exception as e:
+                    logger.warning("Could not warm the device cache at startup: %s", e)
+
+    # Event-loop lag probe and blocked-loop watchdog (see src/loop_monitor.py);
+    # started after seeding, whose long synchronous steps are expected
+    loop_monitor_config = get_loop_monitor_config()
+    loop_monitor = LoopMonitor(loop_monitor_config) if loop_monitor_config["enabled"] else None
+    if loop_monitor is not None:
+        loop_monitor.start()
+
+    startup_ms = (time.perf_counter() - startup_started) * 1000
+    metrics.gauge("startup_import_ms", "Time to import src.main").set(_IMPORT_DURATION_MS)
+    metrics.gauge("startup_lifespan_ms", "Time spent in lifespan startup").set(startup_ms)
+    logger.info("Application ready (import %.0f ms, startup %.0f ms)", _IMPORT_DURATION_MS, startup_ms)
 
     yield
 
     # Cleanup on shutdown
     logger.info("Shutting down application...")
+    # Write out updates still held by write-behind (COSMOS_WRITE_BEHIND_WINDOW_MS)
+    flush_writes = getattr(device_repo, "flush_writes", None)
+    if flush_writes is not None:
+        await flush_writes()
     await close_cosmos_client()
+    if loop_monitor is not None:
+        await loop_monitor.stop()
     logger.info("Application shutdown complete")
 
 
@@ -73,6 +154,48 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Routes declared below get route/endpoint/serialize spans when tracing is on
+if tracing.enabled():
+    app.router.route_class = TracedRoute
+
+# Response compression - innermost, so the CPU it takes counts against admission
+compression_config = get_compression_config()
+if compression_config["enabled"] and compression_config["encodings"]:
+    app.add_middleware(CompressionMiddleware, config=compression_config)
+    logger.info("Response compression enabled: %s", ", ".join(compression_config["encodings"]))
+
+# Admission control - sheds load with 503 instead of queueing without bound.
+# Added before CORS so that rejections still carry CORS headers.
+admission_config = get_admission_config()
+if admission_config["enabled"]:
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        max_reads=admission_config["max_reads"],
+        max_writes=admission_config["max_writes"],
+        queue_size=admission_config["queue_size"],
+        queue_timeout_ms=admission_config["queue_timeout_ms"],
+    )
+
+# Listing cache - outside admission and compression, so a repeated listing
+# takes no slot and replays the already compressed body
+list_cache_config = get_list_cache_config()
+if list_cache_config["enabled"]:
+    app.add_middleware(ListCacheMiddleware, config=list_cache_config)
+
+# Idempotency keys - outside admission, so replayed responses take no slot
+idempotency_config = get_idempotency_config()
+if idempotency_config["enabled"]:
+    app.add_middleware(IdempotencyMiddleware, config=idempotency_config)
+
+# On-demand profiling - outside admission so queueing and middleware time are
+# profiled too; not installed at all unless enabled, so it costs nothing by default
+profiling_config = get_profiling_config()
+if profiling_config["enabled"]:
+    if not profiling_config["token"] and profiling_config["sample_rate"] <= 0:
+        logger.warning("PROFILING_ENABLED is set without PROFILING_TOKEN or PROFILING_SAMPLE_RATE; nothing will be profiled")
+    app.add_middleware(ProfilingMiddleware, config=profiling_config)
+    logger.info("Request profiling enabled; profiles are written to %s", profiling_config["output_dir"])
+
 # CORS middleware - configured from environment variable
 # In production, set ALLOWED_ORIGINS to specific frontend domain(s)
 allowed_origins_str = os.environ.get("ALLOWED_ORIGINS", "*")
@@ -86,7 +209,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-logger.info(f"CORS configured with allowed origins: {allowed_origins}")
+logger.info("CORS configured with allowed origins: %s", allowed_origins)
+
+# Tracing - outermost, so the server span covers every other middleware
+if tracing.enabled():
+    app.add_middleware(TracingMiddleware)
+
+
+@app.exception_handler(CosmosThrottledError)
+async def cosmos_throttled_handler(request: Request, exc: CosmosThrottledError):
+    """Tell clients to back off when Cosmos DB throttling outlasts the retry budget."""
+    logger.warning("Cosmos DB throttled %s %s: %s", request.method, request.url.path, exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily unavailable, please retry"},
+        headers={"Retry-After": exc.retry_after_header},
+    )
+
+
+@app.exception_handler(DuplicateDeviceNameError)
+async def duplicate_name_handler(request: Request, exc: DuplicateDeviceNameError):
+    """Reject creates and renames that would duplicate a name (UNIQUE_DEVICE_NAMES)."""
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
 
 
 @app.get("/health")
@@ -95,65 +239,217 @@ async def health_check():
     return {"status": "healthy"}
 
 
-@app.get("/devices", response_model=List[DeviceResponse])
-async def list_devices(skip: int = 0, limit: int = 100):
-    """List all devices with pagination."""
+@app.get("/metrics")
+async def get_metrics():
+    """In-process metrics for this worker (counters and histograms)."""
+    return metrics.snapshot()
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a `fields=` projection, answering 400 for unknown fields."""
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/devices", response_model=Union[List[DeviceResponse], DeviceLookupResponse])
+async def list_devices(
+    skip: int = 0,
+    limit: int = 100,
+    ids: Optional[str] = None,
+    fields: Optional[str] = None,
+    sort: str = DEFAULT_SORT,
+    site: Optional[str] = None,
+    as_of: Optional[datetime] = None,
+):
+    """
+    List all devices with pagination, or only those of one `site`.
+    `sort` is name, created_at or updated_at, prefixed with - for descending
+    (default: -created_at).
+    With `ids=a,b,c`, look up those devices instead and report the missing IDs.
+    With `fields=id,name`, return only those fields (plus `id`) of each device.
+    With `as_of=<ISO time>`, list the devices as they were at that time
+    (sorted by created_at only).
+    """
+    projection = _parse_fields(fields)
+    if ids is not None:
+        if as_of is not None:
+            raise HTTPException(status_code=400, detail="as_of cannot be combined with ids")
+        return await _lookup_devices(ids, projection)
+
+    try:
+        parse_sort(sort)
+        if as_of is not None:
+            check_as_of_sort(sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
-        return await device_repo.list_devices(skip=skip, limit=limit)
+        devices = await device_repo.list_devices(
+            skip=skip,
+            limit=limit,
+            fields=projection,
+            sort=sort,
+            site=site,
+            as_of=as_of_key(as_of) if as_of is not None else None,
+        )
+    except CosmosThrottledError:
+        raise
     except Exception as e:
-        logger.error(f"Error listing devices: {e}")
+        logger.error("Error listing devices: %s", e)
         raise HTTPException(status_code=500, detail="Failed to list devices")
 
+    # Projected devices are plain dicts and skip response model validation
+    return devices if projection is None else JSONResponse(devices)
+
+
+async def _lookup_devices(ids: str, projection: Optional[List[str]] = None):
+    """Resolve a comma-separated list of device IDs in one repository call."""
+    # Preserve request order, drop blanks and duplicates
+    device_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    if len(device_ids) > MAX_LOOKUP_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many IDs (maximum {MAX_LOOKUP_IDS})",
+        )
+
+    try:
+        devices = await device_repo.get_devices(device_ids, fields=projection)
+    except CosmosThrottledError:
+        raise
+    except Exception as e:
+        logger.error("Error looking up devices: %s", e)
+        raise HTTPException(status_code=500, detail="Failed to look up devices")
+
+    if projection is not None:
+        found = {device["id"] for device in devices}
+        missing = [device_id for device_id in device_ids if device_id not in found]
+        return JSONResponse({"devices": devices, "missing": missing})
+
+    found = {device.id for device in devices}
+    return DeviceLookupResponse(
+        devices=devices,
+        missing=[device_id for device_id in device_ids if device_id not in found],
+    )
+
+
+@app.get("/devices/by-name/{name}", response_model=DeviceResponse)
+async def get_device_by_name(name: str, fields: Optional[str] = None, site: Optional[str] = None):
+    """
+    Get the device with this name (in `site`, when given).
+    Answers 409 when several devices share the name, which can only happen
+    without UNIQUE_DEVICE_NAMES or across sites.
+    """
+    projection = _parse_fields(fields)
+    try:
+        devices = await device_repo.get_devices_by_name(name, fields=projection, site=site)
+    except CosmosThrottledError:
+        raise
+    except Exception as e:
+        logger.error("Error looking up device named %s: %s", name, e)
+        raise HTTPException(status_code=500, detail="Failed to get device")
+
+    if not devices:
+        raise HTTPException(status_code=404, detail="Device not found")
+    if len(devices) > 1:
+        raise HTTPException(
+            status_code=409,
+            detail=f"{len(devices)} devices are named {name!r}; look them up by ID or pass site=",
+        )
+    return devices[0] if projection is None else JSONResponse(devices[0])
+
+
+@app.get("/devices/{device_id}/history", response_model=DeviceHistoryResponse)
+async def get_device_history(device_id: str):
+    """Every recorded change of a device, oldest first (also after it was deleted)."""
+    try:
+        events = await device_repo.get_device_history(device_id)
+    except CosmosThrottledError:
+        raise
+    except Exception as e:
+        logger.error("Error getting history of device %s: %s", device_id, e)
+        raise HTTPException(status_code=500, detail="Failed to get device history")
+
+    if events is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return DeviceHistoryResponse(device_id=device_id, events=events)
+
 
 @app.get("/devices/{device_id}", response_model=DeviceResponse)
-async def get_device(device_id: str):
-    """Get a device by ID."""
+async def get_device(
+    device_id: str,
+    fields: Optional[str] = None,
+    site: Optional[str] = None,
+    as_of: Optional[datetime] = None,
+):
+    """
+    Get a device by ID, optionally with only the `fields` requested.
+    Passing the device's `site` lets a site-partitioned store read one partition only.
+    With `as_of=<ISO time>`, get the device as it was at that time.
+    """
+    projection = _parse_fields(fields)
     try:
-        device = await device_repo.get_device(device_id)
+        device = await device_repo.get_device(
+            device_id,
+            fields=projection,
+            site=site,
+            as_of=as_of_key(as_of) if as_of is not None else None,
+        )
         if device is None:
             raise HTTPException(status_code=404, detail="Device not found")
-        return device
-    except HTTPException:
+        return device if projection is None else JSONResponse(device)
+    except (HTTPException, CosmosThrottledError):
         raise
     except Exception as e:
-        logger.error(f"Error getting device {device_id}: {e}")
+        logger.error("Error getting device %s: %s", device_id, e)
         raise HTTPException(status_code=500, detail="Failed to get device")
 
 
 @app.post("/devices", response_model=DeviceResponse, status_code=201)
-async def create_device(device: DeviceCreate):
-    """Create a new device."""
+async def create_device(device: DeviceCreate, idempotency_key: Optional[str] = Header(None)):
+    """
+    Create a new device. With an `Idempotency-Key`, the device ID is derived
+    from the key, so a retry handled by another worker returns the same device.
+    """
+    device_id = device_id_for_key(idempotency_key) if idempotency_key and idempotency_config["enabled"] else None
     try:
-        return await device_repo.create_device(device)
+        return await device_repo.create_device(device, device_id=device_id)
+    except (CosmosThrottledError, DuplicateDeviceNameError):
+        raise
     except Exception as e:
-        logger.error(f"Error creating device: {e}")
+        logger.error("Error creating device: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create device")
 
 
 @app.put("/devices/{device_id}", response_model=DeviceResponse)
-async def update_device(device_id: str, device: DeviceUpdate):
-    """Update an existing device."""
+async def update_device(device_id: str, device: DeviceUpdate, site: Optional[str] = None):
+    """Update an existing device (in `site`, when given)."""
     try:
-        updated = await device_repo.update_device(device_id, device)
+        updated = await device_repo.update_device(device_id, device, site=site)
         if updated is None:
             raise HTTPException(status_code=404, detail="Device not found")
         return updated
-    except HTTPException:
+    except (HTTPException, CosmosThrottledError, DuplicateDeviceNameError):
         raise
     except Exception as e:
-        logger.error(f"Error updating device {device_id}: {e}")
+        logger.error("Error updating device %s: %s", device_id, e)
         raise HTTPException(status_code=500, detail="Failed to update device")
 
 
 @app.delete("/devices/{device_id}", status_code=204)
-async def delete_device(device_id: str):
-    """Delete a device by ID."""
+async def delete_device(device_id: str, site: Optional[str] = None):
+    """Delete a device by ID (in `site`, when given)."""
     try:
-        deleted = await device_repo.delete_device(device_id)
+        deleted = await device_repo.delete_device(device_id, site=site)
         if not deleted:
             raise HTTPException(status_code=404, detail="Device not found")
-    except HTTPException:
+    except (HTTPException, CosmosThrottledError):
         raise
     except Exception as e:
-        logger.error(f"Error deleting device {device_id}: {e}")
+        logger.error("Error deleting device %s: %s", device_id, e)
         raise HTTPException(status_code=500, detail="Failed to delete device")
+
+
+# Everything above ran at import time
+_IMPORT_DURATION_MS = (time.perf_counter() - _IMPORT_STARTED) * 1000
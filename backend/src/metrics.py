@@ -0,0 +1,143 @@
+"""
+Lightweight in-process metrics (counters and histograms).
+Values are per worker process and exposed as JSON on GET /metrics.
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence
+
+# Default histogram buckets for latencies in milliseconds
+LATENCY_MS_BUCKETS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Counter:
+    """Monotonically increasing counter."""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "counter", "description": self.description, "value": self._value}
+
+
+class Gauge:
+    """Value that can go up and down."""
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0.0
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "gauge", "description": self.description, "value": self._value}
+
+
+class Histogram:
+    """Fixed-bucket histogram with count, sum and max."""
+
+    def __init__(self, name: str, buckets: Sequence[float], description: str = ""):
+        self.name = name
+        self.description = description
+        self._bounds: List[float] = sorted(buckets)
+        # One extra slot for observations above the largest bound (+Inf)
+        self._counts: List[int] = [0] * (len(self._bounds) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            count, total, maximum = self._count, self._sum, self._max
+
+        buckets: Dict[str, int] = {}
+        cumulative = 0
+        for bound, bucket_count in zip(self._bounds, counts):
+            cumulative += bucket_count
+            buckets[f"{bound:g}"] = cumulative
+        buckets["+Inf"] = cumulative + counts[-1]
+
+        return {
+            "type": "histogram",
+            "description": self.description,
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "max": maximum,
+            "buckets": buckets,
+        }
+
+
+_registry: Dict[str, object] = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(name: str, factory):
+    metric = _registry.get(name)
+    if metric is None:
+        with _registry_lock:
+            metric = _registry.get(name)
+            if metric is None:
+                metric = factory()
+                _registry[name] = metric
+    return metric
+
+
+def counter(name: str, description: str = "") -> Counter:
+    """Get or create a counter by name."""
+    return _get_or_create(name, lambda: Counter(name, description))
+
+
+def gauge(name: str, description: str = "") -> Gauge:
+    """Get or create a gauge by name."""
+    return _get_or_create(name, lambda: Gauge(name, description))
+
+
+def histogram(
+    name: str,
+    buckets: Sequence[float] = LATENCY_MS_BUCKETS,
+    description: str = "",
+) -> Histogram:
+    """Get or create a histogram by name."""
+    return _get_or_create(name, lambda: Histogram(name, buckets, description))
+
+
+def snapshot(prefix: Optional[str] = None) -> dict:
+    """Return a JSON-serializable view of all registered metrics."""
+    return {
+        name: metric.snapshot()
+        for name, metric in sorted(_registry.items())
+        if prefix is None or name.startswith(prefix)
+    }
@@ -0,0 +1,155 @@
+"""
+Admission control and load shedding.
+Caps concurrent requests per route class (reads vs writes) with a bounded wait
+queue; requests that cannot start before their deadline fail fast with 503.
+Health probes bypass admission entirely so they never queue behind traffic.
+"""
+import asyncio
+import collections
+import json
+import logging
+import os
+import time
+from typing import Iterable, Optional
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def get_admission_config() -> dict:
+    """Get admission control configuration from environment variables."""
+    return {
+        "enabled": os.environ.get("ADMISSION_CONTROL_ENABLED", "true").lower() == "true",
+        "max_reads": int(os.environ.get("ADMISSION_MAX_READS", "256")),
+        "max_writes": int(os.environ.get("ADMISSION_MAX_WRITES", "64")),
+        "queue_size": int(os.environ.get("ADMISSION_QUEUE_SIZE", "512")),
+        "queue_timeout_ms": float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_MS", "2000")),
+    }
+
+
+class AdmissionGate:
+    """Concurrency limit with a bounded FIFO wait queue and a queueing deadline."""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters: collections.deque[asyncio.Future] = collections.deque()
+
+        self._in_flight_gauge = metrics.gauge(
+            f"admission_{name}_in_flight", f"{name} requests currently being served"
+        )
+        self._queued_gauge = metrics.gauge(
+            f"admission_{name}_queued", f"{name} requests waiting for admission"
+        )
+        self._rejected = metrics.counter(
+            f"admission_{name}_rejected_total", f"{name} requests shed with 503"
+        )
+        self._wait_ms = metrics.histogram(
+            f"admission_{name}_wait_ms", description=f"Time {name} requests spent queued"
+        )
+
+    async def acquire(self) -> bool:
+        """Wait for a slot; return False if the request should be shed."""
+        if self._in_flight < self.max_concurrency and not self._waiters:
+            self._take_slot()
+            return True
+
+        if len(self._waiters) >= self.max_queue:
+            self._rejected.inc()
+            return False
+
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._queued_gauge.set(len(self._waiters))
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._rejected.inc()
+            return False
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            if future in self._waiters:
+                self._waiters.remove(future)
+            self._queued_gauge.set(len(self._waiters))
+            self._wait_ms.observe((time.perf_counter() - started) * 1000)
+
+        return True
+
+    def release(self) -> None:
+        """Free a slot and hand it to the oldest waiter, if any."""
+        self._in_flight -= 1
+        while self._waiters and self._in_flight < self.max_concurrency:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._take_slot()
+                waiter.set_result(None)
+        self._in_flight_gauge.set(self._in_flight)
+
+    def _take_slot(self) -> None:
+        self._in_flight += 1
+        self._in_flight_gauge.set(self._in_flight)
+
+
+class AdmissionControlMiddleware:
+    """Pure ASGI middleware applying an AdmissionGate per route class."""
+
+    def __init__(
+        self,
+        app,
+        max_reads: int = 256,
+        max_writes: int = 64,
+        queue_size: int = 512,
+        queue_timeout_ms: float = 2000,
+        exempt_paths: Iterable[str] = ("/health",),
+    ):
+        self.app = app
+        timeout = queue_timeout_ms / 1000.0
+        self.reads = AdmissionGate("reads", max_reads, queue_size, timeout)
+        self.writes = AdmissionGate("writes", max_writes, queue_size, timeout)
+        self.exempt_paths = frozenset(exempt_paths)
+        # Shed requests are told to retry after roughly one queueing deadline
+        self._retry_after = str(max(1, round(timeout)))
+
+    def _gate_for(self, scope) -> Optional[AdmissionGate]:
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            return None
+        return self.reads if scope["method"] in READ_METHODS else self.writes
+
+    async def __call__(self, scope, receive, send):
+        gate = self._gate_for(scope)
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await gate.acquire():
+            logger.warning("Shedding %s %s: %s capacity exhausted", scope["method"], scope["path"], gate.name)
+            await self._reject(send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+    async def _reject(self, send) -> None:
+        body = json.dumps({"detail": "Server overloaded, please retry"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", self._retry_after.encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
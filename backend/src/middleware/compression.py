@@ -0,0 +1,247 @@
+"""
+Content-negotiated response compression.
+Compresses JSON/text responses above a size threshold with the best encoding the
+client accepts: zstd or brotli when their packages are installed, gzip otherwise.
+Streamed responses are compressed incrementally, flushing after each chunk.
+"""
+import os
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from src import metrics
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/problem+json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/xml",
+    "text/",
+)
+
+
+def available_encodings() -> List[str]:
+    """Encodings this process can produce, best first."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def get_compression_config() -> dict:
+    """Get compression configuration from environment variables."""
+    return {
+        "enabled": os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true",
+        # Smaller bodies gain little and cost a full round of compressor setup
+        "min_size": int(os.environ.get("COMPRESSION_MIN_SIZE", "1024")),
+        # Server preference among what the client accepts
+        "encodings": [
+            e.strip()
+            for e in os.environ.get("COMPRESSION_ENCODINGS", ",".join(available_encodings())).split(",")
+            if e.strip() in available_encodings()
+        ],
+        # Fast levels: API payloads are compressed on every request
+        "gzip_level": int(os.environ.get("COMPRESSION_GZIP_LEVEL", "5")),
+        "brotli_quality": int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "4")),
+        "zstd_level": int(os.environ.get("COMPRESSION_ZSTD_LEVEL", "3")),
+    }
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(header: str, preferred: List[str]) -> Optional[str]:
+    """Pick the first preferred encoding the client accepts (q > 0), if any."""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+    for encoding in preferred:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    """Streaming compressor with a common compress/flush/finish interface."""
+
+    def __init__(self, encoding: str, config: dict):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(config["gzip_level"], zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=config["brotli_quality"])
+        else:
+            self._obj = zstandard.ZstdCompressor(level=config["zstd_level"]).compressobj()
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._obj.process(data)
+            return out + self._obj.flush() if flush else out
+        out = self._obj.compress(data)
+        if not flush:
+            return out
+        if self.encoding == "gzip":
+            return out + self._obj.flush(zlib.Z_SYNC_FLUSH)
+        return out + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing eligible responses."""
+
+    def __init__(self, app, config: Optional[dict] = None):
+        self.app = app
+        self.config = config or get_compression_config()
+        self._bytes_in = metrics.counter("compression_bytes_in_total", "Response bytes before compression")
+        self._bytes_out = metrics.counter("compression_bytes_out_total", "Response bytes after compression")
+        self._compress_ms = metrics.histogram("compression_ms", description="CPU time spent compressing a response")
+
+    def _accept_encoding(self, scope) -> str:
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                return value.decode("latin-1")
+        return ""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD" or not self.config["encodings"]:
+            await self.app(scope, receive, send)
+            return
+
+        # Without an acceptable encoding, eligible responses still get Vary
+        encoding = negotiate(self._accept_encoding(scope), self.config["encodings"])
+        responder = _CompressingResponder(send, encoding, self)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressingResponder:
+    """Holds back http.response.start until the first body chunk decides on compression."""
+
+    def __init__(self, send, encoding: Optional[str], middleware: CompressionMiddleware):
+        self._send = send
+        self.encoding = encoding
+        self.middleware = middleware
+        self._start: Optional[dict] = None
+        self._compressor: Optional[_Compressor] = None
+        self._passthrough = False
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._cpu_s = 0.0
+
+    @staticmethod
+    def _eligible(start: dict) -> bool:
+        if start["status"] < 200 or start["status"] in (204, 304):
+            return False
+        content_type = b""
+        for name, value in start.get("headers", []):
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value
+        return content_type.decode("latin-1").lower().startswith(COMPRESSIBLE_TYPES)
+
+    async def send(self, message: dict) -> None:
+        if message["type"] == "http.response.start":
+            self._start = message
+            if not self._eligible(message):
+                self._passthrough = True
+                await self._send(message)
+            elif self.encoding is None:
+                self._passthrough = True
+                await self._send(_with_vary(message))
+            return
+
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._compressor is None:
+            if not more_body and len(body) < self.middleware.config["min_size"]:
+                # Complete and small: not worth compressing
+                self._passthrough = True
+                await self._send(_with_vary(self._start))
+                await self._send(message)
+                return
+            self._compressor = _Compressor(self.encoding, self.middleware.config)
+
+        started = time.process_time()
+        data = self._compressor.compress(body, flush=more_body)
+        if not more_body:
+            data += self._compressor.finish()
+        self._cpu_s += time.process_time() - started
+        self._bytes_in += len(body)
+        self._bytes_out += len(data)
+
+        if self._start is not None:
+            # A body sent in one message keeps an exact Content-Length;
+            # streamed bodies fall back to chunked transfer encoding
+            await self._send(self._compressed_start(None if more_body else len(data)))
+            self._start = None
+        if data or not more_body:
+            await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
+        if not more_body:
+            self._record()
+
+    def _compressed_start(self, content_length: Optional[int]) -> dict:
+        headers: List[Tuple[bytes, bytes]] = [
+            (name, value)
+            for name, value in self._start.get("headers", [])
+            if name != b"content-length"
+        ]
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        return _with_vary({**self._start, "headers": headers})
+
+    def _record(self) -> None:
+        self.middleware._bytes_in.inc(self._bytes_in)
+        self.middleware._bytes_out.inc(self._bytes_out)
+        self.middleware._compress_ms.observe(self._cpu_s * 1000)
+
+
+def _with_vary(start: dict) -> dict:
+    """
+    The response start with Vary: Accept-Encoding. Every eligible response
+    carries it, compressed or not, so shared caches key on the encoding.
+    """
+    headers = list(start.get("headers", []))
+    if any(name == b"vary" and b"accept-encoding" in value.lower() for name, value in headers):
+        return start
+    headers.append((b"vary", b"Accept-Encoding"))
+    return {**start, "headers": headers}
@@ -0,0 +1,233 @@
+"""
+Idempotency-Key support for mutations.
+The first POST/PUT/PATCH/DELETE carrying a key runs as usual and its response is
+kept for IDEMPOTENCY_TTL_SECONDS; repeats of the key replay that response
+without reaching the route, and concurrent repeats wait for the first to finish.
+Responses are cached per worker process; so that a retry reaching another
+worker or replica cannot create a second device, POST /devices also derives
+the new device's ID from the key (device_id_for_key) and the repository
+returns the existing device for an ID it already has.
+
+Responses are stored as sent, after compression, so the key includes the
+request's Accept-Encoding: a repeat asking for another encoding runs again
+rather than being replayed a body it cannot decode.
+"""
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+MUTATING_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+MAX_KEY_LENGTH = 255
+
+# Headers describing the original response only, not replayed
+_NOT_REPLAYED = frozenset({b"date", b"server", b"x-trace-id", b"x-profile-id"})
+
+# Namespace of device IDs derived from Idempotency-Keys
+DEVICE_ID_NAMESPACE = uuid.UUID("5b0e8f5e-3c1d-4a7f-9d2e-6f4b8a1c0e37")
+
+
+def get_idempotency_config() -> dict:
+    """Get idempotency key configuration from environment variables."""
+    return {
+        "enabled": os.environ.get("IDEMPOTENCY_ENABLED", "true").lower() == "true",
+        "ttl_s": float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "3600")),
+        # Cached responses per worker; the oldest are evicted first
+        "max_entries": int(os.environ.get("IDEMPOTENCY_MAX_ENTRIES", "10000")),
+        # Larger responses are not cached (repeats then run again)
+        "max_body_bytes": int(os.environ.get("IDEMPOTENCY_MAX_BODY_BYTES", "65536")),
+        # How long a repeat waits for the first request before answering 409
+        "wait_timeout_ms": float(os.environ.get("IDEMPOTENCY_WAIT_TIMEOUT_MS", "30000")),
+    }
+
+
+def device_id_for_key(idempotency_key: str) -> str:
+    """ID for the device created by `POST /devices` with `idempotency_key`; the same in every worker."""
+    return str(uuid.uuid5(DEVICE_ID_NAMESPACE, idempotency_key))
+
+
+class _StoredResponse:
+    __slots__ = ("fingerprint", "status", "headers", "body", "expires_at")
+
+    def __init__(self, fingerprint: str, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, expires_at: float):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.expires_at = expires_at
+
+
+class IdempotencyCache:
+    """Bounded TTL cache of responses by key, plus the keys whose first request is still running."""
+
+    def __init__(self, ttl_s: float = 3600, max_entries: int = 10000):
+        self.ttl_s = ttl_s
+        self.max_entries = max(1, max_entries)
+        # Oldest first: entries share one TTL, so expiry order is insertion order
+        self._responses: collections.OrderedDict[tuple, _StoredResponse] = collections.OrderedDict()
+        self._in_progress: Dict[tuple, asyncio.Future] = {}
+        self._size_gauge = metrics.gauge("idempotency_cached_responses", "Responses held for idempotent replay")
+
+    def get(self, key: tuple) -> Optional[_StoredResponse]:
+        stored = self._responses.get(key)
+        if stored is not None and stored.expires_at <= time.monotonic():
+            del self._responses[key]
+            self._size_gauge.set(len(self._responses))
+            return None
+        return stored
+
+    def put(self, key: tuple, fingerprint: str, status: int, headers: list, body: bytes) -> None:
+        now = time.monotonic()
+        self._responses.pop(key, None)
+        self._responses[key] = _StoredResponse(fingerprint, status, headers, body, now + self.ttl_s)
+        while self._responses:
+            oldest = next(iter(self._responses.values()))
+            if len(self._responses) <= self.max_entries and oldest.expires_at > now:
+                break
+            self._responses.popitem(last=False)
+        self._size_gauge.set(len(self._responses))
+
+    def begin(self, key: tuple) -> Optional[asyncio.Future]:
+        """Claim `key` for this request; returns the first request's future if already claimed."""
+        running = self._in_progress.get(key)
+        if running is None:
+            self._in_progress[key] = asyncio.get_running_loop().create_future()
+        return running
+
+    def finish(self, key: tuple) -> None:
+        future = self._in_progress.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware honoring the Idempotency-Key header on mutations."""
+
+    def __init__(self, app, config: Optional[dict] = None):
+        self.app = app
+        self.config = config or get_idempotency_config()
+        self.cache = IdempotencyCache(self.config["ttl_s"], self.config["max_entries"])
+        self._wait_timeout = self.config["wait_timeout_ms"] / 1000.0
+        self._replayed = metrics.counter("idempotency_replayed_total", "Responses replayed for a repeated Idempotency-Key")
+        self._waited = metrics.counter(
+            "idempotency_waited_total", "Repeats that waited for the first request with their key"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in MUTATING_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        idempotency_key = None
+        accept_encoding = b""
+        for name, value in scope["headers"]:
+            if name == b"idempotency-key":
+                idempotency_key = value.decode("latin-1")
+            elif name == b"accept-encoding":
+                accept_encoding = value
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _send_json(send, 400, {"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"})
+            return
+
+        # The request body is part of the fingerprint, so read it up front and replay it
+        messages = []
+        body = hashlib.sha256()
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            body.update(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        fingerprint = body.hexdigest()
+        key = (scope["method"], scope["path"], scope.get("query_string", b""), accept_encoding, idempotency_key)
+
+        while True:
+            stored = self.cache.get(key)
+            if stored is not None:
+                await self._replay(send, stored, fingerprint)
+                return
+
+            running = self.cache.begin(key)
+            if running is None:
+                break
+            self._waited.inc()
+            try:
+                await asyncio.wait_for(asyncio.shield(running), timeout=self._wait_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Gave up waiting for %s %s with Idempotency-Key %s", scope["method"], scope["path"], idempotency_key)
+                await _send_json(
+                    send, 409, {"detail": "A request with this Idempotency-Key is still in progress"},
+                    [(b"retry-after", b"1")],
+                )
+                return
+            # The first request's response is stored now, unless it failed;
+            # then this repeat runs the request itself
+
+        async def replay_receive():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        status = 0
+        headers: list = []
+        chunks: List[bytes] = []
+        size = 0
+
+        async def send_and_record(message: dict) -> None:
+            nonlocal status, headers, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [(name, value) for name, value in message.get("headers", []) if name.lower() not in _NOT_REPLAYED]
+            elif message["type"] == "http.response.body" and size <= self.config["max_body_bytes"]:
+                chunk = message.get("body", b"")
+                chunks.append(chunk)
+                size += len(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, send_and_record)
+            # Server errors are not final: a retry should run again
+            if 0 < status < 500 and size <= self.config["max_body_bytes"]:
+                self.cache.put(key, fingerprint, status, headers, b"".join(chunks))
+        finally:
+            self.cache.finish(key)
+
+    async def _replay(self, send, stored: _StoredResponse, fingerprint: str) -> None:
+        if stored.fingerprint != fingerprint:
+            await _send_json(send, 422, {"detail": "Idempotency-Key was already used with a different request body"})
+            return
+        self._replayed.inc()
+        await send({
+            "type": "http.response.start",
+            "status": stored.status,
+            "headers": [*stored.headers, (b"idempotent-replayed", b"true")],
+        })
+        await send({"type": "http.response.body", "body": stored.body})
+
+
+async def _send_json(send, status: int, content: dict, headers: Optional[list] = None) -> None:
+    body = json.dumps(content).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *(headers or []),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
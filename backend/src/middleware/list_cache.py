@@ -0,0 +1,129 @@
+"""
+Cache of serialized `GET /devices` responses.
+Responses are kept by query string (and Accept-Encoding, since they are stored
+compressed) together with the repository write version; any create, update or
+delete changes the version and empties the cache, so a repeated listing
+between writes is answered with one dictionary lookup.
+
+Only the memory (one worker) and shared_memory (shared log sequence) backends
+see every write of the node in their version, so the cache is on by default
+for them only; with the Cosmos backends a write through another worker would
+go unnoticed until LIST_CACHE_TTL_SECONDS passes.
+"""
+import collections
+import os
+import time
+from typing import List, Optional, Tuple
+
+from src import metrics
+import src.repositories as device_repo
+
+# Listings whose responses are cached
+CACHED_PATHS = frozenset({"/devices"})
+
+# Headers describing the original response only, not replayed
+_NOT_REPLAYED = frozenset({b"date", b"server", b"x-trace-id", b"x-profile-id"})
+
+# Backends whose write version counts the writes of every worker
+SHARED_VERSION_BACKENDS = frozenset({"memory", "shared_memory"})
+
+
+def get_list_cache_config() -> dict:
+    """Get list cache configuration from environment variables."""
+    default_enabled = "true" if device_repo.get_backend_name() in SHARED_VERSION_BACKENDS else "false"
+    return {
+        "enabled": os.environ.get("LIST_CACHE_ENABLED", default_enabled).lower() == "true",
+        # Cached pages per worker; the least recently used are evicted first
+        "max_entries": int(os.environ.get("LIST_CACHE_MAX_ENTRIES", "256")),
+        # Larger responses are not cached
+        "max_body_bytes": int(os.environ.get("LIST_CACHE_MAX_BODY_BYTES", "1048576")),
+        # Bound on staleness from writes the write version cannot see (other
+        # replicas, or other workers when enabled for the cosmos backends); 0 never expires
+        "ttl_s": float(os.environ.get("LIST_CACHE_TTL_SECONDS", "5")),
+    }
+
+
+class _CachedResponse:
+    __slots__ = ("headers", "body", "expires_at")
+
+    def __init__(self, headers: List[Tuple[bytes, bytes]], body: bytes, expires_at: float):
+        self.headers = headers
+        self.body = body
+        self.expires_at = expires_at
+
+
+class ListCacheMiddleware:
+    """Pure ASGI middleware replaying cached listing responses until the next write."""
+
+    def __init__(self, app, config: Optional[dict] = None):
+        self.app = app
+        self.config = config or get_list_cache_config()
+        self._max_entries = max(1, self.config["max_entries"])
+        self._ttl = self.config["ttl_s"]
+        # Least recently used first; every entry was stored at self._version
+        self._responses: collections.OrderedDict[tuple, _CachedResponse] = collections.OrderedDict()
+        self._version: Optional[int] = None
+
+        self._hits = metrics.counter("list_cache_hits_total", "Listings answered from the list cache")
+        self._misses = metrics.counter("list_cache_misses_total", "Listings that ran the query")
+        self._invalidations = metrics.counter(
+            "list_cache_invalidations_total", "Times the list cache was emptied because devices changed"
+        )
+        self._size_gauge = metrics.gauge("list_cache_entries", "Listing responses held")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in CACHED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        version = device_repo.write_version()
+        if version != self._version:
+            if self._responses:
+                self._responses.clear()
+                self._size_gauge.set(0)
+                self._invalidations.inc()
+            self._version = version
+
+        accept_encoding = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value
+                break
+        key = (scope["path"], scope.get("query_string", b""), accept_encoding)
+
+        cached = self._responses.get(key)
+        if cached is not None:
+            if self._ttl <= 0 or cached.expires_at > time.monotonic():
+                self._responses.move_to_end(key)
+                self._hits.inc()
+                await send({"type": "http.response.start", "status": 200, "headers": cached.headers})
+                await send({"type": "http.response.body", "body": cached.body})
+                return
+            del self._responses[key]
+        self._misses.inc()
+
+        status = 0
+        headers: list = []
+        chunks: List[bytes] = []
+        size = 0
+
+        async def send_and_record(message: dict) -> None:
+            nonlocal status, headers, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [(name, value) for name, value in message.get("headers", []) if name.lower() not in _NOT_REPLAYED]
+            elif message["type"] == "http.response.body" and size <= self.config["max_body_bytes"]:
+                chunk = message.get("body", b"")
+                chunks.append(chunk)
+                size += len(chunk)
+            await send(message)
+
+        await self.app(scope, receive, send_and_record)
+
+        # Only if no write happened meanwhile: the response may predate it
+        if status == 200 and size <= self.config["max_body_bytes"] and device_repo.write_version() == version == self._version:
+            self._responses[key] = _CachedResponse(headers, b"".join(chunks), time.monotonic() + self._ttl)
+            self._responses.move_to_end(key)
+            while len(self._responses) > self._max_entries:
+                self._responses.popitem(last=False)
+            self._size_gauge.set(len(self._responses))
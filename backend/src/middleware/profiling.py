@@ -0,0 +1,223 @@
+"""
+On-demand request profiling.
+Requests carrying the PROFILING_TOKEN in an X-Profile header, or a sampled
+fraction of all requests, run under cProfile. Each profile is written to
+PROFILING_OUTPUT_DIR (a .prof file for pstats/snakeviz and a .txt report), or
+returned in place of the response body with `X-Profile-Response: inline`.
+The middleware is only installed when PROFILING_ENABLED=true.
+"""
+import asyncio
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# Where a function's own time is booked, by substring of "file:function"
+# (C functions have no file; their names still mention their module)
+CATEGORIES = (
+    ("repository", ("/src/repositories/", "/src/db/", "/azure/")),
+    ("serialization", ("/pydantic/", "pydantic_core", "/fastapi/encoders.py", "/json/", "_json", "/starlette/responses.py")),
+    ("middleware", ("/src/middleware/", "/starlette/middleware/", "/fastapi/middleware/")),
+    ("handler", ("/src/main.py",)),
+    ("framework", ("/fastapi/", "/starlette/", "/uvicorn/", "/anyio/")),
+    ("event_loop", ("/asyncio/", "uvloop", "select")),
+)
+
+
+def get_profiling_config() -> dict:
+    """Get profiling configuration from environment variables."""
+    return {
+        "enabled": os.environ.get("PROFILING_ENABLED", "false").lower() == "true",
+        # Requests sending "X-Profile: <token>" are profiled; empty disables the header
+        "token": os.environ.get("PROFILING_TOKEN", ""),
+        # Fraction of all requests profiled without the header
+        "sample_rate": float(os.environ.get("PROFILING_SAMPLE_RATE", "0")),
+        "output_dir": os.environ.get("PROFILING_OUTPUT_DIR")
+        or os.path.join(tempfile.gettempdir(), "inventory-profiles"),
+        # Functions listed in reports
+        "top_n": int(os.environ.get("PROFILING_TOP_N", "30")),
+    }
+
+
+def _category(filename: str, function: str) -> str:
+    location = f"{filename}:{function}"
+    for category, markers in CATEGORIES:
+        if any(marker in location for marker in markers):
+            return category
+    return "other"
+
+
+def breakdown(stats: pstats.Stats) -> Dict[str, float]:
+    """Milliseconds of own (not cumulative) time per category; sums to the profiled total."""
+    totals: Dict[str, float] = {category: 0.0 for category, _ in CATEGORIES}
+    totals["other"] = 0.0
+    for (filename, _, function), (_, _, tottime, _, callers) in stats.stats.items():
+        category = _category(filename, function)
+        if category == "other" and filename == "~" and callers:
+            # Unrecognized C functions (zlib, datetime, dict methods) count
+            # towards whoever called them
+            for (caller_file, _, caller_function), caller_stats in callers.items():
+                totals[_category(caller_file, caller_function)] += caller_stats[2] * 1000
+            continue
+        totals[category] += tottime * 1000
+    return {category: round(ms, 3) for category, ms in totals.items()}
+
+
+def top_functions(stats: pstats.Stats, limit: int) -> List[dict]:
+    """The `limit` functions with the most cumulative time."""
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [
+        {
+            "function": pstats.func_std_string(func),
+            "calls": nc,
+            "own_ms": round(tottime * 1000, 3),
+            "cumulative_ms": round(cumtime * 1000, 3),
+        }
+        for func, (_, nc, tottime, cumtime, _) in rows
+    ]
+
+
+def build_report(profile: cProfile.Profile, request_line: str, elapsed_ms: float, top_n: int) -> dict:
+    """Summary of a finished profile: time per category and the top functions."""
+    stats = pstats.Stats(profile)
+    return {
+        "request": request_line,
+        "elapsed_ms": round(elapsed_ms, 3),
+        "profiled_ms": round(stats.total_tt * 1000, 3),
+        "breakdown_ms": breakdown(stats),
+        "top": top_functions(stats, top_n),
+    }
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware profiling selected requests with cProfile.
+    cProfile sees everything the worker's thread runs, so concurrent requests
+    interleaved on the event loop show up too; profile on a quiet worker for
+    clean call trees. Only one request per worker is profiled at a time.
+    """
+
+    def __init__(self, app, config: Optional[dict] = None):
+        self.app = app
+        self.config = config or get_profiling_config()
+        self._token = self.config["token"].encode()
+        self._active = False
+        self._random = random.Random()
+        self._profiled = metrics.counter("profiled_requests_total", "Requests run under the profiler")
+
+    def _wants_profile(self, scope) -> tuple:
+        """(profile this request?, return the report inline?)"""
+        token = None
+        inline = False
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                token = value
+            elif name == b"x-profile-response":
+                inline = value.lower() == b"inline"
+        if token is not None and self._token and hmac.compare_digest(token, self._token):
+            return True, inline
+        if self.config["sample_rate"] > 0 and self._random.random() < self.config["sample_rate"]:
+            return True, False
+        return False, False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active:
+            await self.app(scope, receive, send)
+            return
+
+        profile_it, inline = self._wants_profile(scope)
+        if not profile_it:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{_slug(scope['path'])}-{uuid.uuid4().hex[:8]}"
+        request_line = f"{scope['method']} {scope['path']}"
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a debugger) owns the thread
+            logger.warning("Cannot profile %s: %s", request_line, e)
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        self._profiled.inc()
+        captured: List[dict] = []
+
+        async def send_with_id(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            if inline:
+                captured.append(message)
+            else:
+                await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.disable()
+            self._active = False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        report = await asyncio.to_thread(self._save, profile, profile_id, request_line, elapsed_ms)
+        logger.info(
+            "Profiled %s in %.1f ms: %s", request_line, elapsed_ms, report["breakdown_ms"],
+            extra={"profile_id": profile_id},
+        )
+        if inline:
+            await self._send_report(send, captured, report)
+
+    def _save(self, profile: cProfile.Profile, profile_id: str, request_line: str, elapsed_ms: float) -> dict:
+        """Write the .prof and .txt files (off the event loop) and return the report."""
+        report = build_report(profile, request_line, elapsed_ms, self.config["top_n"])
+        report["profile_id"] = profile_id
+
+        os.makedirs(self.config["output_dir"], exist_ok=True)
+        path = os.path.join(self.config["output_dir"], profile_id)
+        profile.dump_stats(f"{path}.prof")
+
+        text = io.StringIO()
+        text.write(f"{request_line}: {elapsed_ms:.1f} ms elapsed, {report['profiled_ms']:.1f} ms profiled\n")
+        for category, ms in report["breakdown_ms"].items():
+            text.write(f"  {category:<14} {ms:10.3f} ms\n")
+        text.write("\n")
+        pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(self.config["top_n"])
+        with open(f"{path}.txt", "w") as f:
+            f.write(text.getvalue())
+        return report
+
+    @staticmethod
+    async def _send_report(send, captured: List[dict], report: dict) -> None:
+        """Replace the buffered response with the report, keeping its status."""
+        start = next((m for m in captured if m["type"] == "http.response.start"), None)
+        report["status"] = start["status"] if start else None
+        body = json.dumps(report).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-id", report["profile_id"].encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _slug(path: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
@@ -0,0 +1,121 @@
+"""
+Request tracing for the FastAPI app (see src/tracing.py).
+TracingMiddleware opens the server span of each sampled request and continues
+incoming traceparent headers; TracedRoute splits the route's time into request
+parsing, the endpoint itself and response serialization.
+"""
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from fastapi.routing import APIRoute
+
+from src import tracing
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware starting a trace per request (outermost, to time everything)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        method = scope["method"]
+        root = tracing.start_trace(
+            f"{method} {scope['path']}",
+            traceparent,
+            **{"http.request.method": method, "url.path": scope["path"]},
+        )
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_trace(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.response.status_code", message["status"])
+                message = {**message, "headers": [*message.get("headers", []), (b"x-trace-id", root.trace_id.encode())]}
+            await send(message)
+
+        token = tracing.activate(root)
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except BaseException as e:
+            root.set_error(e)
+            raise
+        finally:
+            tracing.deactivate(token)
+            # Name the span by route template once routing has matched
+            route = scope.get("route")
+            if route is not None:
+                root.name = f"{method} {route.path}"
+                root.set_attribute("http.route", route.path)
+            root.end()
+
+
+class TracedRoute(APIRoute):
+    """
+    APIRoute recording a "route" span with "parse", "endpoint" and "serialize"
+    children. Installed as the router's route_class only when tracing is enabled.
+    """
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _trace_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        path = self.path
+
+        async def traced_handler(request):
+            if tracing.current_span() is None:
+                return await handler(request)
+            with tracing.span("route", **{"http.route": path}) as route_span:
+                timings: Dict[str, int] = {}
+                token = _endpoint_timings.set(timings)
+                try:
+                    response = await handler(request)
+                finally:
+                    _endpoint_timings.reset(token)
+                if timings:
+                    # Before the endpoint: body parsing and validation;
+                    # after it: response model validation and rendering
+                    tracing.record_span("parse", route_span.start_ns, timings["start_ns"])
+                    tracing.record_span("serialize", timings["end_ns"], time.time_ns())
+                return response
+
+        return traced_handler
+
+
+# Set by TracedRoute for the endpoint wrapper to report into
+_endpoint_timings: ContextVar[Optional[Dict[str, int]]] = ContextVar("endpoint_timings", default=None)
+
+
+def _trace_endpoint(endpoint: Callable) -> Callable:
+    """Wrap an async endpoint in an "endpoint" span, noting when it started and returned."""
+    if not inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def traced_endpoint(*args, **kwargs):
+        timings = _endpoint_timings.get()
+        if timings is None:
+            return await endpoint(*args, **kwargs)
+        timings["start_ns"] = time.time_ns()
+        try:
+            with tracing.span("endpoint", **{"code.function": endpoint.__name__}):
+                return await endpoint(*args, **kwargs)
+        finally:
+            timings["end_ns"] = time.time_ns()
+
+    return traced_endpoint
@@ -0,0 +1,102 @@
+"""
+Copy every device into a container with a different partition key.
+A Cosmos DB container's partition key cannot be changed, so switching
+COSMOS_PARTITION_KEY means deploying a new container (see cosmos.bicep) and
+copying the documents across; documents without a site get --default-site.
+The same goes for adding the /name unique key (uniqueDeviceNames); devices
+with duplicate names in a partition must be renamed first or the copy stops.
+
+Run with the new configuration; the target is the configured devices container:
+    COSMOS_DEVICES_CONTAINER=devices-by-site COSMOS_PARTITION_KEY=site \\
+        python -m src.repartition --source devices
+Upserts make the copy safe to re-run; --after resumes from the last logged ID.
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from src.db.cosmos import close_cosmos_client, get_cosmos_config, get_database, get_devices_container
+from src.db.throttling import cosmos_call
+from src.logging_config import configure_logging
+from src.repositories.cosmos_repo import run_query
+from src.schemas import DEFAULT_SITE
+
+logger = logging.getLogger(__name__)
+
+# Properties Cosmos DB adds to every document; the target container sets its own
+_SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts")
+
+
+async def copy_devices(
+    source,
+    target,
+    default_site: str = DEFAULT_SITE,
+    page_size: int = 1000,
+    after: str = "",
+) -> int:
+    """
+    Copy documents from the `source` to the `target` container in ID order,
+    one page at a time; returns the number of documents copied.
+    """
+    copied = 0
+    started = time.perf_counter()
+    while True:
+        # Keyset pagination: the cost of a page does not grow with its position
+        page = await run_query(
+            source,
+            "SELECT * FROM c WHERE c.id > @after ORDER BY c.id OFFSET 0 LIMIT @limit",
+            [{"name": "@after", "value": after}, {"name": "@limit", "value": page_size}],
+        )
+        if not page:
+            break
+
+        docs = []
+        for item in page:
+            doc = {key: value for key, value in item.items() if key not in _SYSTEM_PROPERTIES}
+            doc.setdefault("site", default_site)
+            docs.append(doc)
+        await asyncio.gather(*(cosmos_call(lambda doc=doc: target.upsert_item(body=doc), "upsert_item") for doc in docs))
+
+        copied += len(docs)
+        after = docs[-1]["id"]
+        logger.info("Copied %d devices (last ID %s)", copied, after)
+
+    elapsed = time.perf_counter() - started
+    logger.info("Copied %d devices in %.1fs", copied, elapsed)
+    return copied
+
+
+async def _main(args) -> None:
+    config = get_cosmos_config()
+    if args.source == config["devices_container"]:
+        raise SystemExit("--source must differ from COSMOS_DEVICES_CONTAINER (the target)")
+
+    logger.info(
+        "Copying %s into %s (partitioned by %s)",
+        args.source,
+        config["devices_container"],
+        config["partition_key"],
+    )
+    try:
+        source = (await get_database()).get_container_client(args.source)
+        target = await get_devices_container()
+        await copy_devices(source, target, args.default_site, args.page_size, args.after)
+    finally:
+        await close_cosmos_client()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Copy devices into the configured (re-partitioned) container")
+    parser.add_argument("--source", required=True, help="Container to copy from, e.g. devices")
+    parser.add_argument("--default-site", default=DEFAULT_SITE, help="Site of documents that have none")
+    parser.add_argument("--page-size", type=int, default=1000, help="Documents read and written per page")
+    parser.add_argument("--after", default="", help="Resume after this device ID")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,148 @@
 """
 Device repository for CRUD operations.
-Routes to in-memory repository in TEST_MODE, or Cosmos DB otherwise.
+Routes to the backend named by REPOSITORY_BACKEND:
+- "memory": in-process dict (default in TEST_MODE)
+- "shared_memory": mmap-backed store shared by all workers on a node
+- "cosmos": Cosmos DB (default otherwise)
+- "tiered": Cosmos DB behind a bounded in-process cache of the hot devices
+
+Backends are registered by module path and imported on first use, so only the
+selected backend's dependencies (e.g. the Azure SDK) are ever loaded.
 """
+import functools
+import importlib
+import importlib.util
 import os
+from types import ModuleType
+from typing import Callable, Dict, Optional
+
+from src import tracing
+
+# Backend name -> module implementing the repository functions
+_BACKENDS: Dict[str, str] = {
+    "memory": "src.repositories.in_memory",
+    "shared_memory": "src.repositories.shared_memory",
+    "cosmos": "src.repositories.cosmos_repo",
+    "tiered": "src.repositories.tiered",
+}
+
+_REPOSITORY_FUNCTIONS = (
+    "list_devices",
+    "get_device",
+    "get_devices",
+    "get_devices_by_name",
+    "get_device_history",
+    "create_device",
+    "bulk_create_devices",
+    "update_device",
+    "delete_device",
+)
+
+# Functions that change devices; each call bumps the write version
+_WRITE_FUNCTIONS = frozenset({"create_device", "bulk_create_devices", "update_device", "delete_device"})
+
+_backend_name: Optional[str] = None
+_backend: Optional[ModuleType] = None
+# Writes through this process, unless the backend defines its own write_version()
+_writes = 0
+_write_version: Optional[Callable[[], int]] = None
+
+
+def register_backend(name: str, module_path: str) -> None:
+    """Register (or override) a backend module under a REPOSITORY_BACKEND name."""
+    _BACKENDS[name] = module_path
+
+
+def get_backend_name() -> str:
+    """Name of the selected backend (REPOSITORY_BACKEND, defaulting from TEST_MODE)."""
+    if _backend_name is not None:
+        return _backend_name
+    test_mode = os.environ.get("TEST_MODE", "false").lower() == "true"
+    return os.environ.get("REPOSITORY_BACKEND", "memory" if test_mode else "cosmos").lower()
+
+
+def write_version() -> int:
+    """
+    A number that changes whenever devices may have changed, for caches of
+    derived results. Backends shared between workers may define their own
+    write_version() so that writes made by other workers count too.
+    """
+    if _write_version is not None:
+        return _write_version()
+    return _writes
+
+
+def _counting_writes(implementation):
+    @functools.wraps(implementation)
+    async def write(*args, **kwargs):
+        global _writes
+        try:
+            return await implementation(*args, **kwargs)
+        finally:
+            # After the change, so a result read before it is never tagged as newer
+            _writes += 1
+
+    return write
+
+
+def get_backend() -> ModuleType:
+    """Import the selected backend on first use and bind its functions to this package."""
+    global _backend, _backend_name, _write_version
+
+    if _backend is None:
+        name = get_backend_name()
+        if name not in _BACKENDS:
+            raise ValueError(f"Unknown REPOSITORY_BACKEND: {name}")
+        _backend = importlib.import_module(_BACKENDS[name])
+        _backend_name = name
+        # Later lookups hit module globals directly instead of __getattr__;
+        # with tracing on, each call gets a "repository.<function>" span
+        for function in _REPOSITORY_FUNCTIONS:
+            implementation = getattr(_backend, function)
+            if tracing.enabled():
+                implementation = tracing.traced(f"repository.{function}", **{"repository.backend": name})(implementation)
+            if function in _WRITE_FUNCTIONS:
+                implementation = _counting_writes(implementation)
+            globals()[function] = implementation
+        _write_version = getattr(_backend, "write_version", None)
+    return _backend
+
+
+def reset_backend() -> None:
+    """Forget the loaded backend so the next call re-reads the environment."""
+    global _backend, _backend_name, _write_version
+    _backend = None
+    _backend_name = None
+    _write_version = None
+    for function in _REPOSITORY_FUNCTIONS:
+        globals().pop(function, None)
+
+
+def __getattr__(name: str):
+    # Repository functions and optional backend hooks (e.g. claim_seed);
+    # submodule imports must not trigger loading a backend
+    if name.startswith("__") or importlib.util.find_spec(f"{__name__}.{name}") is not None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        backend = get_backend()
+        # The first call may come through here; return the bound (wrapped) function
+        return globals()[name] if name in _REPOSITORY_FUNCTIONS else getattr(backend, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
 
-# Determine which repository backend to use
-TEST_MODE = os.environ.get("TEST_MODE", "false").lower() == "true"
-
-if TEST_MODE:
-    from src.repositories.in_memory import (
-        list_devices,
-        get_device,
-        create_device,
-        update_device,
-        delete_device,
-    )
-else:
-    from src.repositories.cosmos_repo import (
-        list_devices,
-        get_device,
-        create_device,
-        update_device,
-        delete_device,
-    )
 
 __all__ = [
+    "register_backend",
+    "get_backend_name",
+    "get_backend",
+    "reset_backend",
     "list_devices",
     "get_device",
+    "get_devices",
+    "get_devices_by_name",
+    "get_device_history",
     "create_device",
+    "bulk_create_devices",
     "update_device",
     "delete_device",
 ]
@@ -0,0 +1,116 @@
+"""
+DataLoader-style micro-batching of point reads.
+Concurrent loads arriving within a short window are resolved with one fetch.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+FetchMany = Callable[[list], Awaitable[Dict[str, dict]]]
+
+
+class PointReadBatcher:
+    """
+    Collects `load(key)` calls and resolves them with a single `fetch_many(keys)` call.
+
+    A load that finds no fetch in flight is dispatched on the next loop
+    iteration, batched only with loads from the same iteration, so a lone read
+    waits for nothing. While a fetch is in flight, loads are collected for up
+    to `window_ms` (or `max_batch_size` keys).
+
+    Duplicate keys within a window share one result. A missing key resolves to None.
+    """
+
+    def __init__(
+        self,
+        fetch_many: FetchMany,
+        window_ms: float = 2.0,
+        max_batch_size: int = 100,
+        name: str = "batch",
+    ):
+        self._fetch_many = fetch_many
+        self._window = window_ms / 1000.0
+        self._max_batch_size = max(1, max_batch_size)
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._opened_at: Optional[float] = None
+        self._timer: Optional[asyncio.Handle] = None
+        # The loop only keeps weak references to tasks; hold in-flight batches here
+        self._tasks: Set[asyncio.Task] = set()
+
+        self._batch_size = metrics.histogram(
+            f"{name}_size",
+            buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+            description="Keys resolved per batched fetch",
+        )
+        self._batch_wait = metrics.histogram(
+            f"{name}_window_ms",
+            description="Time from first load in a batch until it was dispatched",
+        )
+        self._batch_fetch = metrics.histogram(
+            f"{name}_fetch_ms",
+            description="Duration of the batched fetch",
+        )
+
+    async def load(self, key: str) -> Optional[dict]:
+        """Load a single key, batching it with other concurrent loads."""
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+
+            if len(self._pending) >= self._max_batch_size:
+                self._dispatch()
+            elif self._timer is None:
+                self._opened_at = time.perf_counter()
+                if self._tasks:
+                    self._timer = loop.call_later(self._window, self._dispatch)
+                else:
+                    self._timer = loop.call_soon(self._dispatch)
+
+        # Shield so one cancelled caller does not cancel the shared result
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """Load several keys through the same batching window."""
+        keys = list(dict.fromkeys(keys))
+        results = await asyncio.gather(*(self.load(key) for key in keys))
+        return dict(zip(keys, results))
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        opened_at, self._opened_at = self._opened_at, None
+        if opened_at is not None:
+            self._batch_wait.observe((time.perf_counter() - opened_at) * 1000)
+        self._batch_size.observe(len(batch))
+
+        task = asyncio.get_running_loop().create_task(self._resolve(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, batch: Dict[str, asyncio.Future]) -> None:
+        started = time.perf_counter()
+        try:
+            docs = await self._fetch_many(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._batch_fetch.observe((time.perf_counter() - started) * 1000)
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(docs.get(key))
@@ -0,0 +1,185 @@
+"""
+Bounded in-process cache with W-TinyLFU admission and eviction.
+Device access is heavily skewed: a few devices are read constantly and most are
+read once. A small LRU window absorbs bursts of new keys; a key only enters the
+main (segmented LRU) region if it has been used more often, per a count-min
+frequency sketch, than the entry it would evict.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Tuple
+
+from src import metrics
+
+# Count-min sketch: rows of 4-bit counters, halved every `sample_size` increments
+_SKETCH_DEPTH = 4
+_COUNTER_MAX = 15
+_HALVE = bytes(value >> 1 for value in range(256))
+# One odd 64-bit multiplier per row; the high bits of the product index the row
+_SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+_MASK_64 = (1 << 64) - 1
+
+
+class FrequencySketch:
+    """Approximate, aging access counts for an unbounded key space in fixed memory."""
+
+    def __init__(self, capacity: int):
+        width = 1
+        while width < max(16, capacity):
+            width <<= 1
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in range(_SKETCH_DEPTH)]
+        # Aging keeps the sketch tracking recent popularity rather than all-time
+        self._sample_size = 10 * max(16, capacity)
+        self._additions = 0
+
+    def _indexes(self, key: str):
+        h = hash(key)
+        for seed in _SEEDS:
+            # Multiplicative hashing: a different odd multiplier per row
+            yield (((h * seed) & _MASK_64) >> 32) & self._mask
+
+    def increment(self, key: str) -> None:
+        for row, index in zip(self._rows, self._indexes(key)):
+            if row[index] < _COUNTER_MAX:
+                row[index] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._age()
+
+    def frequency(self, key: str) -> int:
+        return min(row[index] for row, index in zip(self._rows, self._indexes(key)))
+
+    def _age(self) -> None:
+        for index, row in enumerate(self._rows):
+            self._rows[index] = bytearray(row.translate(_HALVE))
+        self._additions //= 2
+
+
+class TinyLfuCache:
+    """
+    Key -> value cache holding at most `capacity` entries, each valid for `ttl_s`.
+    Entries live in a window LRU (`window_percent` of the capacity) and then in
+    a segmented LRU whose protected segment holds keys hit at least twice.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        ttl_s: float = 0.0,
+        window_percent: float = 1.0,
+        name: str = "cache",
+    ):
+        self.capacity = max(2, capacity)
+        self.ttl_s = ttl_s
+        self._window_size = max(1, int(self.capacity * window_percent / 100))
+        main_size = self.capacity - self._window_size
+        self._protected_size = max(1, int(main_size * 0.8))
+        self._main_size = main_size
+        # key -> (value, loaded at)
+        self._window: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._probation: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._protected: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._sketch = FrequencySketch(self.capacity)
+
+        self._hits = metrics.counter(f"{name}_hits_total", "Reads served from the cache")
+        self._misses = metrics.counter(f"{name}_misses_total", "Reads the cache could not serve")
+        self._expired = metrics.counter(f"{name}_expired_total", "Entries dropped because they outlived the TTL")
+        self._evictions = metrics.counter(f"{name}_evictions_total", "Entries evicted to make room")
+        self._rejections = metrics.counter(
+            f"{name}_rejections_total", "New entries not admitted because they were used less than the victim"
+        )
+        self._size = metrics.gauge(f"{name}_entries", "Entries held")
+
+    def __len__(self) -> int:
+        return len(self._window) + len(self._probation) + len(self._protected)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._window or key in self._probation or key in self._protected
+
+    def _segment(self, key: str) -> Optional["OrderedDict[str, Tuple[Any, float]]"]:
+        for segment in (self._window, self._probation, self._protected):
+            if key in segment:
+                return segment
+        return None
+
+    def get(self, key: str) -> Optional[Any]:
+        """The cached value, counting the access; None on a miss or an expired entry."""
+        self._sketch.increment(key)
+        segment = self._segment(key)
+        if segment is None:
+            self._misses.inc()
+            return None
+        value, loaded_at = segment[key]
+        if self.ttl_s > 0 and time.monotonic() - loaded_at > self.ttl_s:
+            del segment[key]
+            self._size.set(len(self))
+            self._expired.inc()
+            self._misses.inc()
+            return None
+
+        self._hits.inc()
+        if segment is self._probation:
+            # A second hit promotes the key to the protected segment
+            del self._probation[key]
+            self._protected[key] = (value, loaded_at)
+            if len(self._protected) > self._protected_size:
+                demoted, entry = self._protected.popitem(last=False)
+                self._probation[demoted] = entry
+        else:
+            segment.move_to_end(key)
+        return value
+
+    def peek(self, key: str) -> Optional[Any]:
+        """The cached value without counting an access or checking the TTL."""
+        segment = self._segment(key)
+        return segment[key][0] if segment is not None else None
+
+    def put(self, key: str, value: Any) -> None:
+        """Insert or refresh an entry; new keys pass through the window and admission."""
+        now = time.monotonic()
+        segment = self._segment(key)
+        if segment is not None:
+            segment[key] = (value, now)
+            segment.move_to_end(key)
+            return
+
+        self._window[key] = (value, now)
+        if len(self._window) > self._window_size:
+            candidate, entry = self._window.popitem(last=False)
+            self._admit(candidate, entry)
+        self._size.set(len(self))
+
+    def _admit(self, candidate: str, entry: Tuple[Any, float]) -> None:
+        """Move a key leaving the window into the main region if it beats the LRU victim."""
+        if len(self._probation) + len(self._protected) < self._main_size:
+            self._probation[candidate] = entry
+            return
+        victims = self._probation or self._protected
+        victim = next(iter(victims))
+        if self._sketch.frequency(candidate) > self._sketch.frequency(victim):
+            del victims[victim]
+            self._probation[candidate] = entry
+            self._evictions.inc()
+        else:
+            self._rejections.inc()
+
+    def preload(self, items: Iterable[Tuple[str, Any]]) -> int:
+        """Fill free space in the main region directly (warming); returns the number loaded."""
+        now = time.monotonic()
+        loaded = 0
+        for key, value in items:
+            if len(self._probation) + len(self._protected) >= self._main_size:
+                break
+            if key not in self:
+                self._probation[key] = (value, now)
+                loaded += 1
+        self._size.set(len(self))
+        return loaded
+
+    def invalidate(self, key: str) -> None:
+        segment = self._segment(key)
+        if segment is not None:
+            del segment[key]
+            self._size.set(len(self))
+
@@ -1,18 +1,62 @@
 """
 Device repository for Cosmos DB CRUD operations.
+The container is partitioned by device ID or by site (COSMOS_PARTITION_KEY);
+with site partitioning, passing `site` keeps reads, writes and listings in one partition.
+Updates can be coalesced per device before they are written (COSMOS_WRITE_BEHIND_WINDOW_MS).
+Every change is also appended to the device history container (COSMOS_EVENTS_CONTAINER).
 """
+import asyncio
 import uuid
 import logging
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Union
 
-from azure.cosmos.exceptions import CosmosResourceNotFoundError
+from azure.cosmos.exceptions import CosmosResourceExistsError, CosmosResourceNotFoundError
 
-from src.db.cosmos import get_devices_container
-from src.schemas import DeviceCreate, DeviceUpdate, DeviceResponse
+from src import metrics
+from src.db.cosmos import get_cosmos_config, get_devices_container, get_events_container
+from src.db.throttling import cosmos_call
+from src.repositories.batching import PointReadBatcher
+from src.repositories.history import HISTORY_FIELDS, changes
+from src.repositories.naming import DuplicateDeviceNameError, unique_names_enforced
+from src.repositories.projection import project, select_clause
+from src.repositories.sorting import DEFAULT_SORT, order_by_clause, parse_sort
+from src.repositories.write_behind import WriteBehindBuffer
+from src.schemas import DEFAULT_SITE, DeviceCreate, DeviceUpdate, DeviceResponse
 
 logger = logging.getLogger(__name__)
 
+# Fields the devices container can be partitioned by
+PARTITION_KEYS = ("id", "site")
+
+# Lazily created point-read batcher (None when batching is disabled)
+_read_batcher: Optional[PointReadBatcher] = None
+
+# Lazily created write-behind buffer (None until the first buffered update)
+_write_buffer: Optional[WriteBehindBuffer] = None
+
+_cross_partition_lookups = metrics.counter(
+    "cosmos_cross_partition_lookups_total",
+    "Single-device operations that queried every partition because no site was given",
+)
+_history_write_failures = metrics.counter(
+    "cosmos_history_write_failures_total",
+    "Device changes stored without their history event",
+)
+
+
+def _partition_field() -> str:
+    """The configured partition key field."""
+    field = get_cosmos_config()["partition_key"]
+    if field not in PARTITION_KEYS:
+        raise ValueError(f"Unsupported COSMOS_PARTITION_KEY {field!r}; use one of {', '.join(PARTITION_KEYS)}")
+    return field
+
+
+def _in_site(doc: Optional[dict], site: Optional[str]) -> bool:
+    """Whether a document exists and belongs to `site` (any site when None)."""
+    return doc is not None and (site is None or doc.get("site", DEFAULT_SITE) == site)
+
 
 def _doc_to_device(doc: dict) -> DeviceResponse:
     """Convert a Cosmos DB document to a DeviceResponse."""
@@ -20,95 +64,624 @@ def _doc_to_device(doc: dict) -> DeviceResponse:
         id=doc["id"],
         name=doc["name"],
         assigned_to=doc.get("assigned_to"),
+        site=doc.get("site", DEFAULT_SITE),
         created_at=datetime.fromisoformat(doc["created_at"]),
         updated_at=datetime.fromisoformat(doc["updated_at"]),
     )
 
 
-async def list_devices(skip: int = 0, limit: int = 100) -> List[DeviceResponse]:
-    """List all devices with pagination."""
+async def run_query(container, query: str, parameters: list, partition_key: Optional[str] = None) -> List[dict]:
+    """
+    Run a query to completion under the Cosmos call policy.
+    With a `partition_key` the query runs against that logical partition only.
+    """
+    scope = {} if partition_key is None else {"partition_key": partition_key}
+
+    async def collect() -> List[dict]:
+        return [
+            item
+            async for item in container.query_items(
+                query=query,
+                parameters=parameters,
+                **scope,
+            )
+        ]
+
+    return await cosmos_call(collect, "query")
+
+
+def _render(doc: dict, fields: Optional[List[str]]) -> Union[DeviceResponse, dict]:
+    """Full DeviceResponse, or only the projected fields as a dict."""
+    return _doc_to_device(doc) if fields is None else project(doc, fields)
+
+
+def _buffered(device_id: str) -> Optional[dict]:
+    """The device's update waiting in the write-behind buffer, if any."""
+    return _write_buffer.get(device_id) if _write_buffer is not None else None
+
+
+def _with_buffered(items: List[dict]) -> List[dict]:
+    """Swap queried documents for their buffered (newer) versions."""
+    if _write_buffer is None:
+        return items
+    return [_write_buffer.get(item["id"]) or item for item in items]
+
+
+async def list_devices(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[List[str]] = None,
+    sort: str = DEFAULT_SORT,
+    site: Optional[str] = None,
+    as_of: Optional[str] = None,
+) -> List[Union[DeviceResponse, dict]]:
+    """
+    List one page of devices in `sort` order; `fields` are projected inside the query.
+    The ORDER BY is served by the (field, id) composite indexes in cosmos.bicep.
+    Listing one `site` of a site-partitioned container is a single-partition query;
+    everything else fans out across all partitions.
+    With `as_of`, the page is rebuilt from the history container instead.
+    """
+    if as_of is not None:
+        return [_render(doc, fields) for doc in await _page_at(as_of, sort, skip, limit, site)]
+
     container = await get_devices_container()
 
-    query = "SELECT * FROM c ORDER BY c.created_at DESC OFFSET @skip LIMIT @limit"
+    where = ""
+    partition_key = None
     parameters = [
         {"name": "@skip", "value": skip},
         {"name": "@limit", "value": limit},
     ]
+    if site is not None:
+        if _partition_field() == "site":
+            partition_key = site
+        else:
+            where = "WHERE c.site = @site "
+            parameters.append({"name": "@site", "value": site})
 
-    devices = []
-    async for item in container.query_items(
-        query=query,
-        parameters=parameters,
-    ):
-        devices.append(_doc_to_device(item))
+    query = f"SELECT {select_clause(fields)} FROM c {where}{order_by_clause(sort)} OFFSET @skip LIMIT @limit"
+    items = await run_query(container, query, parameters, partition_key)
+    # Buffered updates show up in place; the page is still ordered by stored values
+    return [_render(item, fields) for item in _with_buffered(items)]
 
-    return devices
 
-
-async def get_device(device_id: str) -> Optional[DeviceResponse]:
-    """Get a device by ID."""
-    container = await get_devices_container()
+async def _read_one(container, device_id: str, site: Optional[str] = None) -> Optional[dict]:
+    """
+    Point-read a single document, returning None if it does not exist (or is not in `site`).
+    In a site-partitioned container the read needs the site; without one the
+    device is found with a cross-partition query instead.
+    """
+    if _partition_field() == "id":
+        partition_key = device_id
+    elif site is not None:
+        partition_key = site
+    else:
+        _cross_partition_lookups.inc()
+        items = await run_query(
+            container,
+            "SELECT * FROM c WHERE c.id = @id",
+            [{"name": "@id", "value": device_id}],
+        )
+        return items[0] if items else None
 
     try:
-        doc = await container.read_item(item=device_id, partition_key=device_id)
-        return _doc_to_device(doc)
+        doc = await cosmos_call(
+            lambda: container.read_item(item=device_id, partition_key=partition_key), "read_item"
+        )
     except CosmosResourceNotFoundError:
         return None
+    return doc if _in_site(doc, site) else None
 
 
-async def create_device(device: DeviceCreate) -> DeviceResponse:
-    """Create a new device."""
+async def _read_many(device_ids: List[str], fields: Optional[List[str]] = None) -> dict[str, dict]:
+    """Read several documents with one round trip, keyed by ID."""
     container = await get_devices_container()
 
+    # A point read is cheaper than a query when there is nothing to batch
+    if len(device_ids) == 1:
+        doc = await _read_one(container, device_ids[0])
+        return {doc["id"]: doc} if doc is not None else {}
+
+    query = f"SELECT {select_clause(fields)} FROM c WHERE ARRAY_CONTAINS(@ids, c.id)"
+    parameters = [{"name": "@ids", "value": device_ids}]
+
+    items = await run_query(container, query, parameters)
+    return {item["id"]: item for item in items}
+
+
+def _get_read_batcher() -> Optional[PointReadBatcher]:
+    """Create the point-read batcher on first use from the Cosmos config."""
+    global _read_batcher
+
+    config = get_cosmos_config()
+    if config["read_batch_window_ms"] <= 0:
+        return None
+
+    if _read_batcher is None:
+        _read_batcher = PointReadBatcher(
+            _read_many,
+            window_ms=config["read_batch_window_ms"],
+            max_batch_size=config["read_batch_max_size"],
+            name="cosmos_read_batch",
+        )
+    return _read_batcher
+
+
+async def get_device(
+    device_id: str,
+    fields: Optional[List[str]] = None,
+    site: Optional[str] = None,
+    as_of: Optional[str] = None,
+) -> Optional[Union[DeviceResponse, dict]]:
+    """
+    Get a device by ID, batching concurrent point reads when enabled.
+    A point read (1 RU) is cheaper than any projection query, so `fields`
+    are applied to the full document here.
+    With `as_of`, the device is rebuilt from its history (one partition) instead.
+    """
+    if as_of is not None:
+        doc = await _device_at(device_id, as_of)
+        return _render(doc, fields) if _in_site(doc, site) else None
+
+    doc = _buffered(device_id)
+    if doc is not None:
+        return _render(doc, fields) if _in_site(doc, site) else None
+
+    batcher = _get_read_batcher()
+    if batcher is None or (site is not None and _partition_field() == "site"):
+        # Batches are keyed by ID alone; a known site allows a direct point read
+        container = await get_devices_container()
+        doc = await _read_one(container, device_id, site)
+    else:
+        doc = await batcher.load(device_id)
+        if not _in_site(doc, site):
+            doc = None
+
+    return _render(doc, fields) if doc is not None else None
+
+
+async def get_device_doc(device_id: str, site: Optional[str] = None) -> Optional[dict]:
+    """The stored document of a device (with any buffered update), for tiers caching it."""
+    doc = _buffered(device_id)
+    if doc is None:
+        batcher = _get_read_batcher()
+        if batcher is None or (site is not None and _partition_field() == "site"):
+            doc = await _read_one(await get_devices_container(), device_id, site)
+        else:
+            doc = await batcher.load(device_id)
+    return _without_system_fields(doc) if _in_site(doc, site) else None
+
+
+async def get_device_docs(device_ids: List[str]) -> dict[str, dict]:
+    """Stored documents of several devices by ID (with any buffered updates)."""
+    chunk_size = get_cosmos_config()["multi_get_chunk_size"]
+    docs = {}
+    for chunk_docs in await asyncio.gather(*(
+        _read_many(device_ids[i : i + chunk_size]) for i in range(0, len(device_ids), chunk_size)
+    )):
+        docs.update(chunk_docs)
+    return {device_id: _without_system_fields(_buffered(device_id) or doc) for device_id, doc in docs.items()}
+
+
+def _without_system_fields(doc: dict) -> dict:
+    """A copy of a document without Cosmos metadata (_rid, _etag, _ts, ...)."""
+    return {key: value for key, value in doc.items() if not key.startswith("_")}
+
+
+async def get_devices(
+    device_ids: List[str], fields: Optional[List[str]] = None
+) -> List[Union[DeviceResponse, dict]]:
+    """Get several devices by ID with one multi-item read per chunk."""
+    chunk_size = get_cosmos_config()["multi_get_chunk_size"]
+    chunks = [
+        device_ids[i : i + chunk_size]
+        for i in range(0, len(device_ids), chunk_size)
+    ]
+
+    docs = {}
+    for chunk_docs in await asyncio.gather(*(_read_many(chunk, fields) for chunk in chunks)):
+        docs.update(chunk_docs)
+    if _write_buffer is not None:
+        for device_id in device_ids:
+            doc = _write_buffer.get(device_id)
+            if doc is not None and device_id in docs:
+                docs[device_id] = doc
+
+    return [
+        _render(docs[device_id], fields)
+        for device_id in device_ids
+        if device_id in docs
+    ]
+
+
+async def _named(container, name: str, site: Optional[str]) -> List[dict]:
+    """
+    Documents named `name` (in `site`, when given), oldest first.
+    An equality filter on the indexed name; with site partitioning and a site
+    it reads a single partition.
+    """
+    where = "WHERE c.name = @name"
+    parameters = [{"name": "@name", "value": name}]
+    partition_key = None
+    if site is not None:
+        if _partition_field() == "site":
+            partition_key = site
+        else:
+            where += " AND c.site = @site"
+            parameters.append({"name": "@site", "value": site})
+
+    items = await run_query(container, f"SELECT * FROM c {where}", parameters, partition_key)
+    return sorted(items, key=lambda doc: (doc["created_at"], doc["id"]))
+
+
+async def _check_name_available(container, name: str, site: str, device_id: Optional[str] = None) -> None:
+    """
+    Raise DuplicateDeviceNameError if another device of `site` is named `name`.
+    The container's unique key policy (site partitioning) also rejects writes
+    that race past this check; with ID partitioning the check is all there is.
+    """
+    for doc in await _named(container, name, site):
+        if doc["id"] != device_id:
+            raise DuplicateDeviceNameError(name, site)
+
+
+async def get_devices_by_name(
+    name: str, fields: Optional[List[str]] = None, site: Optional[str] = None
+) -> List[Union[DeviceResponse, dict]]:
+    """Devices named `name` (in `site`, when given), oldest first."""
+    container = await get_devices_container()
+    docs = await _named(container, name, site)
+    if _write_buffer is not None:
+        # Account for buffered renames in both directions
+        docs = [doc for doc in _with_buffered(docs) if doc["name"] == name]
+        found = {doc["id"] for doc in docs}
+        docs += [
+            doc for doc in _write_buffer.buffered().values()
+            if doc["name"] == name and doc["id"] not in found and _in_site(doc, site)
+        ]
+        docs.sort(key=lambda doc: (doc["created_at"], doc["id"]))
+    return [_render(doc, fields) for doc in docs]
+
+
+def _history_event(device_id: str, op: str, at: str, changed: dict, doc: Optional[dict] = None) -> dict:
+    """
+    A compact history document. Create events also carry the device's site and
+    timestamps, which as_of listings filter and sort on.
+    """
+    event = {"id": str(uuid.uuid4()), "device_id": device_id, "at": at, "op": op, "changes": changed}
+    if doc is not None and op == "create":
+        event["site"] = doc.get("site", DEFAULT_SITE)
+        event["created_at"] = doc["created_at"]
+        event["updated_at"] = doc["updated_at"]
+    return event
+
+
+async def _record(events: List[dict]) -> None:
+    """
+    Append history events. The device write has already happened, so a failure
+    here is logged and counted instead of failing the request.
+    """
+    container = await get_events_container()
+    if container is None or not events:
+        return
+    results = await asyncio.gather(
+        *(cosmos_call(lambda event=event: container.create_item(body=event), "create_item") for event in events),
+        return_exceptions=True,
+    )
+    for event, result in zip(events, results):
+        if isinstance(result, Exception):
+            _history_write_failures.inc()
+            logger.error("Could not record %s of device %s in its history: %s", event["op"], event["device_id"], result)
+
+
+def _replay(device_id: str, events: List[dict]) -> Optional[dict]:
+    """The device document after `events` (oldest first), or None if it was deleted or never created."""
+    doc = None
+    for event in events:
+        if event["op"] == "delete":
+            doc = None
+        elif event["op"] == "create":
+            doc = {
+                "id": device_id,
+                "assigned_to": None,
+                **event["changes"],
+                "site": event.get("site", DEFAULT_SITE),
+                "created_at": event.get("created_at", event["at"]),
+                "updated_at": event.get("updated_at", event["at"]),
+            }
+        elif doc is not None:
+            doc = {**doc, **event["changes"], "updated_at": event["at"]}
+    return doc
+
+
+async def _device_at(device_id: str, as_of: str) -> Optional[dict]:
+    """A device as it was at `as_of`, replayed from its history partition."""
+    container = await get_events_container()
+    if container is None:
+        return None
+    events = await run_query(
+        container,
+        "SELECT * FROM c WHERE c.device_id = @id AND c.at <= @at ORDER BY c.at",
+        [{"name": "@id", "value": device_id}, {"name": "@at", "value": as_of}],
+        partition_key=device_id,
+    )
+    return _replay(device_id, events)
+
+
+async def _page_at(as_of: str, sort: str, skip: int, limit: int, site: Optional[str]) -> List[dict]:
+    """
+    One page of the devices that existed at `as_of`, by creation time.
+    Create events up to `as_of` are read in creation order a chunk at a time, and
+    each chunk's devices are replayed with one query, until the page is full; the
+    cost grows with skip + limit (like OFFSET), not with the size of the history.
+    """
+    container = await get_events_container()
+    if container is None:
+        return []
+    _, descending = parse_sort(sort)
+    direction = "DESC" if descending else "ASC"
+
+    where = "c.op = 'create' AND c.at <= @at"
+    parameters = [{"name": "@at", "value": as_of}]
+    if site is not None:
+        where += " AND c.site = @site"
+        parameters.append({"name": "@site", "value": site})
+    chunk_size = max(limit, get_cosmos_config()["multi_get_chunk_size"])
+
+    existed: List[dict] = []
+    offset = 0
+    while len(existed) < skip + limit:
+        creates = await run_query(
+            container,
+            f"SELECT c.device_id FROM c WHERE {where} "
+            f"ORDER BY c.created_at {direction}, c.device_id {direction} OFFSET @offset LIMIT @limit",
+            parameters + [{"name": "@offset", "value": offset}, {"name": "@limit", "value": chunk_size}],
+        )
+        if not creates:
+            break
+        device_ids = [create["device_id"] for create in creates]
+        events: dict[str, List[dict]] = {}
+        for event in await run_query(
+            container,
+            "SELECT * FROM c WHERE ARRAY_CONTAINS(@ids, c.device_id) AND c.at <= @at ORDER BY c.at",
+            [{"name": "@ids", "value": device_ids}, {"name": "@at", "value": as_of}],
+        ):
+            events.setdefault(event["device_id"], []).append(event)
+        for device_id in device_ids:
+            doc = _replay(device_id, events.get(device_id, []))
+            if doc is not None:
+                existed.append(doc)
+        offset += len(creates)
+        if len(creates) < chunk_size:
+            break
+    return existed[skip : skip + limit]
+
+
+async def get_device_history(device_id: str) -> Optional[List[dict]]:
+    """Changes of a device, oldest first (one partition); None if it never existed."""
+    container = await get_events_container()
+    if container is None:
+        return None
+    events = await run_query(
+        container,
+        "SELECT * FROM c WHERE c.device_id = @id ORDER BY c.at",
+        [{"name": "@id", "value": device_id}],
+        partition_key=device_id,
+    )
+    return [{"at": event["at"], "op": event["op"], "changes": event["changes"]} for event in events] or None
+
+
+async def create_device(device: DeviceCreate, device_id: Optional[str] = None) -> DeviceResponse:
+    """
+    Create a new device. With a `device_id` that already exists (a repeated
+    idempotent create, possibly through another worker), the existing device
+    is returned instead; the ID is in the device's partition either way.
+    """
+    container = await get_devices_container()
+    if device_id is not None:
+        existing = await _read_one(container, device_id, device.site)
+        if existing is not None:
+            return _doc_to_device(existing)
+    enforce_unique = unique_names_enforced()
+    if enforce_unique:
+        await _check_name_available(container, device.name, device.site)
+
     now = datetime.now(timezone.utc).isoformat()
-    device_id = str(uuid.uuid4())
+    requested_id = device_id
+    device_id = requested_id or str(uuid.uuid4())
 
     doc = {
         "id": device_id,
         "name": device.name,
         "assigned_to": device.assigned_to,
+        "site": device.site,
         "created_at": now,
         "updated_at": now,
     }
 
-    result = await container.create_item(body=doc)
-    logger.info(f"Created device: {device_id}")
+    try:
+        result = await cosmos_call(lambda: container.create_item(body=doc), "create_item")
+    except CosmosResourceExistsError:
+        if requested_id is not None:
+            # A repeat of this create won the race
+            existing = await _read_one(container, device_id, device.site)
+            if existing is not None:
+                return _doc_to_device(existing)
+        # Otherwise the conflict is on the unique name key
+        if enforce_unique:
+            raise DuplicateDeviceNameError(device.name, device.site) from None
+        raise
+    logger.info("Created device: %s", device_id)
+    await _record([_history_event(device_id, "create", now, changes(None, doc), doc)])
 
     return _doc_to_device(result)
 
 
-async def update_device(device_id: str, device: DeviceUpdate) -> Optional[DeviceResponse]:
-    """Update an existing device."""
+async def bulk_create_devices(docs: List[dict]) -> int:
+    """
+    Insert fully-formed device documents (e.g. from src.seeding).
+    The documents span many partitions, so instead of transactional batches the
+    upserts run concurrently under the call policy's adaptive concurrency limit.
+    """
+    container = await get_devices_container()
+    chunk_size = get_cosmos_config()["multi_get_chunk_size"]
+
+    for start in range(0, len(docs), chunk_size):
+        await asyncio.gather(*(
+            cosmos_call(lambda doc=doc: container.upsert_item(body=doc), "upsert_item")
+            for doc in docs[start : start + chunk_size]
+        ))
+        # Recorded as of the load, which is when they appeared in this container
+        loaded_at = datetime.now(timezone.utc).isoformat()
+        await _record([
+            _history_event(doc["id"], "create", loaded_at, changes(None, doc), doc)
+            for doc in docs[start : start + chunk_size]
+        ])
+
+    logger.info("Bulk created %d devices", len(docs))
+    return len(docs)
+
+
+def _get_write_buffer() -> Optional[WriteBehindBuffer]:
+    """Create the write-behind buffer on first use from the Cosmos config."""
+    global _write_buffer
+
+    config = get_cosmos_config()
+    if config["write_behind_window_ms"] <= 0:
+        return None
+
+    if _write_buffer is None:
+        _write_buffer = WriteBehindBuffer(
+            _write_buffered,
+            window_ms=config["write_behind_window_ms"],
+            max_pending=config["write_behind_max_pending"],
+            ack=config["write_behind_ack"],
+            max_attempts=config["write_behind_max_attempts"],
+            name="cosmos_write_behind",
+        )
+    return _write_buffer
+
+
+async def _write_buffered(doc: dict) -> dict:
+    """Write a coalesced update; a device deleted meanwhile (by another worker) is skipped."""
     container = await get_devices_container()
+    try:
+        result = await cosmos_call(
+            lambda: container.replace_item(item=doc["id"], body=doc), "replace_item"
+        )
+    except CosmosResourceNotFoundError:
+        logger.info("Dropped buffered update of deleted device: %s", doc["id"])
+        return doc
+    # The coalesced updates are recorded as one change of the patchable fields
+    changed = {field: doc.get(field) for field in HISTORY_FIELDS if field != "site"}
+    await _record([_history_event(doc["id"], "update", doc["updated_at"], changed)])
+    return result
+
+
+async def flush_writes() -> None:
+    """Write out all buffered updates (called on shutdown)."""
+    if _write_buffer is not None:
+        await _write_buffer.flush()
+
+
+def _changes(device: DeviceUpdate) -> dict:
+    """The fields an update sets, stamped with the update time."""
+    changes = {}
+    # Update only the fields that were provided
+    if device.name is not None:
+        changes["name"] = device.name
+    if device.assigned_to is not None:
+        changes["assigned_to"] = device.assigned_to
+    changes["updated_at"] = datetime.now(timezone.utc).isoformat()
+    return changes
+
+
+async def update_device(
+    device_id: str, device: DeviceUpdate, site: Optional[str] = None
+) -> Optional[DeviceResponse]:
+    """
+    Update an existing device.
+    With write-behind enabled, updates within the window are merged and written once;
+    renames under UNIQUE_DEVICE_NAMES are always written through so they can be checked.
+    """
+    container = await get_devices_container()
+
+    buffer = _get_write_buffer()
+    if buffer is not None:
+        if device.name is None or not unique_names_enforced():
+            existing = buffer.get(device_id)
+            if existing is None:
+                existing = await _read_one(container, device_id, site)
+                if existing is None:
+                    return None
+            elif not _in_site(existing, site):
+                return None
+            return _doc_to_device(await buffer.stage(device_id, existing, _changes(device)))
+        # Let earlier buffered updates land before reading the device back
+        await buffer.settle(device_id)
 
     try:
         # Read the existing document
-        existing = await container.read_item(item=device_id, partition_key=device_id)
+        existing = await _read_one(container, device_id, site)
+        if existing is None:
+            return None
 
-        # Update only the fields that were provided
-        if device.name is not None:
-            existing["name"] = device.name
-        if device.assigned_to is not None:
-            existing["assigned_to"] = device.assigned_to
+        enforce_unique = (
+            device.name is not None and device.name != existing["name"] and unique_names_enforced()
+        )
+        if enforce_unique:
+            await _check_name_available(container, device.name, existing.get("site", DEFAULT_SITE), device_id)
 
-        existing["updated_at"] = datetime.now(timezone.utc).isoformat()
+        previous = dict(existing)
+        existing.update(_changes(device))
 
         # Replace the document
-        result = await container.replace_item(item=device_id, body=existing)
-        logger.info(f"Updated device: {device_id}")
+        try:
+            result = await cosmos_call(
+                lambda: container.replace_item(item=device_id, body=existing), "replace_item"
+            )
+        except CosmosResourceExistsError:
+            if enforce_unique:
+                raise DuplicateDeviceNameError(device.name, existing.get("site", DEFAULT_SITE)) from None
+            raise
+        logger.info("Updated device: %s", device_id)
+        await _record([_history_event(device_id, "update", existing["updated_at"], changes(previous, existing))])
 
         return _doc_to_device(result)
     except CosmosResourceNotFoundError:
         return None
 
 
-async def delete_device(device_id: str) -> bool:
+async def delete_device(device_id: str, site: Optional[str] = None) -> bool:
     """Delete a device by ID."""
     container = await get_devices_container()
 
+    if _write_buffer is not None:
+        buffered = _write_buffer.get(device_id)
+        if buffered is not None and not _in_site(buffered, site):
+            return False
+        # Pending updates of a deleted device are moot
+        await _write_buffer.discard(device_id)
+
+    field = _partition_field()
+    if field == "id" and site is None:
+        partition_key = device_id
+    elif field == "site" and site is not None:
+        partition_key = site
+    else:
+        # Find the device first: to learn its partition, or to check its site
+        existing = await _read_one(container, device_id, site)
+        if existing is None:
+            return False
+        partition_key = existing[field]
+
     try:
-        await container.delete_item(item=device_id, partition_key=device_id)
-        logger.info(f"Deleted device: {device_id}")
+        await cosmos_call(
+            lambda: container.delete_item(item=device_id, partition_key=partition_key), "delete_item"
+        )
+        logger.info("Deleted device: %s", device_id)
+        await _record([_history_event(device_id, "delete", datetime.now(timezone.utc).isoformat(), {})])
         return True
     except CosmosResourceNotFoundError:
         return False
@@ -0,0 +1,32 @@
+"""
+Stored device documents as the in-process backends keep them.
+Helpers shared by the in-memory, shared-memory and tiered repositories to
+check and render documents for the API.
+"""
+from datetime import datetime
+from typing import List, Optional, Union
+
+from src.repositories.projection import project
+from src.schemas import DEFAULT_SITE, DeviceResponse
+
+
+def doc_to_device(doc: dict) -> DeviceResponse:
+    """Convert a stored document to a DeviceResponse."""
+    return DeviceResponse(
+        id=doc["id"],
+        name=doc["name"],
+        assigned_to=doc.get("assigned_to"),
+        site=doc.get("site", DEFAULT_SITE),
+        created_at=datetime.fromisoformat(doc["created_at"]),
+        updated_at=datetime.fromisoformat(doc["updated_at"]),
+    )
+
+
+def render(doc: dict, fields: Optional[List[str]]) -> Union[DeviceResponse, dict]:
+    """Full DeviceResponse, or only the projected fields as a dict."""
+    return doc_to_device(doc) if fields is None else project(doc, fields)
+
+
+def in_site(doc: Optional[dict], site: Optional[str]) -> bool:
+    """Whether a document exists and belongs to `site` (any site when None)."""
+    return doc is not None and (site is None or doc.get("site", DEFAULT_SITE) == site)
@@ -0,0 +1,186 @@
+"""
+Device change history (`GET /devices/{id}/history`) and point-in-time reads (`as_of=`).
+Every create, update and delete appends a compact event; the in-process backends
+keep them in a HistoryLog that indexes each device's versions by time, so a
+read as of any time is a binary search per device rather than a replay.
+"""
+import bisect
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from src.repositories.sorting import SortedIndexes, parse_sort
+from src.schemas import DEFAULT_SITE
+
+# Device fields whose changes are recorded (timestamps are the events' own)
+HISTORY_FIELDS = ("name", "assigned_to", "site")
+
+# as_of listings are ordered by creation time, the only order that is fixed for a device
+AS_OF_SORT_FIELDS = ("created_at",)
+
+# Sort the devices recorded by an as_of time instead of walking the creation
+# index when they are fewer than 1 in this many of the devices it would walk
+_SORT_RECORDED_RATIO = 16
+
+
+def as_of_key(as_of: datetime) -> str:
+    """An as_of time as a UTC ISO string comparable with stored timestamps (naive means UTC)."""
+    if as_of.tzinfo is None:
+        as_of = as_of.replace(tzinfo=timezone.utc)
+    return as_of.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def check_as_of_sort(sort: str) -> None:
+    """Raise ValueError unless `sort` can be used with as_of."""
+    field, _ = parse_sort(sort)
+    if field not in AS_OF_SORT_FIELDS:
+        raise ValueError("as_of listings can only be sorted by created_at (prefix - for descending)")
+
+
+def changes(previous: Optional[dict], current: Optional[dict]) -> dict:
+    """The recorded fields that differ between two versions of a device (all of them on create)."""
+    if current is None:
+        return {}
+    return {
+        field: current.get(field)
+        for field in HISTORY_FIELDS
+        if previous is None or previous.get(field) != current.get(field)
+    }
+
+
+def event(at: str, previous: Optional[dict], current: Optional[dict]) -> dict:
+    """A history event between two versions of a device; None stands for "does not exist"."""
+    op = "create" if previous is None else "delete" if current is None else "update"
+    return {"at": at, "op": op, "changes": changes(previous, current)}
+
+
+class HistoryLog:
+    """
+    Append-only log of device versions for the in-process backends.
+    Events reference the stored documents (which are replaced, never mutated),
+    so the log costs a few pointers per change. Each device's event positions
+    are kept in order, so its version at any time is found by binary search.
+    """
+
+    def __init__(self):
+        # Event times (non-decreasing) and (device ID, version or None when deleted)
+        self._times: List[str] = []
+        self._events: List[Tuple[str, Optional[dict]]] = []
+        # Event positions per device, for history and single-device reads
+        self._positions: Dict[str, List[int]] = {}
+        self._current: Dict[str, dict] = {}
+        # Every device ever stored by creation time; as_of listings filter it
+        self._created = SortedIndexes(AS_OF_SORT_FIELDS)
+        # Added to _created in one merge when next needed
+        self._new_devices: List[dict] = []
+        # Every device ever stored in the order it was first recorded, with the
+        # position of that event; bounds as_of listings by when devices appeared
+        self._creation_ids: List[str] = []
+        self._creation_positions: List[int] = []
+
+    def record(self, device_id: str, doc: Optional[dict], at: str) -> None:
+        """Append a new version of a device (None once it is deleted)."""
+        self._append(device_id, doc, at)
+
+    def extend(self, docs: List[dict], at: str) -> None:
+        """Append many new versions at once (bulk loads)."""
+        ids = [doc["id"] for doc in docs]
+        if self._positions.keys().isdisjoint(ids) and len(set(ids)) == len(ids):
+            # Only new devices (e.g. seeding): append in bulk rather than one by one
+            if self._times and at < self._times[-1]:
+                at = self._times[-1]
+            start = len(self._events)
+            self._positions.update(zip(ids, ([position] for position in range(start, start + len(ids)))))
+            self._times.extend([at] * len(ids))
+            self._events.extend(zip(ids, docs))
+            self._current.update(zip(ids, docs))
+            self._new_devices.extend(docs)
+            self._creation_ids.extend(ids)
+            self._creation_positions.extend(range(start, start + len(ids)))
+        else:
+            for device_id, doc in zip(ids, docs):
+                self._append(device_id, doc, at)
+
+    def _append(self, device_id: str, doc: Optional[dict], at: str) -> None:
+        previous = self._current.get(device_id)
+        if doc is previous or (doc is not None and doc == previous):
+            # Replays of versions already known (e.g. a compacted shared log)
+            return
+        if self._times and at < self._times[-1]:
+            # Keep times ordered even if clocks of other writers disagree
+            at = self._times[-1]
+        positions = self._positions.setdefault(device_id, [])
+        if not positions:
+            self._new_devices.append(doc)
+            self._creation_ids.append(device_id)
+            self._creation_positions.append(len(self._events))
+        positions.append(len(self._events))
+        self._times.append(at)
+        self._events.append((device_id, doc))
+        if doc is None:
+            self._current.pop(device_id, None)
+        else:
+            self._current[device_id] = doc
+
+    def merge_pending(self) -> None:
+        """Index devices created since the last as_of listing (done by page_at)."""
+        if self._new_devices:
+            self._created.extend(self._new_devices)
+            self._new_devices = []
+        self._created.merge_pending()
+
+    def history(self, device_id: str) -> Optional[List[dict]]:
+        """Events of a device, oldest first; None if it was never stored."""
+        positions = self._positions.get(device_id)
+        if not positions:
+            return None
+        events = []
+        previous = None
+        for position in positions:
+            doc = self._events[position][1]
+            events.append(event(self._times[position], previous, doc))
+            previous = doc
+        return events
+
+    def device_at(self, device_id: str, at: str) -> Optional[dict]:
+        """The version of a device at time `at` (None if it did not exist then)."""
+        return self._version_before(device_id, bisect.bisect_right(self._times, at))
+
+    def _version_before(self, device_id: str, cutoff: int) -> Optional[dict]:
+        """The version of a device after the events before position `cutoff`."""
+        positions = self._positions.get(device_id)
+        if not positions:
+            return None
+        index = bisect.bisect_left(positions, cutoff)
+        return self._events[positions[index - 1]][1] if index else None
+
+    def page_at(
+        self, at: str, sort: str, skip: int, limit: int, site: Optional[str] = None
+    ) -> List[dict]:
+        """
+        One page of the devices that existed at time `at`, by creation time.
+        Only devices with created_at up to `at` are walked, until the page is
+        full. When far fewer devices had been recorded by `at` (e.g. bulk loads
+        of older devices), those are sorted instead. Either way the cost is
+        bounded by the devices around at `at`, not the size of the history.
+        """
+        self.merge_pending()
+        cutoff = bisect.bisect_right(self._times, at)
+
+        def existed(device_id: str) -> bool:
+            doc = self._version_before(device_id, cutoff)
+            return doc is not None and (site is None or doc.get("site", DEFAULT_SITE) == site)
+
+        recorded = bisect.bisect_left(self._creation_positions, cutoff)
+        if recorded * _SORT_RECORDED_RATIO < self._created.count(AS_OF_SORT_FIELDS[0], upto=at):
+            field, descending = parse_sort(sort)
+            docs = [
+                self._version_before(device_id, cutoff)
+                for device_id in self._creation_ids[:recorded]
+                if existed(device_id)
+            ]
+            docs = [doc for doc in docs if doc[field] <= at]
+            docs.sort(key=lambda doc: (doc[field], doc["id"]), reverse=descending)
+            return docs[skip : skip + limit]
+
+        device_ids = self._created.page(sort, skip, limit, existed, upto=at)
+        return [self._version_before(device_id, cutoff) for device_id in device_ids]
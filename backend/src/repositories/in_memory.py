@@ -2,99 +2,193 @@
 In-memory device repository for testing and local development.
 Provides same async interface as Cosmos DB repository without requiring Azure connectivity.
 """
-import asyncio
 import uuid
 import logging
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import List, Optional, Union
 
-from src.schemas import DeviceCreate, DeviceUpdate, DeviceResponse
+from src.loop_monitor import MonitoredLock
+from src.repositories.documents import doc_to_device, in_site, render
+from src.repositories.history import HistoryLog
+from src.repositories.naming import NameIndex, unique_names_enforced
+from src.repositories.sorting import DEFAULT_SORT, SortedIndexes
+from src.schemas import DEFAULT_SITE, DeviceCreate, DeviceUpdate, DeviceResponse
 
 logger = logging.getLogger(__name__)
 
-# Module-level storage and lock for thread-safe access
+# Module-level storage and lock for thread-safe access; the lock records its
+# wait and hold times (in_memory_lock_wait_ms / in_memory_lock_hold_ms)
 _devices: dict[str, dict] = {}
-_devices_lock = asyncio.Lock()
+_devices_lock = MonitoredLock("in_memory_lock")
+# Ordered (value, id) indexes per sortable field, updated on every write
+_indexes = SortedIndexes()
+# Name -> IDs for lookups by name and uniqueness checks
+_names = NameIndex()
+# Every version of every device, for history and as_of reads; stored documents
+# are replaced on update rather than mutated, so the log can share them
+_history = HistoryLog()
+
+
+async def list_devices(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[List[str]] = None,
+    sort: str = DEFAULT_SORT,
+    site: Optional[str] = None,
+    as_of: Optional[str] = None,
+) -> List[Union[DeviceResponse, dict]]:
+    """
+    List one page of devices in `sort` order, optionally projected to `fields`
+    and limited to one `site`; with `as_of`, the devices as they were then.
+    """
+    async with _devices_lock:
+        if as_of is not None:
+            return [render(doc, fields) for doc in _history.page_at(as_of, sort, skip, limit, site)]
+        # The index is already ordered; only the page is materialized
+        where = None if site is None else (lambda device_id: in_site(_devices[device_id], site))
+        page_ids = _indexes.page(sort, skip, limit, where)
+        return [render(_devices[device_id], fields) for device_id in page_ids]
+
+
+async def get_device(
+    device_id: str,
+    fields: Optional[List[str]] = None,
+    site: Optional[str] = None,
+    as_of: Optional[str] = None,
+) -> Optional[Union[DeviceResponse, dict]]:
+    """Get a device by ID (None if it is not in `site`, when given), or as it was at `as_of`."""
+    async with _devices_lock:
+        doc = _devices.get(device_id) if as_of is None else _history.device_at(device_id, as_of)
+        if not in_site(doc, site):
+            return None
+        return render(doc, fields)
 
 
-def _doc_to_device(doc: dict) -> DeviceResponse:
-    """Convert an in-memory document to a DeviceResponse."""
-    return DeviceResponse(
-        id=doc["id"],
-        name=doc["name"],
-        assigned_to=doc.get("assigned_to"),
-        created_at=datetime.fromisoformat(doc["created_at"]),
-        updated_at=datetime.fromisoformat(doc["updated_at"]),
-    )
+async def get_devices(
+    device_ids: List[str], fields: Optional[List[str]] = None
+) -> List[Union[DeviceResponse, dict]]:
+    """Get several devices by ID; IDs that do not exist are skipped."""
+    async with _devices_lock:
+        docs = [_devices.get(device_id) for device_id in device_ids]
+    return [render(doc, fields) for doc in docs if doc is not None]
 
 
-async def list_devices(skip: int = 0, limit: int = 100) -> List[DeviceResponse]:
-    """List all devices with pagination."""
+async def get_devices_by_name(
+    name: str, fields: Optional[List[str]] = None, site: Optional[str] = None
+) -> List[Union[DeviceResponse, dict]]:
+    """Devices named `name` (in `site`, when given), oldest first."""
     async with _devices_lock:
-        # Sort by created_at descending, then apply pagination
-        sorted_devices = sorted(
-            _devices.values(),
-            key=lambda d: d["created_at"],
-            reverse=True,
-        )
-        paginated = sorted_devices[skip : skip + limit]
-        return [_doc_to_device(doc) for doc in paginated]
-
-
-async def get_device(device_id: str) -> Optional[DeviceResponse]:
-    """Get a device by ID."""
+        docs = _names.lookup(name, _devices, site)
+    return [render(doc, fields) for doc in docs]
+
+
+async def get_device_history(device_id: str) -> Optional[List[dict]]:
+    """Changes of a device, oldest first; None if it never existed."""
     async with _devices_lock:
-        doc = _devices.get(device_id)
-        if doc is None:
-            return None
-        return _doc_to_device(doc)
+        return _history.history(device_id)
 
 
-async def create_device(device: DeviceCreate) -> DeviceResponse:
-    """Create a new device."""
+async def create_device(device: DeviceCreate, device_id: Optional[str] = None) -> DeviceResponse:
+    """
+    Create a new device. With a `device_id` that already exists (a repeated
+    idempotent create), the existing device is returned instead.
+    """
     async with _devices_lock:
+        existing = _devices.get(device_id) if device_id is not None else None
+        if existing is not None:
+            return doc_to_device(existing)
+        if unique_names_enforced():
+            _names.check_available(device.name, device.site, _devices)
+
         now = datetime.now(timezone.utc).isoformat()
-        device_id = str(uuid.uuid4())
+        device_id = device_id or str(uuid.uuid4())
 
         doc = {
             "id": device_id,
             "name": device.name,
             "assigned_to": device.assigned_to,
+            "site": device.site,
             "created_at": now,
             "updated_at": now,
         }
 
         _devices[device_id] = doc
-        logger.info(f"Created device: {device_id}")
-        return _doc_to_device(doc)
+        _indexes.add(doc)
+        _names.add(doc)
+        _history.record(device_id, doc, now)
+        logger.info("Created device: %s", device_id)
+        return doc_to_device(doc)
+
+
+async def bulk_create_devices(docs: List[dict]) -> int:
+    """
+    Insert fully-formed device documents (e.g. from src.seeding) in one step.
+    Names are not checked for uniqueness here.
+    """
+    async with _devices_lock:
+        replaced = [_devices[doc["id"]] for doc in docs if doc["id"] in _devices]
+        for old in replaced:
+            _indexes.remove(old)
+            _names.remove(old)
+        _devices.update((doc["id"], doc) for doc in docs)
+        _indexes.extend(docs)
+        _names.extend(docs)
+        # Recorded as of the load, which is when they appeared in this store
+        _history.extend(docs, datetime.now(timezone.utc).isoformat())
+    logger.info("Bulk created %d devices", len(docs))
+    return len(docs)
+
+
+async def warm_cache() -> int:
+    """
+    Sort bulk-loaded devices into the listing indexes now (called on startup),
+    instead of on the first listing; returns the number of devices.
+    """
+    async with _devices_lock:
+        _indexes.merge_pending()
+        _history.merge_pending()
+        return len(_devices)
 
 
-async def update_device(device_id: str, device: DeviceUpdate) -> Optional[DeviceResponse]:
+async def update_device(
+    device_id: str, device: DeviceUpdate, site: Optional[str] = None
+) -> Optional[DeviceResponse]:
     """Update an existing device."""
     async with _devices_lock:
-        if device_id not in _devices:
+        if not in_site(_devices.get(device_id), site):
             return None
 
-        existing = _devices[device_id]
+        previous = _devices[device_id]
+        updated = dict(previous)
+
+        if device.name is not None and device.name != updated["name"] and unique_names_enforced():
+            _names.check_available(device.name, updated.get("site", DEFAULT_SITE), _devices, device_id)
 
         # Update only the fields that were provided
         if device.name is not None:
-            existing["name"] = device.name
+            updated["name"] = device.name
         if device.assigned_to is not None:
-            existing["assigned_to"] = device.assigned_to
+            updated["assigned_to"] = device.assigned_to
 
-        existing["updated_at"] = datetime.now(timezone.utc).isoformat()
+        updated["updated_at"] = datetime.now(timezone.utc).isoformat()
+        _devices[device_id] = updated
+        _indexes.replace(previous, updated)
+        _names.replace(previous, updated)
+        _history.record(device_id, updated, updated["updated_at"])
 
-        logger.info(f"Updated device: {device_id}")
-        return _doc_to_device(existing)
+        logger.info("Updated device: %s", device_id)
+        return doc_to_device(updated)
 
 
-async def delete_device(device_id: str) -> bool:
+async def delete_device(device_id: str, site: Optional[str] = None) -> bool:
     """Delete a device by ID."""
     async with _devices_lock:
-        if device_id not in _devices:
+        if not in_site(_devices.get(device_id), site):
             return False
 
-        del _devices[device_id]
-        logger.info(f"Deleted device: {device_id}")
+        removed = _devices.pop(device_id)
+        _indexes.remove(removed)
+        _names.remove(removed)
+        _history.record(device_id, None, datetime.now(timezone.utc).isoformat())
+        logger.info("Deleted device: %s", device_id)
         return True
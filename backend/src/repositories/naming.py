@@ -0,0 +1,80 @@
+"""
+Device lookup by name (`GET /devices/by-name/{name}`) and optional name uniqueness.
+Names are unique per site when UNIQUE_DEVICE_NAMES is enabled, matching the
+Cosmos DB unique key policy, which only applies within a logical partition.
+"""
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+from src.schemas import DEFAULT_SITE
+
+
+class DuplicateDeviceNameError(Exception):
+    """Raised when a create or rename would give two devices of a site the same name."""
+
+    def __init__(self, name: str, site: str):
+        super().__init__(f"A device named {name!r} already exists in site {site!r}")
+        self.name = name
+        self.site = site
+
+
+def unique_names_enforced() -> bool:
+    """Whether create_device/update_device reject duplicate names (UNIQUE_DEVICE_NAMES)."""
+    return os.environ.get("UNIQUE_DEVICE_NAMES", "false").lower() == "true"
+
+
+class NameIndex:
+    """
+    Name -> IDs hash index, kept up to date on every write.
+    Without enforced uniqueness several devices may share a name.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, Set[str]] = {}
+
+    def add(self, doc: dict) -> None:
+        self._ids.setdefault(doc["name"], set()).add(doc["id"])
+
+    def remove(self, doc: dict) -> None:
+        ids = self._ids.get(doc["name"])
+        if ids is not None:
+            ids.discard(doc["id"])
+            if not ids:
+                del self._ids[doc["name"]]
+
+    def replace(self, old: dict, new: dict) -> None:
+        if old["name"] != new["name"]:
+            self.remove(old)
+            self.add(new)
+
+    def rebuild(self, docs: Iterable[dict]) -> None:
+        self._ids = {}
+        self.extend(docs)
+
+    def extend(self, docs: Iterable[dict]) -> None:
+        # Inlined add(); bulk loads call this with millions of documents
+        index = self._ids
+        for doc in docs:
+            ids = index.get(doc["name"])
+            if ids is None:
+                index[doc["name"]] = {doc["id"]}
+            else:
+                ids.add(doc["id"])
+
+    def ids(self, name: str) -> Set[str]:
+        return self._ids.get(name, set())
+
+    def lookup(self, name: str, devices: Dict[str, dict], site: Optional[str] = None) -> List[dict]:
+        """Documents named `name` (in `site`, when given), oldest first."""
+        docs = [devices[device_id] for device_id in self.ids(name)]
+        if site is not None:
+            docs = [doc for doc in docs if doc.get("site", DEFAULT_SITE) == site]
+        return sorted(docs, key=lambda doc: (doc["created_at"], doc["id"]))
+
+    def check_available(
+        self, name: str, site: str, devices: Dict[str, dict], device_id: Optional[str] = None
+    ) -> None:
+        """Raise DuplicateDeviceNameError if another device of `site` is named `name`."""
+        for other in self.lookup(name, devices, site):
+            if other["id"] != device_id:
+                raise DuplicateDeviceNameError(name, site)
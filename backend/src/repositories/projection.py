@@ -0,0 +1,50 @@
+"""
+Field projection shared by the repository backends (`fields=` on the API).
+Projected devices are plain dicts holding only the requested fields, with
+timestamps rendered the way DeviceResponse serializes them.
+"""
+from typing import List, Optional
+
+from src.schemas import DEFAULT_SITE, DeviceResponse
+
+# Fields a client may request; "id" is always returned
+DEVICE_FIELDS = tuple(DeviceResponse.model_fields)
+_TIMESTAMP_FIELDS = frozenset({"created_at", "updated_at"})
+# Values for fields missing from documents stored before the field existed
+_MISSING_DEFAULTS = {"site": DEFAULT_SITE}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated `fields` parameter into a projection.
+    Returns None for no projection; raises ValueError for unknown fields.
+    """
+    if fields is None:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in DEVICE_FIELDS]
+    if unknown:
+        raise ValueError(
+            f"Unknown field(s): {', '.join(unknown)}; valid fields are {', '.join(DEVICE_FIELDS)}"
+        )
+    # Keep the schema's field order, always include the ID
+    return [f for f in DEVICE_FIELDS if f == "id" or f in requested]
+
+
+def select_clause(fields: Optional[List[str]]) -> str:
+    """Cosmos SQL select list for a projection."""
+    if fields is None:
+        return "*"
+    return ", ".join(f"c.{field}" for field in fields)
+
+
+def project(doc: dict, fields: List[str]) -> dict:
+    """Build the response dict for a stored document."""
+    projected = {}
+    for field in fields:
+        value = doc.get(field, _MISSING_DEFAULTS.get(field))
+        # Stored as isoformat() ("+00:00"); DeviceResponse renders UTC as "Z"
+        if field in _TIMESTAMP_FIELDS and value is not None and value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        projected[field] = value
+    return projected
@@ -0,0 +1,434 @@
+"""
+Multi-process in-memory device repository.
+All uvicorn workers on a node share one mmap-backed, append-only record log
+(in /dev/shm by default). Each worker keeps a local replica that is brought up to
+date whenever the log's sequence number moves, so reads are local dict lookups and
+scale with the number of workers. Writes take an exclusive flock on the log.
+"""
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, List, Optional, Union
+
+from src import metrics
+from src.loop_monitor import LOCK_MS_BUCKETS
+from src.repositories.documents import doc_to_device, in_site, render
+from src.repositories.history import HistoryLog
+from src.repositories.naming import NameIndex, unique_names_enforced
+from src.repositories.sorting import DEFAULT_SORT, SortedIndexes
+from src.schemas import DEFAULT_SITE, DeviceCreate, DeviceUpdate, DeviceResponse
+
+logger = logging.getLogger(__name__)
+
+# Header: magic, generation, sequence number, end of log, seeded flag
+_MAGIC = b"DEVLOG01"
+_HEADER = struct.Struct("<8sQQQQ")
+_SEQ_OFFSET = 16
+_RECORD_LEN = struct.Struct("<I")
+
+_INITIAL_SIZE = 16 * 1024 * 1024
+# Compact once the log is at least this big and more than half of it is dead records
+_COMPACT_MIN_BYTES = 4 * 1024 * 1024
+# Applying more records than this at once re-sorts the indexes instead of inserting
+_INDEX_REBUILD_RECORDS = 1000
+
+
+def _default_path() -> str:
+    """
+    The log file for this app instance: named by SHARED_STORE_NAMESPACE, or by
+    the port, which all workers of an instance share and other instances on the
+    host do not. The file outlives the app, so a restart reloads the same devices.
+    """
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    namespace = os.environ.get("SHARED_STORE_NAMESPACE") or f"port{os.environ.get('PORT', '8000')}"
+    return os.path.join(directory, f"inventory-devices-{namespace}.log")
+
+
+class SharedDeviceLog:
+    """Append-only device log in a shared mmap with a per-process replica."""
+
+    def __init__(self, path: str):
+        self.path = path
+        # flock blocks the event loop while another worker holds the log
+        self._lock_wait = metrics.histogram(
+            "shared_log_lock_wait_ms", LOCK_MS_BUCKETS, "Time spent waiting for the shared log flock"
+        )
+        self._lock_hold = metrics.histogram("shared_log_lock_hold_ms", LOCK_MS_BUCKETS, "Time the shared log flock was held")
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self._lock(exclusive=True):
+            if os.fstat(self._fd).st_size < _HEADER.size:
+                os.ftruncate(self._fd, _INITIAL_SIZE)
+                self._map()
+                _HEADER.pack_into(self._mm, 0, _MAGIC, 1, 0, _HEADER.size, 0)
+            else:
+                self._map()
+                if _HEADER.unpack_from(self._mm, 0)[0] != _MAGIC:
+                    raise ValueError(f"{path} is not a device log")
+
+        self.devices: dict[str, dict] = {}
+        self.indexes = SortedIndexes()
+        self.names = NameIndex()
+        # Versions this worker has replayed; compaction drops superseded records
+        # from the shared log, so history goes back to this worker's first sync
+        self.history = HistoryLog()
+        # Deletes committed in this generation, kept as tombstones by the next
+        # compaction so that workers replaying its snapshot learn when they happened
+        self._deletes: dict[str, str] = {}
+        self._generation = 0
+        self._seq = -1
+        self._offset = _HEADER.size
+        self._compact_at = _COMPACT_MIN_BYTES
+
+    def _map(self) -> None:
+        self._mm = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+
+    @contextmanager
+    def _lock(self, exclusive: bool) -> Iterator[None]:
+        started = time.perf_counter()
+        fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        acquired = time.perf_counter()
+        self._lock_wait.observe((acquired - started) * 1000)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._lock_hold.observe((time.perf_counter() - acquired) * 1000)
+
+    def _header(self) -> tuple:
+        return _HEADER.unpack_from(self._mm, 0)
+
+    def sync(self) -> None:
+        """Catch the local replica up with the shared log."""
+        # Lock-free fast path: nothing was committed since the last sync
+        if struct.unpack_from("<Q", self._mm, _SEQ_OFFSET)[0] == self._seq:
+            return
+        with self._lock(exclusive=False):
+            self._sync_locked()
+
+    def _sync_locked(self) -> None:
+        if os.fstat(self._fd).st_size != len(self._mm):
+            # Another worker grew the file
+            self._mm.close()
+            self._map()
+
+        _, generation, seq, end, _ = self._header()
+        compacted = generation != self._generation
+        if compacted:
+            # The log was compacted; rebuild the replica from its snapshot,
+            # applied over the old replica so that the snapshot's tombstones
+            # find the devices deleted since this worker last synced
+            self._deletes = {}
+            self._offset = _HEADER.size
+
+        records = []
+        offset = self._offset
+        while offset < end:
+            (length,) = _RECORD_LEN.unpack_from(self._mm, offset)
+            start = offset + _RECORD_LEN.size
+            records.append(json.loads(self._mm[start : start + length]))
+            offset = start + length
+
+        # Replaying many records (startup, compaction, bulk loads by another
+        # worker) re-sorts the indexes once instead of inserting one by one
+        rebuild = compacted or len(records) > _INDEX_REBUILD_RECORDS
+        for record in records:
+            self._apply(record, index=not rebuild)
+        if compacted:
+            self._drop_missing(records)
+            self._generation = generation
+        if rebuild:
+            self._rebuild_indexes()
+
+        self._offset = offset
+        self._seq = seq
+
+    def _drop_missing(self, records: List[dict]) -> None:
+        """
+        Delete devices the compacted log no longer has. Tombstones only cover
+        deletes since the compaction before, so older ones are dated now.
+        """
+        kept = {record["doc"]["id"] for record in records if record["op"] == "put"}
+        now = datetime.now(timezone.utc).isoformat()
+        for device_id in self.devices.keys() - kept:
+            del self.devices[device_id]
+            self.history.record(device_id, None, now)
+
+    def _apply(self, record: dict, index: bool = True) -> None:
+        if record["op"] == "put":
+            doc = record["doc"]
+            previous = self.devices.get(doc["id"])
+            self.devices[doc["id"]] = doc
+            self._deletes.pop(doc["id"], None)
+            self.history.record(doc["id"], doc, record.get("at", doc["updated_at"]))
+            if index:
+                if previous is None:
+                    self.indexes.add(doc)
+                    self.names.add(doc)
+                else:
+                    self.indexes.replace(previous, doc)
+                    self.names.replace(previous, doc)
+        else:
+            previous = self.devices.pop(record["id"], None)
+            if previous is not None:
+                at = record.get("at", previous["updated_at"])
+                self.history.record(record["id"], None, at)
+                if not record.get("tombstone"):
+                    self._deletes[record["id"]] = at
+            if index and previous is not None:
+                self.indexes.remove(previous)
+                self.names.remove(previous)
+
+    def _rebuild_indexes(self) -> None:
+        self.indexes.rebuild(self.devices.values())
+        self.names.rebuild(self.devices.values())
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Exclusive section with an up-to-date replica; use `append` inside it."""
+        with self._lock(exclusive=True):
+            self._sync_locked()
+            yield
+            if self._offset >= self._compact_at:
+                self._maybe_compact()
+
+    def append(self, record: dict) -> None:
+        """Commit a record to the shared log and the local replica (inside `write`)."""
+        self.extend([record])
+
+    def extend(self, records: List[dict]) -> None:
+        """Commit several records with a single header update (inside `write`)."""
+        payloads = [json.dumps(record, separators=(",", ":")).encode() for record in records]
+        self._write_records(payloads, self._offset)
+        rebuild = len(records) > _INDEX_REBUILD_RECORDS
+        for record in records:
+            self._apply(record, index=not rebuild)
+        if rebuild:
+            self._rebuild_indexes()
+
+    def _write_records(self, payloads: List[bytes], offset: int) -> None:
+        needed = offset + sum(_RECORD_LEN.size + len(p) for p in payloads)
+        if needed > len(self._mm):
+            size = len(self._mm)
+            while size < needed:
+                size *= 2
+            os.ftruncate(self._fd, size)
+            self._mm.close()
+            self._map()
+
+        for payload in payloads:
+            _RECORD_LEN.pack_into(self._mm, offset, len(payload))
+            start = offset + _RECORD_LEN.size
+            self._mm[start : start + len(payload)] = payload
+            offset = start + len(payload)
+
+        # Publish the new end offset and the sequence number readers poll
+        magic, generation, seq, _, seeded = self._header()
+        _HEADER.pack_into(self._mm, 0, magic, generation, seq + 1, offset, seeded)
+        self._offset = offset
+        self._seq = seq + 1
+
+    def _maybe_compact(self) -> None:
+        # Tombstones are only carried for one generation, which keeps the snapshot bounded
+        tombstones = [
+            json.dumps({"op": "del", "id": device_id, "at": at, "tombstone": True}, separators=(",", ":")).encode()
+            for device_id, at in self._deletes.items()
+        ]
+        payloads = tombstones + [
+            json.dumps({"op": "put", "doc": doc}, separators=(",", ":")).encode()
+            for doc in self.devices.values()
+        ]
+        live = sum(_RECORD_LEN.size + len(p) for p in payloads)
+        if live * 2 < self._offset - _HEADER.size:
+            magic, generation, seq, _, seeded = self._header()
+            _HEADER.pack_into(self._mm, 0, magic, generation + 1, seq, _HEADER.size, seeded)
+            self._generation = generation + 1
+            self._deletes = {}
+            self._write_records(payloads, _HEADER.size)
+            logger.info("Compacted shared device log to %d records", len(payloads) - len(tombstones))
+        self._compact_at = max(_COMPACT_MIN_BYTES, 2 * self._offset)
+
+    def committed(self) -> int:
+        """Sequence number of the last write committed to the shared log by any worker."""
+        return struct.unpack_from("<Q", self._mm, _SEQ_OFFSET)[0]
+
+    def claim_seed(self) -> bool:
+        """Atomically mark the store as seeded; True only for the first caller."""
+        with self._lock(exclusive=True):
+            magic, generation, seq, end, seeded = self._header()
+            if seeded:
+                return False
+            _HEADER.pack_into(self._mm, 0, magic, generation, seq, end, 1)
+            return True
+
+
+_log: Optional[SharedDeviceLog] = None
+
+
+def _get_log() -> SharedDeviceLog:
+    """Open the shared log on first use and sync the local replica."""
+    global _log
+    if _log is None:
+        path = os.environ.get("SHARED_STORE_PATH") or _default_path()
+        _log = SharedDeviceLog(path)
+        logger.info("Using shared device log at %s", path)
+    _log.sync()
+    return _log
+
+
+async def claim_seed() -> bool:
+    """Return True if this worker should seed test data (once per shared store)."""
+    return _get_log().claim_seed()
+
+
+def write_version() -> int:
+    """Changes with every write by any worker sharing the log."""
+    return _get_log().committed()
+
+
+async def list_devices(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[List[str]] = None,
+    sort: str = DEFAULT_SORT,
+    site: Optional[str] = None,
+    as_of: Optional[str] = None,
+) -> List[Union[DeviceResponse, dict]]:
+    """
+    List one page of devices in `sort` order, optionally projected to `fields`
+    and limited to one `site`; with `as_of`, the devices as they were then.
+    """
+    log = _get_log()
+    if as_of is not None:
+        return [render(doc, fields) for doc in log.history.page_at(as_of, sort, skip, limit, site)]
+    where = None if site is None else (lambda device_id: in_site(log.devices[device_id], site))
+    return [render(log.devices[device_id], fields) for device_id in log.indexes.page(sort, skip, limit, where)]
+
+
+async def get_device(
+    device_id: str,
+    fields: Optional[List[str]] = None,
+    site: Optional[str] = None,
+    as_of: Optional[str] = None,
+) -> Optional[Union[DeviceResponse, dict]]:
+    """Get a device by ID (None if it is not in `site`, when given), or as it was at `as_of`."""
+    log = _get_log()
+    doc = log.devices.get(device_id) if as_of is None else log.history.device_at(device_id, as_of)
+    if not in_site(doc, site):
+        return None
+    return render(doc, fields)
+
+
+async def get_devices(
+    device_ids: List[str], fields: Optional[List[str]] = None
+) -> List[Union[DeviceResponse, dict]]:
+    """Get several devices by ID; IDs that do not exist are skipped."""
+    devices = _get_log().devices
+    docs = [devices.get(device_id) for device_id in device_ids]
+    return [render(doc, fields) for doc in docs if doc is not None]
+
+
+async def get_devices_by_name(
+    name: str, fields: Optional[List[str]] = None, site: Optional[str] = None
+) -> List[Union[DeviceResponse, dict]]:
+    """Devices named `name` (in `site`, when given), oldest first."""
+    log = _get_log()
+    return [render(doc, fields) for doc in log.names.lookup(name, log.devices, site)]
+
+
+async def get_device_history(device_id: str) -> Optional[List[dict]]:
+    """Changes of a device, oldest first; None if it never existed."""
+    return _get_log().history.history(device_id)
+
+
+async def create_device(device: DeviceCreate, device_id: Optional[str] = None) -> DeviceResponse:
+    """
+    Create a new device. With a `device_id` that already exists (a repeated
+    idempotent create, possibly from another worker), the existing device is
+    returned instead.
+    """
+    log = _get_log()
+    now = datetime.now(timezone.utc).isoformat()
+    device_id = device_id or str(uuid.uuid4())
+
+    doc = {
+        "id": device_id,
+        "name": device.name,
+        "assigned_to": device.assigned_to,
+        "site": device.site,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+    with log.write():
+        # Checked under the write lock so concurrent workers cannot both pass
+        existing = log.devices.get(device_id)
+        if existing is not None:
+            return doc_to_device(existing)
+        if unique_names_enforced():
+            log.names.check_available(device.name, device.site, log.devices)
+        log.append({"op": "put", "doc": doc})
+
+    logger.info("Created device: %s", device_id)
+    return doc_to_device(doc)
+
+
+async def bulk_create_devices(docs: List[dict]) -> int:
+    """
+    Insert fully-formed device documents (e.g. from src.seeding) in one write.
+    Names are not checked for uniqueness here.
+    """
+    log = _get_log()
+    with log.write():
+        # Recorded in history as of the load, which is when they appeared in this store
+        at = datetime.now(timezone.utc).isoformat()
+        log.extend([{"op": "put", "doc": doc, "at": at} for doc in docs])
+
+    logger.info("Bulk created %d devices", len(docs))
+    return len(docs)
+
+
+async def update_device(
+    device_id: str, device: DeviceUpdate, site: Optional[str] = None
+) -> Optional[DeviceResponse]:
+    """Update an existing device."""
+    log = _get_log()
+    with log.write():
+        if not in_site(log.devices.get(device_id), site):
+            return None
+
+        updated = dict(log.devices[device_id])
+
+        if device.name is not None and device.name != updated["name"] and unique_names_enforced():
+            log.names.check_available(device.name, updated.get("site", DEFAULT_SITE), log.devices, device_id)
+
+        # Update only the fields that were provided
+        if device.name is not None:
+            updated["name"] = device.name
+        if device.assigned_to is not None:
+            updated["assigned_to"] = device.assigned_to
+
+        updated["updated_at"] = datetime.now(timezone.utc).isoformat()
+        log.append({"op": "put", "doc": updated})
+
+    logger.info("Updated device: %s", device_id)
+    return doc_to_device(updated)
+
+
+async def delete_device(device_id: str, site: Optional[str] = None) -> bool:
+    """Delete a device by ID."""
+    log = _get_log()
+    with log.write():
+        if not in_site(log.devices.get(device_id), site):
+            return False
+        log.append({"op": "del", "id": device_id, "at": datetime.now(timezone.utc).isoformat()})
+
+    logger.info("Deleted device: %s", device_id)
+    return True
@@ -0,0 +1,131 @@
+"""
+Sort orders for device listings (`sort=` on the API) and the ordered indexes
+the in-process backends maintain so listings never sort at request time.
+Every order breaks ties by ID, matching the Cosmos DB composite indexes.
+"""
+import bisect
+from itertools import islice
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+SORT_FIELDS = ("name", "created_at", "updated_at")
+DEFAULT_SORT = "-created_at"
+
+
+def parse_sort(sort: str) -> Tuple[str, bool]:
+    """
+    Parse "field" (ascending) or "-field" (descending) into (field, descending).
+    Raises ValueError for fields that cannot be sorted on.
+    """
+    descending = sort.startswith("-")
+    field = sort.lstrip("-+").strip()
+    if field not in SORT_FIELDS:
+        raise ValueError(f"Cannot sort by {field!r}; valid sorts are {', '.join(SORT_FIELDS)} (prefix - for descending)")
+    return field, descending
+
+
+def order_by_clause(sort: str) -> str:
+    """Cosmos SQL ORDER BY for a sort; needs the (field, id) composite index."""
+    field, descending = parse_sort(sort)
+    direction = "DESC" if descending else "ASC"
+    return f"ORDER BY c.{field} {direction}, c.id {direction}"
+
+
+class SortedIndexes:
+    """
+    One sorted list of (value, id) per sort field, kept up to date on every write.
+    Inserts and removals are a binary search plus a list shift; a page is a slice.
+    Bulk additions are held aside and merged in one pass when next needed, so
+    loading many batches costs one sort rather than one per batch.
+    """
+
+    def __init__(self, fields: Iterable[str] = SORT_FIELDS):
+        self._indexes: Dict[str, List[Tuple[str, str]]] = {field: [] for field in fields}
+        self._pending: List[dict] = []
+
+    def merge_pending(self) -> None:
+        """Merge documents from `extend` into the indexes (done by every other method)."""
+        if not self._pending:
+            return
+        for field, index in self._indexes.items():
+            entries = [(doc[field], doc["id"]) for doc in self._pending]
+            # Two stable sorts on plain strings beat one on tuples
+            entries.sort(key=itemgetter(1))
+            entries.sort(key=itemgetter(0))
+            if index:
+                index.extend(entries)
+                # Timsort merges the two sorted runs in linear time
+                index.sort()
+            else:
+                self._indexes[field] = entries
+        self._pending = []
+
+    def add(self, doc: dict) -> None:
+        self.merge_pending()
+        for field, index in self._indexes.items():
+            bisect.insort(index, (doc[field], doc["id"]))
+
+    def remove(self, doc: dict) -> None:
+        self.merge_pending()
+        for field, index in self._indexes.items():
+            entry = (doc[field], doc["id"])
+            position = bisect.bisect_left(index, entry)
+            if position < len(index) and index[position] == entry:
+                del index[position]
+
+    def replace(self, old: dict, new: dict) -> None:
+        self.merge_pending()
+        for field, index in self._indexes.items():
+            if old[field] == new[field]:
+                continue
+            entry = (old[field], old["id"])
+            position = bisect.bisect_left(index, entry)
+            if position < len(index) and index[position] == entry:
+                del index[position]
+            bisect.insort(index, (new[field], new["id"]))
+
+    def rebuild(self, docs: Iterable[dict]) -> None:
+        """Re-create every index from scratch (after bulk loads or a full replay)."""
+        docs = list(docs)
+        self._pending = []
+        for field in self._indexes:
+            self._indexes[field] = sorted((doc[field], doc["id"]) for doc in docs)
+
+    def extend(self, docs: List[dict]) -> None:
+        """Add many documents at once; they are merged in on the next read or write."""
+        self._pending.extend(docs)
+
+    def count(self, field: str, upto: Optional[str] = None) -> int:
+        """Entries of a field's index, or only those whose value is at most `upto`."""
+        self.merge_pending()
+        index = self._indexes[field]
+        return len(index) if upto is None else bisect.bisect_right(index, upto, key=itemgetter(0))
+
+    def page(
+        self,
+        sort: str,
+        skip: int,
+        limit: int,
+        where: Optional[Callable[[str], bool]] = None,
+        upto: Optional[str] = None,
+    ) -> List[str]:
+        """
+        IDs of one page in the requested order, optionally only IDs matching
+        `where` and only entries whose sort value is at most `upto`.
+        """
+        field, descending = parse_sort(sort)
+        self.merge_pending()
+        index = self._indexes[field]
+        size = len(index) if upto is None else bisect.bisect_right(index, upto, key=itemgetter(0))
+        if where is not None:
+            # Walk the index in order and stop as soon as the page is full
+            positions = range(size - 1, -1, -1) if descending else range(size)
+            device_ids = (index[position][1] for position in positions)
+            return list(islice((device_id for device_id in device_ids if where(device_id)), skip, skip + limit))
+        if descending:
+            end = max(0, size - skip)
+            entries = index[max(0, end - limit) : end]
+            entries.reverse()
+        else:
+            entries = index[skip : min(skip + limit, size)]
+        return [device_id for _, device_id in entries]
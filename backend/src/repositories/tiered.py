@@ -0,0 +1,196 @@
+"""
+Tiered device repository: a bounded in-process hot tier (L1) in front of Cosmos DB.
+Point reads are served from the hot tier, which holds device documents like the
+in-memory repository but only the working set, chosen by W-TinyLFU admission
+(src/repositories/caching.py). Writes go through to Cosmos DB first and then
+update the hot tier; listings and other queries always go to Cosmos DB.
+
+Each worker has its own hot tier, so changes made through other workers are
+seen once the entry outlives TIERED_TTL_SECONDS.
+
+The hot tier stores the same documents as the in-memory repository and renders
+them with the same helpers (src/repositories/documents.py), but not its module
+state: that store is unbounded and keeps sort, name and history indexes over
+every device, which eviction would have to keep in step for queries the hot
+tier never answers.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional, Union
+
+from src.repositories import cosmos_repo
+from src.repositories.caching import TinyLfuCache
+from src.repositories.documents import in_site, render
+from src.schemas import DeviceCreate, DeviceUpdate, DeviceResponse
+
+logger = logging.getLogger(__name__)
+
+# Queries and history are answered by Cosmos DB as is
+list_devices = cosmos_repo.list_devices
+get_devices_by_name = cosmos_repo.get_devices_by_name
+get_device_history = cosmos_repo.get_device_history
+bulk_create_devices = cosmos_repo.bulk_create_devices
+flush_writes = cosmos_repo.flush_writes
+
+
+def get_tiered_config() -> dict:
+    """Get hot tier configuration from environment variables."""
+    return {
+        # Devices held per worker
+        "capacity": int(os.environ.get("TIERED_CAPACITY", "100000")),
+        # Bound on staleness from writes made through other workers; 0 never expires
+        "ttl_s": float(os.environ.get("TIERED_TTL_SECONDS", "30")),
+        # Share of the capacity for the admission window (new keys)
+        "window_percent": float(os.environ.get("TIERED_WINDOW_PERCENT", "1")),
+        # Most recently updated devices loaded at startup
+        "warm_count": int(os.environ.get("TIERED_WARM_COUNT", "10000")),
+    }
+
+
+_hot: Optional[TinyLfuCache] = None
+# Recently deleted IDs, so that a read racing a delete cannot re-cache the device
+_deleted: "OrderedDict[str, float]" = OrderedDict()
+
+
+def _get_hot() -> TinyLfuCache:
+    global _hot
+    if _hot is None:
+        config = get_tiered_config()
+        _hot = TinyLfuCache(
+            config["capacity"],
+            ttl_s=config["ttl_s"],
+            window_percent=config["window_percent"],
+            name="tiered_hot",
+        )
+    return _hot
+
+
+def _response_doc(device: DeviceResponse) -> dict:
+    """The stored form of a device returned by a write."""
+    return {
+        "id": device.id,
+        "name": device.name,
+        "assigned_to": device.assigned_to,
+        "site": device.site,
+        "created_at": device.created_at.isoformat(),
+        "updated_at": device.updated_at.isoformat(),
+    }
+
+
+def _forget_deletes() -> None:
+    """Drop delete markers older than the TTL (a minute when entries never expire)."""
+    ttl_s = _get_hot().ttl_s or 60.0
+    now = time.monotonic()
+    while _deleted:
+        oldest, deleted_at = next(iter(_deleted.items()))
+        if now - deleted_at <= ttl_s:
+            break
+        del _deleted[oldest]
+
+
+def _cache(doc: dict) -> None:
+    """Offer a document read from Cosmos DB to the hot tier, unless a newer version is there."""
+    hot = _get_hot()
+    cached = hot.peek(doc["id"])
+    if cached is not None and cached["updated_at"] > doc["updated_at"]:
+        return
+    _forget_deletes()
+    if doc["id"] not in _deleted:
+        hot.put(doc["id"], doc)
+
+
+async def warm_cache() -> int:
+    """Load the most recently updated devices into the hot tier (called on startup)."""
+    count = min(get_tiered_config()["warm_count"], _get_hot().capacity)
+    if count <= 0:
+        return 0
+    devices = await cosmos_repo.list_devices(limit=count, sort="-updated_at")
+    loaded = _get_hot().preload((device.id, _response_doc(device)) for device in devices)
+    logger.info("Warmed hot tier with %d devices", loaded)
+    return loaded
+
+
+async def get_device(
+    device_id: str,
+    fields: Optional[List[str]] = None,
+    site: Optional[str] = None,
+    as_of: Optional[str] = None,
+) -> Optional[Union[DeviceResponse, dict]]:
+    """Get a device by ID from the hot tier, loading it from Cosmos DB on a miss."""
+    if as_of is not None:
+        return await cosmos_repo.get_device(device_id, fields=fields, site=site, as_of=as_of)
+
+    doc = _get_hot().get(device_id)
+    if doc is None:
+        doc = await cosmos_repo.get_device_doc(device_id, site)
+        if doc is None:
+            return None
+        _cache(doc)
+    return render(doc, fields) if in_site(doc, site) else None
+
+
+async def get_devices(
+    device_ids: List[str], fields: Optional[List[str]] = None
+) -> List[Union[DeviceResponse, dict]]:
+    """Get several devices by ID; only the ones missing from the hot tier are read from Cosmos DB."""
+    hot = _get_hot()
+    docs = {}
+    for device_id in device_ids:
+        doc = hot.get(device_id)
+        if doc is not None:
+            docs[device_id] = doc
+
+    missing = [device_id for device_id in device_ids if device_id not in docs]
+    if missing:
+        for doc in (await cosmos_repo.get_device_docs(missing)).values():
+            _cache(doc)
+            docs[doc["id"]] = doc
+
+    return [render(docs[device_id], fields) for device_id in device_ids if device_id in docs]
+
+
+async def create_device(device: DeviceCreate, device_id: Optional[str] = None) -> DeviceResponse:
+    """Create a device in Cosmos DB (or find it, for a repeated `device_id`), then cache it."""
+    created = await cosmos_repo.create_device(device, device_id)
+    _get_hot().put(created.id, _response_doc(created))
+    return created
+
+
+async def update_device(
+    device_id: str, device: DeviceUpdate, site: Optional[str] = None
+) -> Optional[DeviceResponse]:
+    """Update a device in Cosmos DB, then refresh the cached copy."""
+    updated = await cosmos_repo.update_device(device_id, device, site=site)
+    if updated is None:
+        _get_hot().invalidate(device_id)
+        return None
+    _get_hot().put(device_id, _response_doc(updated))
+    return updated
+
+
+async def delete_device(device_id: str, site: Optional[str] = None) -> bool:
+    """Delete a device from Cosmos DB, then from the hot tier."""
+    deleted = await cosmos_repo.delete_device(device_id, site=site)
+    if deleted:
+        _forget_deletes()
+        _deleted.pop(device_id, None)
+        _deleted[device_id] = time.monotonic()
+        _get_hot().invalidate(device_id)
+    return deleted
+
+
+__all__ = [
+    "list_devices",
+    "get_device",
+    "get_devices",
+    "get_devices_by_name",
+    "get_device_history",
+    "create_device",
+    "bulk_create_devices",
+    "update_device",
+    "delete_device",
+    "flush_writes",
+    "warm_cache",
+]
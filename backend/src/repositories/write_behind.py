@@ -0,0 +1,213 @@
+"""
+Write-behind coalescing of repeated updates to the same document.
+Updates to a key within a short window are merged into one buffered document
+and written once; reads consult the buffer so they see the merged state.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+Write = Callable[[dict], Awaitable[dict]]
+
+# When an update is acknowledged
+ACK_MODES = ("durable", "buffered")
+
+
+class _Entry:
+    __slots__ = ("doc", "opened_at", "timer", "waiters", "attempts")
+
+    def __init__(self, doc: dict, opened_at: float):
+        self.doc = doc
+        self.opened_at = opened_at
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.waiters: List[asyncio.Future] = []
+        self.attempts = 0
+
+
+class WriteBehindBuffer:
+    """
+    Buffers full documents by key and writes each with one `write(doc)` call
+    `window_ms` after its first buffered update; later updates within the
+    window are merged into the same document.
+
+    With ack="durable", `stage` returns once the merged write has committed, so
+    concurrent updates share a write but none is acknowledged before it is stored.
+    With ack="buffered", `stage` returns immediately; a worker that dies loses
+    up to one window of updates. Failed buffered writes are retried on the next
+    window, up to `max_attempts` times.
+    """
+
+    def __init__(
+        self,
+        write: Write,
+        window_ms: float = 50.0,
+        max_pending: int = 1000,
+        ack: str = "durable",
+        max_attempts: int = 3,
+        name: str = "write_behind",
+    ):
+        if ack not in ACK_MODES:
+            raise ValueError(f"Unsupported write-behind ack mode {ack!r}; use one of {', '.join(ACK_MODES)}")
+        self._write = write
+        self._window = window_ms / 1000.0
+        self._max_pending = max(1, max_pending)
+        self._durable = ack == "durable"
+        self._max_attempts = max(1, max_attempts)
+        self._pending: Dict[str, _Entry] = {}
+        # Entries whose write is in flight; still visible to reads
+        self._flushing: Dict[str, _Entry] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+        self._coalesced = metrics.counter(
+            f"{name}_coalesced_total", "Updates merged into an already buffered write"
+        )
+        self._writes = metrics.counter(f"{name}_writes_total", "Buffered documents written")
+        self._failures = metrics.counter(f"{name}_failures_total", "Buffered writes that failed")
+        self._dropped = metrics.counter(
+            f"{name}_dropped_total", "Buffered updates given up on after max_attempts failures"
+        )
+        self._pending_gauge = metrics.gauge(f"{name}_pending", "Documents waiting to be written")
+        self._delay = metrics.histogram(
+            f"{name}_delay_ms", description="Time from first buffered update until the write started"
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        """The buffered (or in-flight) document for `key`, or None."""
+        entry = self._pending.get(key) or self._flushing.get(key)
+        return entry.doc if entry is not None else None
+
+    def buffered(self) -> Dict[str, dict]:
+        """All buffered and in-flight documents by key (pending ones win)."""
+        docs = {key: entry.doc for key, entry in self._flushing.items()}
+        docs.update((key, entry.doc) for key, entry in self._pending.items())
+        return docs
+
+    async def stage(self, key: str, base: dict, changes: dict) -> dict:
+        """
+        Apply `changes` to the buffered document for `key`, or to a copy of
+        `base` if nothing is buffered, and schedule its write.
+        Returns the document as of this update.
+        """
+        entry = self._pending.get(key)
+        if entry is not None:
+            self._coalesced.inc()
+        else:
+            # Build on an in-flight write rather than the (older) base
+            current = self.get(key)
+            entry = _Entry(dict(current if current is not None else base), time.perf_counter())
+            self._pending[key] = entry
+            self._pending_gauge.set(len(self._pending))
+            loop = asyncio.get_running_loop()
+            if len(self._pending) >= self._max_pending:
+                self._dispatch(key)
+            else:
+                entry.timer = loop.call_later(self._window, self._dispatch, key)
+        entry.doc.update(changes)
+        snapshot = dict(entry.doc)
+
+        if self._durable:
+            future = asyncio.get_running_loop().create_future()
+            entry.waiters.append(future)
+            # Shield so one cancelled caller does not cancel the shared write
+            await asyncio.shield(future)
+        return snapshot
+
+    async def discard(self, key: str) -> None:
+        """Drop the buffered document for `key` (e.g. before deleting it) and wait out its write."""
+        entry = self._pending.pop(key, None)
+        if entry is not None:
+            if entry.timer is not None:
+                entry.timer.cancel()
+            self._pending_gauge.set(len(self._pending))
+            for future in entry.waiters:
+                if not future.done():
+                    future.set_result(None)
+        task = self._tasks.get(key)
+        if task is not None:
+            await asyncio.wait([task])
+
+    async def settle(self, key: str) -> None:
+        """Write the buffered document for `key` now and wait until it is stored."""
+        while key in self._pending or key in self._tasks:
+            if key not in self._tasks:
+                self._dispatch(key)
+            await asyncio.wait([self._tasks[key]])
+
+    async def flush(self) -> None:
+        """Write everything buffered now and wait for all writes (e.g. on shutdown)."""
+        while self._pending or self._tasks:
+            for key in list(self._pending):
+                if key not in self._tasks:
+                    self._dispatch(key, final=True)
+            if self._tasks:
+                await asyncio.wait(list(self._tasks.values()))
+
+    def _dispatch(self, key: str, final: bool = False) -> None:
+        if key in self._tasks:
+            # One write per key at a time; try again once the current one is done
+            entry = self._pending.get(key)
+            if entry is not None and entry.timer is not None:
+                entry.timer.cancel()
+                entry.timer = None
+            return
+        entry = self._pending.pop(key, None)
+        if entry is None:
+            return
+        if entry.timer is not None:
+            entry.timer.cancel()
+            entry.timer = None
+        self._pending_gauge.set(len(self._pending))
+        self._flushing[key] = entry
+        self._delay.observe((time.perf_counter() - entry.opened_at) * 1000)
+        self._tasks[key] = asyncio.get_running_loop().create_task(self._flush_entry(key, entry, final))
+
+    async def _flush_entry(self, key: str, entry: _Entry, final: bool) -> None:
+        error: Optional[BaseException] = None
+        try:
+            entry.attempts += 1
+            await self._write(entry.doc)
+            self._writes.inc()
+        except Exception as e:
+            self._failures.inc()
+            error = e
+        finally:
+            del self._flushing[key]
+            del self._tasks[key]
+
+        if error is not None and not self._durable:
+            error = self._retry(key, entry, error, final)
+        for future in entry.waiters:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+        # An update arrived while this write was in flight and its window has passed
+        newer = self._pending.get(key)
+        if newer is not None and newer.timer is None:
+            self._dispatch(key, final)
+
+    def _retry(self, key: str, entry: _Entry, error: Exception, final: bool) -> Optional[Exception]:
+        """Re-buffer a failed buffered write unless a newer update supersedes it."""
+        if key in self._pending:
+            # The newer document already includes these changes
+            return None
+        if entry.attempts >= self._max_attempts:
+            self._dropped.inc()
+            logger.error("Giving up on buffered write of %s after %d attempts: %s", key, entry.attempts, error)
+            return error
+        logger.warning("Buffered write of %s failed (attempt %d), retrying: %s", key, entry.attempts, error)
+        entry.opened_at = time.perf_counter()
+        self._pending[key] = entry
+        self._pending_gauge.set(len(self._pending))
+        if not final:
+            entry.timer = asyncio.get_running_loop().call_later(self._window, self._dispatch, key)
+        return None
+
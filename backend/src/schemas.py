@@ -1,12 +1,21 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
+# Site of devices created without one (and of documents stored before sites existed)
+DEFAULT_SITE = "default"
+
 
 class DeviceBase(BaseModel):
     """Base schema for device"""
     name: str = Field(..., min_length=1, max_length=255, description="Device name")
     assigned_to: Optional[str] = Field(None, max_length=255, description="Person or department assigned to")
+    site: str = Field(
+        DEFAULT_SITE,
+        min_length=1,
+        max_length=255,
+        description="Site or tenant owning the device; fixed at creation (it can be the Cosmos DB partition key)",
+    )
 
 
 class DeviceCreate(DeviceBase):
@@ -28,3 +37,22 @@ class DeviceResponse(DeviceBase):
     
     class Config:
         from_attributes = True
+
+
+class DeviceLookupResponse(BaseModel):
+    """Schema for multi-ID lookup response"""
+    devices: List[DeviceResponse]
+    missing: List[str] = Field(default_factory=list, description="Requested IDs that were not found")
+
+
+class DeviceEvent(BaseModel):
+    """Schema for one change in a device's history"""
+    at: datetime
+    op: str = Field(..., description="create, update or delete")
+    changes: dict = Field(default_factory=dict, description="Fields set by the change (all of them on create)")
+
+
+class DeviceHistoryResponse(BaseModel):
+    """Schema for a device's change history, oldest first"""
+    device_id: str
+    events: List[DeviceEvent]
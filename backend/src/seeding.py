@@ -0,0 +1,209 @@
+"""
+Synthetic inventory generator for local and performance testing.
+Generates realistic device documents (skewed assignees, spread-out timestamps)
+and loads them through the repositories' batched bulk_create_devices path.
+
+Startup seeding in TEST_MODE is controlled by SEED_* environment variables;
+to seed any backend from the command line:
+    python -m src.seeding --count 1000000
+"""
+import argparse
+import asyncio
+import bisect
+import gc
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from itertools import accumulate
+from typing import Iterator, List, Optional
+
+import src.repositories as device_repo
+from src.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+DEVICE_TYPES = ("Laptop", "Monitor", "Keyboard", "Mouse", "Dock", "Headset", "Phone", "Tablet")
+DEPARTMENTS = ("Engineering", "Finance", "Sales", "Marketing", "Support", "IT")
+TIMESTAMP_DISTRIBUTIONS = ("uniform", "recent")
+
+_DAY_SECONDS = 86400
+
+
+def get_seed_config() -> dict:
+    """Get seeding configuration from environment variables."""
+    random_seed = os.environ.get("SEED_RANDOM_SEED")
+    return {
+        # 0 keeps the five hard-coded sample devices
+        "count": int(os.environ.get("SEED_DEVICE_COUNT", "0")),
+        "assignees": int(os.environ.get("SEED_ASSIGNEES", "500")),
+        # Zipf exponent: 0 spreads devices evenly, ~1 gives a few heavy holders
+        "assignee_skew": float(os.environ.get("SEED_ASSIGNEE_SKEW", "1.1")),
+        "unassigned_ratio": float(os.environ.get("SEED_UNASSIGNED_RATIO", "0.1")),
+        # Devices are spread evenly over this many sites (site-000, site-001, ...)
+        "sites": int(os.environ.get("SEED_SITES", "20")),
+        "days": float(os.environ.get("SEED_DAYS", "365")),
+        "timestamp_distribution": os.environ.get("SEED_TIMESTAMP_DISTRIBUTION", "uniform").lower(),
+        "updated_ratio": float(os.environ.get("SEED_UPDATED_RATIO", "0.3")),
+        "batch_size": int(os.environ.get("SEED_BATCH_SIZE", "10000")),
+        "random_seed": int(random_seed) if random_seed else None,
+    }
+
+
+def _assignee_names(count: int) -> List[str]:
+    # Mix of people and departments, as in the sample data
+    names = [f"{department} Team" for department in DEPARTMENTS]
+    names += [f"User {i:05d}" for i in range(max(0, count - len(names)))]
+    return names[:count]
+
+
+def generate_devices(
+    count: int,
+    assignees: int = 500,
+    assignee_skew: float = 1.1,
+    unassigned_ratio: float = 0.1,
+    sites: int = 20,
+    days: float = 365,
+    timestamp_distribution: str = "uniform",
+    updated_ratio: float = 0.3,
+    random_seed: Optional[int] = None,
+    now: Optional[float] = None,
+) -> Iterator[dict]:
+    """
+    Yield `count` device documents in the repositories' storage format.
+
+    - assigned_to follows a Zipf distribution over `assignees` names (rank 1 is
+      the most common); `unassigned_ratio` of devices have no assignee
+    - site is picked uniformly from `sites` names
+    - created_at falls within the last `days`: "uniform" spreads it evenly,
+      "recent" skews it towards now like a growing fleet
+    - `updated_ratio` of devices have an updated_at after created_at
+    The same `random_seed` always produces the same dataset.
+    """
+    if timestamp_distribution not in TIMESTAMP_DISTRIBUTIONS:
+        raise ValueError(f"Unknown timestamp distribution: {timestamp_distribution}")
+
+    rng = random.Random(random_seed)
+    names = _assignee_names(max(1, assignees))
+    cum_weights = list(accumulate(1.0 / (rank ** assignee_skew) for rank in range(1, len(names) + 1)))
+    total_weight = cum_weights[-1]
+    site_names = [f"site-{i:03d}" for i in range(max(1, sites))]
+    now = time.time() if now is None else now
+    window = days * _DAY_SECONDS
+    # A random UUIDv4 per dataset with the device index as its last 48 bits:
+    # unique, well-formed and much cheaper than a uuid4() per device
+    id_prefix = str(uuid.UUID(int=rng.getrandbits(128), version=4))[:24]
+
+    for i in range(count):
+        if rng.random() < unassigned_ratio:
+            assigned_to = None
+        else:
+            assigned_to = names[bisect.bisect(cum_weights, rng.random() * total_weight)]
+
+        if timestamp_distribution == "recent":
+            # Exponential age with a mean of a fifth of the window, capped at the window
+            age = min(rng.expovariate(5.0 / window), window)
+        else:
+            age = rng.random() * window
+        created_at = datetime.fromtimestamp(now - age, timezone.utc).isoformat()
+        if rng.random() < updated_ratio:
+            updated_at = datetime.fromtimestamp(now - age + rng.random() * age, timezone.utc).isoformat()
+        else:
+            updated_at = created_at
+
+        yield {
+            "id": f"{id_prefix}{i:012x}",
+            "name": f"{DEVICE_TYPES[i % len(DEVICE_TYPES)]}-{i:07d}",
+            "assigned_to": assigned_to,
+            "site": site_names[int(rng.random() * len(site_names))],
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+
+async def seed_devices(count: int, batch_size: int = 10000, **options) -> List[str]:
+    """Generate `count` devices and load them in batches; returns their IDs."""
+    started = time.perf_counter()
+    device_ids: List[str] = []
+    batch: List[dict] = []
+
+    # Millions of new (acyclic) documents and index entries would otherwise
+    # trigger ever longer full collections; freezing keeps later ones short
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for doc in generate_devices(count, **options):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                await device_repo.bulk_create_devices(batch)
+                device_ids.extend(d["id"] for d in batch)
+                batch = []
+                logger.debug("Seeded %d/%d devices", len(device_ids), count)
+        if batch:
+            await device_repo.bulk_create_devices(batch)
+            device_ids.extend(d["id"] for d in batch)
+    finally:
+        gc.freeze()
+        if gc_enabled:
+            gc.enable()
+
+    elapsed = time.perf_counter() - started
+    logger.info("Seeded %d devices in %.1fs (%.0f devices/s)", count, elapsed, count / max(elapsed, 1e-9))
+    return device_ids
+
+
+async def seed_from_config(config: Optional[dict] = None) -> List[str]:
+    """Seed the number of devices configured by SEED_DEVICE_COUNT."""
+    config = dict(config or get_seed_config())
+    count = config.pop("count")
+    return await seed_devices(count, **config)
+
+
+async def _main(args) -> None:
+    from src.db.cosmos import close_cosmos_client
+
+    config = get_seed_config()
+    config.update(
+        count=args.count,
+        assignees=args.assignees,
+        assignee_skew=args.assignee_skew,
+        sites=args.sites,
+        timestamp_distribution=args.timestamp_distribution,
+        batch_size=args.batch_size,
+        random_seed=args.random_seed,
+    )
+    backend = device_repo.get_backend_name()
+    if backend == "memory":
+        logger.warning("REPOSITORY_BACKEND=memory is per process; devices seeded here are discarded on exit")
+    logger.info("Seeding %d devices into the %s backend", args.count, backend)
+    try:
+        await seed_from_config(config)
+    finally:
+        await close_cosmos_client()
+
+
+def main(argv=None) -> None:
+    defaults = get_seed_config()
+    parser = argparse.ArgumentParser(description="Seed the configured repository backend with synthetic devices")
+    parser.add_argument("--count", type=int, required=True, help="Number of devices to create")
+    parser.add_argument("--assignees", type=int, default=defaults["assignees"], help="Distinct assignees")
+    parser.add_argument("--assignee-skew", type=float, default=defaults["assignee_skew"], help="Zipf exponent of assignees")
+    parser.add_argument("--sites", type=int, default=defaults["sites"], help="Distinct sites")
+    parser.add_argument(
+        "--timestamp-distribution",
+        choices=TIMESTAMP_DISTRIBUTIONS,
+        default=defaults["timestamp_distribution"],
+        help="Spread of created_at over the window",
+    )
+    parser.add_argument("--batch-size", type=int, default=defaults["batch_size"], help="Devices per bulk insert")
+    parser.add_argument("--random-seed", type=int, default=defaults["random_seed"], help="Seed for a reproducible dataset")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
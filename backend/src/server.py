@@ -0,0 +1,109 @@
+"""
+Production server entrypoint: python -m src.server
+
+Runs uvicorn with one worker per available CPU, uvloop and httptools, tuned
+keep-alive and listen backlog, and a graceful drain window so in-flight requests
+finish when Container Apps sends SIGTERM during a revision change.
+"""
+import importlib.util
+import logging
+import os
+
+import uvicorn
+
+from src.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def available_cpus() -> int:
+    """CPUs this process may use, honoring affinity and cgroup v2 CPU quotas."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # Container Apps limits CPU through a cgroup quota rather than affinity
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+
+    return max(1, cpus)
+
+
+def get_server_config() -> dict:
+    """Get server configuration from environment variables."""
+    return {
+        "host": os.environ.get("HOST", "0.0.0.0"),
+        "port": int(os.environ.get("PORT", "8000")),
+        # WEB_CONCURRENCY follows the convention used by gunicorn and most PaaS
+        "workers": int(os.environ.get("WEB_CONCURRENCY", "0")) or available_cpus(),
+        # Longer than the ingress idle timeout would cause resets; shorter wastes handshakes
+        "keep_alive": int(os.environ.get("KEEP_ALIVE_SECONDS", "75")),
+        "backlog": int(os.environ.get("LISTEN_BACKLOG", "2048")),
+        # Container Apps waits 30s after SIGTERM before SIGKILL
+        "graceful_timeout": int(os.environ.get("GRACEFUL_TIMEOUT_SECONDS", "25")),
+        "access_log": os.environ.get("ACCESS_LOG", "false").lower() == "true",
+        # Proxies whose X-Forwarded-For/Proto are trusted (comma-separated IPs or
+        # CIDRs); anyone else could use them to spoof the client address and scheme
+        "forwarded_allow_ips": os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+    }
+
+
+def main() -> None:
+    configure_logging()
+    config = get_server_config()
+    workers = config["workers"]
+
+    # Only reads env vars; the backend itself is imported by the workers
+    from src.repositories import get_backend_name
+
+    if get_backend_name() == "memory" and workers > 1:
+        logger.warning(
+            "REPOSITORY_BACKEND=memory keeps data per process; running 1 worker "
+            "instead of %d (use shared_memory to scale across workers)",
+            workers,
+        )
+        workers = 1
+
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+    logger.info(
+        "Starting %d worker(s) on %s:%d (loop=%s, http=%s, keep_alive=%ds, backlog=%d, graceful_timeout=%ds)",
+        workers,
+        config["host"],
+        config["port"],
+        loop,
+        http,
+        config["keep_alive"],
+        config["backlog"],
+        config["graceful_timeout"],
+    )
+
+    # Each worker imports src.main and creates its own Cosmos client in lifespan
+    uvicorn.run(
+        "src.main:app",
+        host=config["host"],
+        port=config["port"],
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_keep_alive=config["keep_alive"],
+        backlog=config["backlog"],
+        timeout_graceful_shutdown=config["graceful_timeout"],
+        access_log=config["access_log"],
+        # Leave uvicorn's loggers unconfigured so they propagate to the
+        # queue-based root handler set up by src.logging_config
+        log_config=None,
+        proxy_headers=True,
+        forwarded_allow_ips=config["forwarded_allow_ips"],
+    )
+
+
+if __name__ == "__main__":
+    main()
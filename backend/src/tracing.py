@@ -0,0 +1,372 @@
+"""
+Lightweight request tracing.
+Spans nest through a contextvar, so they follow a request across awaits and into
+tasks it starts. Incoming W3C traceparent headers are continued. Finished spans of
+sampled traces are exported by a background thread, either as JSON lines to a
+file or as OTLP/HTTP JSON to a collector. When tracing is disabled or a trace is
+not sampled, span() is a no-op.
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import re
+import tempfile
+import threading
+import time
+import urllib.request
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "inventory-backend"
+EXPORTERS = ("jsonl", "otlp")
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_exporter: Optional["_Exporter"] = None
+_sampler: Optional["Sampler"] = None
+
+
+def get_tracing_config() -> dict:
+    """Get tracing configuration from environment variables."""
+    return {
+        "enabled": os.environ.get("TRACING_ENABLED", "false").lower() == "true",
+        # Fraction of new traces recorded; incoming sampled/unsampled flags are honored
+        "sample_rate": float(os.environ.get("TRACING_SAMPLE_RATE", "0.01")),
+        "respect_parent": os.environ.get("TRACING_RESPECT_PARENT", "true").lower() == "true",
+        "exporter": os.environ.get("TRACING_EXPORTER", "jsonl").lower(),
+        "file": os.environ.get("TRACING_FILE") or os.path.join(tempfile.gettempdir(), "inventory-traces.jsonl"),
+        "otlp_endpoint": os.environ.get("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"),
+        # Finished spans waiting for the exporter; further spans are dropped
+        "queue_size": int(os.environ.get("TRACING_QUEUE_SIZE", "10000")),
+        "batch_size": int(os.environ.get("TRACING_BATCH_SIZE", "512")),
+        "export_interval_ms": float(os.environ.get("TRACING_EXPORT_INTERVAL_MS", "1000")),
+    }
+
+
+class Sampler:
+    """
+    Parent-based ratio sampler: follows the caller's sampled flag when there is
+    one, otherwise keeps `rate` of traces, decided by the trace ID so every
+    service sampling at the same rate keeps the same traces.
+    """
+
+    def __init__(self, rate: float, respect_parent: bool = True):
+        self.rate = max(0.0, min(1.0, rate))
+        self.respect_parent = respect_parent
+        self._threshold = int(self.rate * (1 << 64))
+
+    def should_sample(self, trace_id: str, parent_sampled: Optional[bool] = None) -> bool:
+        if parent_sampled is not None and self.respect_parent:
+            return parent_sampled
+        return int(trace_id[16:], 16) < self._threshold
+
+
+class Span:
+    """One timed operation of a trace."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str] = None,
+        kind: int = KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        start_ns: Optional[int] = None,
+    ):
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns() if start_ns is None else start_ns
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self, end_ns: Optional[int] = None) -> None:
+        self.end_ns = time.time_ns() if end_ns is None else end_ns
+        if _exporter is not None:
+            _exporter.export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span when nothing is being traced."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, error: BaseException) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _SpanContext:
+    """Makes a child span current for the duration of a `with` block."""
+
+    __slots__ = ("span", "_token")
+
+    def __init__(self, span: Span):
+        self.span = span
+        self._token: Optional[Token] = None
+
+    def __enter__(self) -> Span:
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current.reset(self._token)
+        if exc is not None:
+            self.span.set_error(exc)
+        self.span.end()
+
+
+def enabled() -> bool:
+    """Whether tracing was configured on (spans may still be unsampled)."""
+    return _exporter is not None
+
+
+def current_span() -> Optional[Span]:
+    """The innermost span of the current sampled trace, if any."""
+    return _current.get()
+
+
+def span(name: str, kind: int = KIND_INTERNAL, **attributes):
+    """
+    Context manager timing `name` as a child of the current span.
+    Returns a no-op outside a sampled trace, so it is cheap to leave in hot paths.
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return _SpanContext(Span(name, parent.trace_id, parent.span_id, kind, attributes))
+
+
+def set_attribute(key: str, value: Any) -> None:
+    """Set an attribute on the current span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.attributes[key] = value
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes) -> None:
+    """Record an already finished operation as a child of the current span."""
+    parent = _current.get()
+    if parent is not None:
+        Span(name, parent.trace_id, parent.span_id, attributes=attributes, start_ns=start_ns).end(end_ns)
+
+
+def traced(name: str, **attributes) -> Callable:
+    """Decorator running an async function inside span(name)."""
+
+    def decorate(function: Callable) -> Callable:
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return await function(*args, **kwargs)
+            with span(name, **attributes):
+                return await function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace ID, parent span ID, sampled) from a W3C traceparent header, if valid."""
+    if not header:
+        return None
+    match = _TRACEPARENT_RE.match(header.strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+def start_trace(name: str, traceparent: Optional[str] = None, **attributes) -> Optional[Span]:
+    """
+    Start the root span of a request, continuing the caller's trace when a
+    traceparent header is given. Returns None when tracing is off or the trace
+    is not sampled; activate() the span to make it current.
+    """
+    if _exporter is None:
+        return None
+    parent = parse_traceparent(traceparent)
+    if parent is None:
+        trace_id, parent_id, parent_sampled = f"{random.getrandbits(128):032x}", None, None
+    else:
+        trace_id, parent_id, parent_sampled = parent
+    if not _sampler.should_sample(trace_id, parent_sampled):
+        return None
+    return Span(name, trace_id, parent_id, KIND_SERVER, attributes)
+
+
+def activate(root: Span) -> Token:
+    return _current.set(root)
+
+
+def deactivate(token: Token) -> None:
+    _current.reset(token)
+
+
+class _Exporter:
+    """Background thread writing finished spans in batches."""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._queue: queue.Queue = queue.Queue(maxsize=config["queue_size"])
+        self._dropped = metrics.counter("trace_spans_dropped_total", "Spans dropped because the export queue was full")
+        self._exported = metrics.counter("trace_spans_exported_total", "Spans handed to the trace sink")
+        self._failures = metrics.counter("trace_export_failures_total", "Span batches the trace sink rejected")
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self._dropped.inc()
+
+    def _run(self) -> None:
+        interval = self.config["export_interval_ms"] / 1000
+        while not self._stopping.is_set() or not self._queue.empty():
+            batch: List[Span] = []
+            try:
+                batch.append(self._queue.get(timeout=interval))
+                while len(batch) < self.config["batch_size"]:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: List[Span]) -> None:
+        try:
+            if self.config["exporter"] == "otlp":
+                self._post_otlp(batch)
+            else:
+                with open(self.config["file"], "a") as f:
+                    f.writelines(json.dumps(span.to_dict(), default=str) + "\n" for span in batch)
+            self._exported.inc(len(batch))
+        except Exception as e:
+            self._failures.inc()
+            logger.warning("Failed to export %d spans: %s", len(batch), e)
+
+    def _post_otlp(self, batch: List[Span]) -> None:
+        body = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": [_otlp_span(span) for span in batch]}],
+            }]
+        }).encode()
+        request = urllib.request.Request(
+            self.config["otlp_endpoint"], data=body, headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            response.read()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._thread.join(timeout=5)
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[dict]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def _otlp_span(span: Span) -> dict:
+    otlp = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+        # STATUS_CODE_ERROR = 2, STATUS_CODE_UNSET = 0
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+
+def configure_tracing(config: Optional[dict] = None) -> None:
+    """Start the exporter if tracing is enabled; safe to call more than once."""
+    global _exporter, _sampler
+
+    config = config or get_tracing_config()
+    if not config["enabled"] or _exporter is not None:
+        return
+    if config["exporter"] not in EXPORTERS:
+        raise ValueError(f"Unknown TRACING_EXPORTER: {config['exporter']} (use one of {', '.join(EXPORTERS)})")
+
+    _sampler = Sampler(config["sample_rate"], config["respect_parent"])
+    _exporter = _Exporter(config)
+    atexit.register(stop_tracing)
+    target = config["otlp_endpoint"] if config["exporter"] == "otlp" else config["file"]
+    logger.info("Tracing %.2f%% of requests to %s", config["sample_rate"] * 100, target)
+
+
+def stop_tracing() -> None:
+    """Export queued spans and stop the exporter thread."""
+    global _exporter
+    if _exporter is not None:
+        exporter, _exporter = _exporter, None
+        exporter.stop()
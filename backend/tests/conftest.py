@@ -0,0 +1,36 @@
+"""Shared fixtures for backend unit tests."""
+import pytest
+
+from src.db import cosmos
+from src.db.fake_cosmos import reset_fake_cosmos
+from src.loop_monitor import MonitoredLock
+from src.repositories import cosmos_repo as cosmos_repo_module
+from src.repositories import in_memory
+from src.repositories.history import HistoryLog
+from src.repositories.naming import NameIndex
+from src.repositories.sorting import SortedIndexes
+
+
+@pytest.fixture
+def memory_repo(monkeypatch):
+    """The in-memory repository with empty module-level state for one test."""
+    monkeypatch.setattr(in_memory, "_devices", {})
+    monkeypatch.setattr(in_memory, "_devices_lock", MonitoredLock("in_memory_lock"))
+    monkeypatch.setattr(in_memory, "_indexes", SortedIndexes())
+    monkeypatch.setattr(in_memory, "_names", NameIndex())
+    monkeypatch.setattr(in_memory, "_history", HistoryLog())
+    return in_memory
+
+
+@pytest.fixture
+def cosmos_repo(monkeypatch):
+    """The Cosmos DB repository on an empty fake client for one test."""
+    monkeypatch.setattr(cosmos, "TEST_MODE", False)
+    monkeypatch.setenv("COSMOS_ENDPOINT", "fake://test")
+    monkeypatch.setattr(cosmos, "_cosmos_client", None)
+    monkeypatch.setattr(cosmos, "_credential", None)
+    monkeypatch.setattr(cosmos_repo_module, "_read_batcher", None)
+    monkeypatch.setattr(cosmos_repo_module, "_write_buffer", None)
+    reset_fake_cosmos()
+    yield cosmos_repo_module
+    reset_fake_cosmos()
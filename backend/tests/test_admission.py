@@ -0,0 +1,90 @@
+"""Tests for admission control and load shedding."""
+import asyncio
+
+from src.middleware.admission import AdmissionControlMiddleware, AdmissionGate
+
+
+async def test_requests_over_the_limit_wait_for_a_slot_in_order():
+    gate = AdmissionGate("test", max_concurrency=1, max_queue=2, queue_timeout=1)
+    assert await gate.acquire()
+    admitted = []
+
+    async def wait(name):
+        assert await gate.acquire()
+        admitted.append(name)
+
+    waiters = [asyncio.create_task(wait("first")), asyncio.create_task(wait("second"))]
+    await asyncio.sleep(0)
+    assert admitted == []
+    gate.release()
+    await asyncio.sleep(0.01)
+    assert admitted == ["first"]
+    gate.release()
+    await asyncio.gather(*waiters)
+    assert admitted == ["first", "second"]
+
+
+async def test_requests_are_shed_when_the_queue_is_full():
+    gate = AdmissionGate("test", max_concurrency=1, max_queue=1, queue_timeout=1)
+    assert await gate.acquire()
+    queued = asyncio.create_task(gate.acquire())
+    await asyncio.sleep(0)
+    assert not await gate.acquire()
+    gate.release()
+    assert await queued
+
+
+async def test_requests_are_shed_after_the_queue_timeout():
+    gate = AdmissionGate("test", max_concurrency=1, max_queue=1, queue_timeout=0.01)
+    assert await gate.acquire()
+    assert not await gate.acquire()
+    # The shed request left the queue, so the next one is admitted at once
+    gate.release()
+    assert await gate.acquire()
+
+
+async def test_cancelled_waiter_does_not_keep_a_slot():
+    gate = AdmissionGate("test", max_concurrency=1, max_queue=1, queue_timeout=1)
+    assert await gate.acquire()
+    waiter = asyncio.create_task(gate.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    gate.release()
+    assert await asyncio.wait_for(gate.acquire(), timeout=0.1)
+
+
+async def call(app, method="GET", path="/devices"):
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"", "headers": []}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"])
+
+
+async def test_middleware_sheds_with_503_but_not_health_checks():
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    app = AdmissionControlMiddleware(slow_app, max_reads=1, max_writes=1, queue_size=0, queue_timeout_ms=1000)
+    running = asyncio.create_task(call(app))
+    await asyncio.sleep(0)
+    status, headers = await call(app)
+    assert status == 503
+    assert headers[b"retry-after"] == b"1"
+    # Writes have their own capacity, and health probes bypass admission
+    write = asyncio.create_task(call(app, method="POST"))
+    health = asyncio.create_task(call(app, path="/health"))
+    await asyncio.sleep(0)
+    release.set()
+    assert [await running, await write, await health] == [(200, {}), (200, {}), (200, {})]
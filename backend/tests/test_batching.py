@@ -0,0 +1,63 @@
+"""Tests for micro-batching of point reads."""
+import asyncio
+import time
+
+from src.repositories.batching import PointReadBatcher
+
+
+class Fetcher:
+    def __init__(self, latency_s: float = 0.01, fail: bool = False):
+        self.calls = []
+        self.latency_s = latency_s
+        self.fail = fail
+
+    async def __call__(self, keys):
+        self.calls.append(list(keys))
+        await asyncio.sleep(self.latency_s)
+        if self.fail:
+            raise RuntimeError("fetch failed")
+        return {key: {"id": key} for key in keys if key != "missing"}
+
+
+async def test_lone_load_is_sent_without_waiting_for_the_window():
+    fetch = Fetcher()
+    batcher = PointReadBatcher(fetch, window_ms=500)
+    started = time.perf_counter()
+    assert await batcher.load("a") == {"id": "a"}
+    assert time.perf_counter() - started < 0.1
+    assert fetch.calls == [["a"]]
+
+
+async def test_concurrent_loads_share_one_fetch():
+    fetch = Fetcher()
+    batcher = PointReadBatcher(fetch, window_ms=5)
+    results = await asyncio.gather(*(batcher.load(key) for key in ["a", "b", "a", "missing"]))
+    assert results == [{"id": "a"}, {"id": "b"}, {"id": "a"}, None]
+    assert fetch.calls == [["a", "b", "missing"]]
+
+
+async def test_loads_during_a_fetch_are_batched_into_the_next():
+    fetch = Fetcher(latency_s=0.02)
+    batcher = PointReadBatcher(fetch, window_ms=5)
+    first = asyncio.ensure_future(batcher.load("a"))
+    await asyncio.sleep(0)
+    await asyncio.gather(*(batcher.load(key) for key in "bcd"), first)
+    assert fetch.calls == [["a"], ["b", "c", "d"]]
+
+
+async def test_full_batch_is_dispatched_early():
+    fetch = Fetcher()
+    batcher = PointReadBatcher(fetch, window_ms=1000, max_batch_size=2)
+    await asyncio.gather(*(batcher.load(key) for key in "abcd"))
+    assert sorted(map(sorted, fetch.calls)) == [["a", "b"], ["c", "d"]]
+
+
+async def test_fetch_failure_reaches_every_caller():
+    batcher = PointReadBatcher(Fetcher(fail=True), window_ms=5)
+    results = await asyncio.gather(batcher.load("a"), batcher.load("b"), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_load_many_keeps_request_order():
+    batcher = PointReadBatcher(Fetcher(), window_ms=5)
+    assert await batcher.load_many(["b", "a", "missing"]) == {"b": {"id": "b"}, "a": {"id": "a"}, "missing": None}
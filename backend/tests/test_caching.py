@@ -0,0 +1,71 @@
+"""Tests for the frequency sketch and the W-TinyLFU cache."""
+import time
+
+from src.repositories.caching import FrequencySketch, TinyLfuCache
+
+
+def test_sketch_rows_spread_distinct_keys():
+    sketch = FrequencySketch(1024)
+    keys = [f"device-{i}" for i in range(200)]
+    for row in range(4):
+        slots = {list(sketch._indexes(key))[row] for key in keys}
+        assert len(slots) > 150
+
+
+def test_sketch_counts_keys_separately():
+    sketch = FrequencySketch(1024)
+    for _ in range(5):
+        sketch.increment("hot")
+    sketch.increment("cold")
+    assert sketch.frequency("hot") == 5
+    assert sketch.frequency("cold") == 1
+    assert sketch.frequency("unseen") == 0
+
+
+def test_sketch_counts_age():
+    sketch = FrequencySketch(16)
+    for _ in range(8):
+        sketch.increment("hot")
+    sketch._age()
+    assert sketch.frequency("hot") == 4
+
+
+def test_frequent_keys_survive_a_scan():
+    cache = TinyLfuCache(100, window_percent=10)
+    for i in range(100):
+        cache.put(f"hot-{i}", i)
+    for _ in range(3):
+        for i in range(100):
+            assert cache.get(f"hot-{i}") == i
+    # One-off keys are read once and offered to the cache
+    for i in range(300):
+        cache.get(f"scan-{i}")
+        cache.put(f"scan-{i}", i)
+    assert len(cache) == 100
+    # An LRU would keep none; sketch collisions let a few scan keys in
+    assert sum(f"hot-{i}" in cache for i in range(100)) >= 60
+
+
+def test_entries_expire_after_the_ttl():
+    cache = TinyLfuCache(10, ttl_s=0.01)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert "a" not in cache
+
+
+def test_peek_and_invalidate():
+    cache = TinyLfuCache(10)
+    cache.put("a", 1)
+    cache.put("a", 2)
+    assert cache.peek("a") == 2
+    cache.invalidate("a")
+    assert cache.peek("a") is None
+    assert len(cache) == 0
+
+
+def test_preload_fills_only_free_space():
+    cache = TinyLfuCache(10, window_percent=10)
+    assert cache.preload((f"k{i}", i) for i in range(20)) == 9
+    assert cache.get("k0") == 0
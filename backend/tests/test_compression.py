@@ -0,0 +1,95 @@
+"""Tests for content-negotiated response compression."""
+import gzip
+import json
+
+import pytest
+
+from src.middleware.compression import (
+    CompressionMiddleware,
+    get_compression_config,
+    negotiate,
+    parse_accept_encoding,
+)
+
+BODY = json.dumps([{"id": i, "name": f"Laptop-{i:03d}"} for i in range(200)]).encode()
+
+
+def test_accept_encoding_q_values_are_parsed():
+    assert parse_accept_encoding("gzip;q=0.5, br, zstd;q=0") == {"gzip": 0.5, "br": 1.0, "zstd": 0.0}
+    assert parse_accept_encoding("gzip;q=bad") == {"gzip": 0.0}
+
+
+def test_server_preference_wins_among_accepted_encodings():
+    preferred = ["zstd", "br", "gzip"]
+    assert negotiate("gzip, br", preferred) == "br"
+    assert negotiate("zstd;q=0, gzip", preferred) == "gzip"
+    assert negotiate("*", preferred) == "zstd"
+    assert negotiate("*;q=0, gzip", preferred) == "gzip"
+    assert negotiate("identity", preferred) is None
+    assert negotiate("", preferred) is None
+
+
+def json_app(chunks, content_type=b"application/json"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+
+    return app
+
+
+async def get(app, accept_encoding="gzip"):
+    scope = {"type": "http", "method": "GET", "path": "/devices", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return dict(sent[0]["headers"]), b"".join(message.get("body", b"") for message in sent[1:])
+
+
+def middleware(chunks, **kwargs):
+    return CompressionMiddleware(json_app(chunks, **kwargs), dict(get_compression_config(), encodings=["gzip"]))
+
+
+async def test_large_json_is_compressed_with_an_exact_length():
+    headers, body = await get(middleware([BODY]))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert int(headers[b"content-length"]) == len(body) < len(BODY)
+    assert gzip.decompress(body) == BODY
+
+
+async def test_streamed_json_is_compressed_chunk_by_chunk():
+    chunks = [BODY[i:i + 500] for i in range(0, len(BODY), 500)]
+    headers, body = await get(middleware(chunks))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+    assert gzip.decompress(body) == BODY
+
+
+async def test_small_or_unaccepted_responses_are_sent_as_is_with_vary():
+    headers, body = await get(middleware([b'{"id": 1}']))
+    assert (b"content-encoding" in headers, headers[b"vary"], body) == (False, b"Accept-Encoding", b'{"id": 1}')
+    headers, body = await get(middleware([BODY]), accept_encoding="identity")
+    assert (b"content-encoding" in headers, headers[b"vary"], body) == (False, b"Accept-Encoding", BODY)
+
+
+async def test_other_content_types_are_not_compressed():
+    headers, body = await get(middleware([BODY], content_type=b"image/png"))
+    assert b"content-encoding" not in headers and b"vary" not in headers
+    assert body == BODY
+
+
+async def test_optional_encodings_round_trip():
+    for module, encoding in (("brotli", "br"), ("zstandard", "zstd")):
+        codec = pytest.importorskip(module)
+        app = CompressionMiddleware(json_app([BODY[:3000], BODY[3000:]]), dict(get_compression_config(), encodings=[encoding]))
+        headers, body = await get(app, accept_encoding=encoding)
+        assert headers[b"content-encoding"] == encoding.encode()
+        decoded = codec.decompress(body) if module == "brotli" else codec.ZstdDecompressor().decompressobj().decompress(body)
+        assert decoded == BODY
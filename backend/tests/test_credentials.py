@@ -0,0 +1,118 @@
+"""Tests for the cached, background-refreshed Cosmos DB token credential."""
+import asyncio
+
+from src.db.credentials import CachedTokenCredential, FakeCredential, cosmos_scope
+
+SCOPE = "https://account.documents.azure.com/.default"
+
+
+class FakeClock:
+    """Wall clock that only moves when advanced; sleepers wake once their time has come."""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+        self._sleepers = []
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._sleepers.append((self.now + delay, future))
+        await future
+
+    async def advance(self, seconds: float) -> None:
+        await self.settle()
+        self.now += seconds
+        for sleeper in list(self._sleepers):
+            wake_at, future = sleeper
+            if wake_at <= self.now:
+                self._sleepers.remove(sleeper)
+                if not future.done():
+                    future.set_result(None)
+        await self.settle()
+
+    async def settle(self) -> None:
+        """Let runnable tasks proceed to their next wait."""
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+
+def make_credential(fake, clock, **kwargs) -> CachedTokenCredential:
+    return CachedTokenCredential(fake, clock=clock.time, sleep=clock.sleep, **kwargs)
+
+
+def test_cosmos_scope_from_endpoint():
+    assert cosmos_scope("https://account.documents.azure.com:443/") == SCOPE
+    assert cosmos_scope("https://account.documents.azure.com:443/", "api://custom/.default") == "api://custom/.default"
+
+
+async def test_concurrent_first_calls_acquire_once():
+    clock = FakeClock()
+    fake = FakeCredential(acquire_latency_ms=10, clock=clock.time)
+    async with make_credential(fake, clock) as credential:
+        tokens = await asyncio.gather(*(credential.get_token(SCOPE) for _ in range(10)))
+        assert fake.calls == 1
+        assert {token.token for token in tokens} == {"fake-token-1"}
+
+
+async def test_cached_token_is_served_without_the_credential():
+    clock = FakeClock()
+    fake = FakeCredential(clock=clock.time)
+    async with make_credential(fake, clock) as credential:
+        await credential.warm_up(SCOPE)
+        await clock.advance(60)
+        assert (await credential.get_token(SCOPE)).token == "fake-token-1"
+        assert fake.calls == 1
+
+
+async def test_token_is_refreshed_in_the_background_before_expiry():
+    clock = FakeClock()
+    fake = FakeCredential(token_lifetime_s=3600, clock=clock.time)
+    async with make_credential(fake, clock, refresh_margin_s=600) as credential:
+        await credential.warm_up(SCOPE)
+        await clock.advance(2999)
+        assert fake.calls == 1
+        await clock.advance(2)
+        assert fake.calls == 2
+        assert (await credential.get_token(SCOPE)).token == "fake-token-2"
+        assert fake.calls == 2
+
+
+async def test_short_lived_token_is_refreshed_at_half_life():
+    clock = FakeClock()
+    fake = FakeCredential(token_lifetime_s=300, clock=clock.time)
+    async with make_credential(fake, clock, refresh_margin_s=600, min_validity_s=1) as credential:
+        await credential.warm_up(SCOPE)
+        await clock.advance(149)
+        assert fake.calls == 1
+        await clock.advance(2)
+        assert fake.calls == 2
+
+
+async def test_failed_refresh_keeps_serving_the_valid_token():
+    class FlakyCredential(FakeCredential):
+        async def get_token(self, *scopes, **kwargs):
+            if self.calls >= 1:
+                self.calls += 1
+                raise RuntimeError("identity endpoint unavailable")
+            return await super().get_token(*scopes, **kwargs)
+
+    clock = FakeClock()
+    fake = FlakyCredential(token_lifetime_s=3600, clock=clock.time)
+    async with make_credential(fake, clock, refresh_margin_s=600, retry_interval_s=10) as credential:
+        await credential.warm_up(SCOPE)
+        await clock.advance(3001)
+        assert fake.calls == 2
+        await clock.advance(10)
+        assert fake.calls == 3
+        assert (await credential.get_token(SCOPE)).token == "fake-token-1"
+
+
+async def test_claims_challenges_bypass_the_cache():
+    clock = FakeClock()
+    fake = FakeCredential(clock=clock.time)
+    async with make_credential(fake, clock) as credential:
+        await credential.get_token(SCOPE)
+        await credential.get_token(SCOPE, claims='{"access_token": {}}')
+        assert fake.calls == 2
@@ -0,0 +1,65 @@
+"""Tests for the fake Cosmos DB client's request unit (RU) and latency model."""
+import asyncio
+
+import pytest
+
+from src.db.fake_cosmos import (
+    POINT_READ_RU,
+    QUERY_BASE_RU,
+    QUERY_PER_RESULT_RU,
+    QUERY_PER_SCANNED_RU,
+    FakeContainerProxy,
+    FakeCosmosBehavior,
+)
+
+
+async def collect(container, query, parameters=None, partition_key=None):
+    return [doc async for doc in container.query_items(query, parameters, partition_key=partition_key)]
+
+
+@pytest.fixture
+async def container():
+    container = FakeContainerProxy("devices", "/site", FakeCosmosBehavior(physical_partitions=4))
+    for i in range(40):
+        await container.create_item(body={"id": f"d{i:02d}", "site": f"site-{i % 8}"})
+    container.behavior.total_ru = 0.0
+    return container
+
+
+async def test_point_read_costs_one_ru(container):
+    await container.read_item("d00", partition_key="site-0")
+    assert container.behavior.total_ru == POINT_READ_RU
+    assert container.last_response_headers == {"x-ms-request-charge": "1.00"}
+
+
+async def test_cross_partition_query_is_charged_per_partition(container):
+    query = "SELECT * FROM c WHERE c.site = @site"
+    parameters = [{"name": "@site", "value": "site-3"}]
+    single = await collect(container, query, parameters, partition_key="site-3")
+    single_ru = container.behavior.total_ru
+    fanned_out = await collect(container, query, parameters)
+
+    assert single == fanned_out
+    rows = QUERY_PER_SCANNED_RU * 5 + QUERY_PER_RESULT_RU * 5
+    assert single_ru == pytest.approx(QUERY_BASE_RU + rows)
+    assert container.behavior.total_ru - single_ru == pytest.approx(4 * QUERY_BASE_RU + rows)
+
+
+async def test_each_partition_reads_up_to_the_end_of_the_page(container):
+    page = await collect(container, "SELECT * FROM c ORDER BY c.id OFFSET 0 LIMIT 2")
+    assert [doc["id"] for doc in page] == ["d00", "d01"]
+    # Every partition holds at least two devices, so each reads two index entries
+    assert container.behavior.total_ru == pytest.approx(
+        4 * QUERY_BASE_RU + QUERY_PER_SCANNED_RU * 8 + QUERY_PER_RESULT_RU * 2
+    )
+
+
+async def test_reads_see_items_written_during_their_latency():
+    container = FakeContainerProxy("devices", behavior=FakeCosmosBehavior(latency_ms=10))
+    query = asyncio.create_task(collect(container, "SELECT * FROM c"))
+    read = asyncio.create_task(container.read_item("a", partition_key="a"))
+    await asyncio.sleep(0)
+    # Stored without a round trip of its own, while both calls are in flight
+    container._store(("a", "a"), {"id": "a"})
+    assert [doc["id"] for doc in await query] == ["a"]
+    assert (await read)["id"] == "a"
@@ -0,0 +1,140 @@
+"""Tests for Idempotency-Key replay and idempotent device creation."""
+import asyncio
+import json
+
+import pytest
+from azure.cosmos.exceptions import CosmosResourceExistsError
+
+from src.middleware.idempotency import IdempotencyMiddleware, device_id_for_key, get_idempotency_config
+from src.schemas import DeviceCreate
+
+
+class CountingApp:
+    """ASGI app answering 201 with a running count of the requests it served."""
+
+    def __init__(self, status: int = 201):
+        self.calls = 0
+        self.status = status
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        while (await receive()).get("more_body", False):
+            pass
+        await asyncio.sleep(0.01)
+        body = json.dumps({"call": self.calls}).encode()
+        await send({"type": "http.response.start", "status": self.status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+async def request(app, key=None, body=b"{}", method="POST", accept_encoding=None):
+    headers = [(b"idempotency-key", key.encode())] if key is not None else []
+    if accept_encoding is not None:
+        headers.append((b"accept-encoding", accept_encoding.encode()))
+    scope = {"type": "http", "method": method, "path": "/devices", "query_string": b"", "headers": headers}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+async def test_repeated_key_replays_the_first_response():
+    inner = CountingApp()
+    app = IdempotencyMiddleware(inner, get_idempotency_config())
+    first = await request(app, "k1")
+    second = await request(app, "k1")
+    assert inner.calls == 1
+    assert second[0] == first[0] == 201
+    assert second[2] == first[2]
+    assert second[1][b"idempotent-replayed"] == b"true"
+    assert b"idempotent-replayed" not in first[1]
+
+
+async def test_repeat_with_another_accept_encoding_runs_again():
+    # Stored responses are already encoded for the first request
+    inner = CountingApp()
+    app = IdempotencyMiddleware(inner, get_idempotency_config())
+    await request(app, "k1", accept_encoding="gzip")
+    replayed = await request(app, "k1", accept_encoding="gzip")
+    plain = await request(app, "k1")
+    assert inner.calls == 2
+    assert replayed[1][b"idempotent-replayed"] == b"true"
+    assert b"idempotent-replayed" not in plain[1]
+
+
+async def test_concurrent_repeats_wait_for_the_first():
+    inner = CountingApp()
+    app = IdempotencyMiddleware(inner, get_idempotency_config())
+    results = await asyncio.gather(*(request(app, "k1") for _ in range(3)))
+    assert inner.calls == 1
+    assert len({body for _, _, body in results}) == 1
+
+
+async def test_key_reused_with_another_body_is_rejected():
+    app = IdempotencyMiddleware(CountingApp(), get_idempotency_config())
+    await request(app, "k1", body=b'{"name": "a"}')
+    status, _, _ = await request(app, "k1", body=b'{"name": "b"}')
+    assert status == 422
+
+
+async def test_server_errors_are_not_replayed():
+    inner = CountingApp(status=503)
+    app = IdempotencyMiddleware(inner, get_idempotency_config())
+    await request(app, "k1")
+    await request(app, "k1")
+    assert inner.calls == 2
+
+
+async def test_requests_without_a_key_always_run():
+    inner = CountingApp()
+    app = IdempotencyMiddleware(inner, get_idempotency_config())
+    await request(app)
+    await request(app)
+    assert inner.calls == 2
+
+
+def test_device_id_is_derived_from_the_key():
+    assert device_id_for_key("k1") == device_id_for_key("k1")
+    assert device_id_for_key("k1") != device_id_for_key("k2")
+
+
+async def test_create_with_an_existing_id_returns_the_device(memory_repo):
+    device_id = device_id_for_key("k1")
+    first = await memory_repo.create_device(DeviceCreate(name="Laptop-001"), device_id=device_id)
+    # e.g. a retry handled by another worker, whose response cache is empty
+    again = await memory_repo.create_device(DeviceCreate(name="Laptop-001"), device_id=device_id)
+    assert first.id == again.id == device_id
+    assert again.created_at == first.created_at
+    assert len(await memory_repo.list_devices()) == 1
+
+
+async def test_concurrent_cosmos_creates_with_one_id_return_the_same_device(cosmos_repo):
+    device_id = device_id_for_key("k1")
+    first, again = await asyncio.gather(
+        cosmos_repo.create_device(DeviceCreate(name="Laptop-001"), device_id=device_id),
+        cosmos_repo.create_device(DeviceCreate(name="Laptop-001"), device_id=device_id),
+    )
+    assert first.id == again.id == device_id
+    assert again.created_at == first.created_at
+    assert len(await cosmos_repo.list_devices()) == 1
+
+
+async def test_cosmos_create_conflict_without_a_requested_id_is_raised(cosmos_repo, monkeypatch):
+    container = await cosmos_repo.get_devices_container()
+
+    async def conflict(body, **kwargs):
+        raise CosmosResourceExistsError(status_code=409, message="Conflict")
+
+    reads = []
+    monkeypatch.setattr(container, "create_item", conflict)
+    monkeypatch.setattr(cosmos_repo, "_read_one", lambda *args: reads.append(args))
+    with pytest.raises(CosmosResourceExistsError):
+        await cosmos_repo.create_device(DeviceCreate(name="Laptop-001"))
+    # A generated ID cannot belong to an earlier attempt, so nothing is re-read
+    assert reads == []
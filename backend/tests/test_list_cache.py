@@ -0,0 +1,76 @@
+"""Tests for the GET /devices response cache."""
+import asyncio
+
+import pytest
+
+import src.repositories as device_repo
+from src.middleware.list_cache import ListCacheMiddleware, get_list_cache_config
+
+
+class ListingApp:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"call": %d}' % self.calls})
+
+
+async def get(app, path="/devices", query=b"limit=20"):
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": query, "headers": []}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[1]["body"]
+
+
+@pytest.fixture
+def version(monkeypatch):
+    current = [0]
+    monkeypatch.setattr(device_repo, "write_version", lambda: current[0])
+    return current
+
+
+@pytest.mark.parametrize(
+    "backend, enabled",
+    [("memory", True), ("shared_memory", True), ("cosmos", False), ("tiered", False)],
+)
+def test_enabled_by_default_only_with_a_shared_write_version(monkeypatch, backend, enabled):
+    monkeypatch.delenv("LIST_CACHE_ENABLED", raising=False)
+    monkeypatch.setattr(device_repo, "get_backend_name", lambda: backend)
+    assert get_list_cache_config()["enabled"] is enabled
+    monkeypatch.setenv("LIST_CACHE_ENABLED", "true")
+    assert get_list_cache_config()["enabled"] is True
+
+
+async def test_repeated_listing_is_replayed_until_a_write(version):
+    inner = ListingApp()
+    app = ListCacheMiddleware(inner, dict(get_list_cache_config(), ttl_s=0))
+    assert await get(app) == await get(app) == b'{"call": 1}'
+    assert await get(app, query=b"limit=50") == b'{"call": 2}'
+    version[0] += 1
+    assert await get(app) == b'{"call": 3}'
+    assert inner.calls == 3
+
+
+async def test_cached_listing_expires_after_the_ttl(version):
+    inner = ListingApp()
+    app = ListCacheMiddleware(inner, dict(get_list_cache_config(), ttl_s=0.01))
+    await get(app)
+    await asyncio.sleep(0.02)
+    assert await get(app) == b'{"call": 2}'
+
+
+async def test_other_paths_are_not_cached(version):
+    inner = ListingApp()
+    app = ListCacheMiddleware(inner, get_list_cache_config())
+    await get(app, path="/devices/abc")
+    await get(app, path="/devices/abc")
+    assert inner.calls == 2
@@ -0,0 +1,48 @@
+"""Tests for looking up several devices by ID (GET /devices?ids=...)."""
+import json
+
+import pytest
+from fastapi import HTTPException
+
+import src.repositories as device_repo
+from src.main import MAX_LOOKUP_IDS, _lookup_devices
+from src.schemas import DeviceCreate
+
+
+async def create(repo, *names):
+    return [(await repo.create_device(DeviceCreate(name=name))).id for name in names]
+
+
+async def test_devices_come_back_in_request_order_without_missing_ids(memory_repo):
+    a, b = await create(memory_repo, "Laptop-001", "Laptop-002")
+    devices = await memory_repo.get_devices([b, "missing", a])
+    assert [device.id for device in devices] == [b, a]
+
+
+async def test_cosmos_lookup_reads_in_chunks(cosmos_repo, monkeypatch):
+    monkeypatch.setenv("COSMOS_MULTI_GET_CHUNK_SIZE", "2")
+    ids = await create(cosmos_repo, *(f"Laptop-{i:03d}" for i in range(5)))
+    container = await cosmos_repo.get_devices_container()
+    calls = container.behavior._requests.value
+
+    devices = await cosmos_repo.get_devices([ids[4], "missing", *ids[:3]])
+    assert [device.id for device in devices] == [ids[4], *ids[:3]]
+    # Three chunks of at most two IDs, one query each
+    assert container.behavior._requests.value - calls == 3
+
+
+async def test_lookup_reports_missing_ids_once(memory_repo, monkeypatch):
+    monkeypatch.setattr(device_repo, "get_devices", memory_repo.get_devices, raising=False)
+    [a] = await create(memory_repo, "Laptop-001")
+    lookup = await _lookup_devices(f"{a}, missing,{a},,missing")
+    assert [device.id for device in lookup.devices] == [a]
+    assert lookup.missing == ["missing"]
+
+    projected = json.loads((await _lookup_devices(f"missing,{a}", ["id", "name"])).body)
+    assert projected == {"devices": [{"id": a, "name": "Laptop-001"}], "missing": ["missing"]}
+
+
+async def test_lookup_rejects_too_many_ids():
+    with pytest.raises(HTTPException) as raised:
+        await _lookup_devices(",".join(str(i) for i in range(MAX_LOOKUP_IDS + 1)))
+    assert raised.value.status_code == 400
@@ -0,0 +1,55 @@
+"""Tests for event-loop lag monitoring and lock instrumentation."""
+import asyncio
+import logging
+import time
+
+from src import metrics
+from src.loop_monitor import LoopMonitor, MonitoredLock, get_loop_monitor_config
+
+
+def block_the_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+async def test_blocked_loop_is_counted_and_its_stack_logged(caplog):
+    monitor = LoopMonitor(dict(get_loop_monitor_config(), interval_ms=10, block_threshold_ms=50))
+    blocked = metrics.counter("event_loop_blocked_total").value
+    monitor.start()
+    try:
+        await asyncio.sleep(0.03)
+        with caplog.at_level(logging.WARNING, logger="src.loop_monitor"):
+            block_the_loop(0.2)
+            await asyncio.sleep(0.03)
+    finally:
+        await monitor.stop()
+
+    assert metrics.counter("event_loop_blocked_total").value == blocked + 1
+    [record] = [record for record in caplog.records if "Event loop blocked" in record.getMessage()]
+    # Logged by the watchdog while the sleep was still on the loop thread's stack
+    assert "block_the_loop" in record.getMessage()
+
+
+async def test_idle_loop_is_not_reported(caplog):
+    monitor = LoopMonitor(dict(get_loop_monitor_config(), interval_ms=5, block_threshold_ms=200))
+    with caplog.at_level(logging.WARNING, logger="src.loop_monitor"):
+        monitor.start()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+    assert metrics.histogram("event_loop_lag_ms").snapshot()["count"] > 0
+    assert not [record for record in caplog.records if "Event loop blocked" in record.getMessage()]
+
+
+async def test_monitored_lock_counts_contention():
+    lock = MonitoredLock("test_lock")
+    contended = metrics.counter("test_lock_contended_total").value
+    waits = metrics.histogram("test_lock_wait_ms").snapshot()["count"]
+
+    async def hold():
+        async with lock:
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(hold(), hold())
+    assert not lock.locked()
+    assert metrics.counter("test_lock_contended_total").value == contended + 1
+    assert metrics.histogram("test_lock_wait_ms").snapshot()["count"] == waits + 2
+    assert metrics.histogram("test_lock_hold_ms").snapshot()["max"] >= 10
@@ -0,0 +1,51 @@
+"""Tests for lookups by name and optional per-site name uniqueness."""
+import pytest
+
+from src.repositories.naming import DuplicateDeviceNameError, NameIndex
+from src.schemas import DeviceCreate, DeviceUpdate
+
+
+def test_name_index_follows_renames_and_deletes():
+    devices = {
+        "1": {"id": "1", "name": "Laptop", "site": "s1", "created_at": "2025-01-02"},
+        "2": {"id": "2", "name": "Laptop", "site": "s2", "created_at": "2025-01-01"},
+    }
+    names = NameIndex()
+    names.extend(devices.values())
+    assert [doc["id"] for doc in names.lookup("Laptop", devices)] == ["2", "1"]
+    assert [doc["id"] for doc in names.lookup("Laptop", devices, site="s1")] == ["1"]
+
+    renamed = dict(devices["1"], name="Monitor")
+    names.replace(devices["1"], renamed)
+    devices["1"] = renamed
+    assert names.ids("Laptop") == {"2"}
+    names.remove(devices["2"])
+    assert names.ids("Laptop") == set()
+    assert names.ids("Monitor") == {"1"}
+
+
+async def test_duplicates_allowed_by_default(memory_repo, monkeypatch):
+    monkeypatch.delenv("UNIQUE_DEVICE_NAMES", raising=False)
+
+    await memory_repo.create_device(DeviceCreate(name="Laptop"))
+    await memory_repo.create_device(DeviceCreate(name="Laptop"))
+    assert len(await memory_repo.get_devices_by_name("Laptop")) == 2
+
+
+async def test_unique_names_are_enforced_per_site(memory_repo, monkeypatch):
+    monkeypatch.setenv("UNIQUE_DEVICE_NAMES", "true")
+
+    first = await memory_repo.create_device(DeviceCreate(name="Laptop", site="s1"))
+    await memory_repo.create_device(DeviceCreate(name="Laptop", site="s2"))
+    with pytest.raises(DuplicateDeviceNameError):
+        await memory_repo.create_device(DeviceCreate(name="Laptop", site="s1"))
+
+    other = await memory_repo.create_device(DeviceCreate(name="Monitor", site="s1"))
+    with pytest.raises(DuplicateDeviceNameError):
+        await memory_repo.update_device(other.id, DeviceUpdate(name="Laptop"))
+    # Keeping its own name is not a conflict
+    assert (await memory_repo.update_device(first.id, DeviceUpdate(name="Laptop"))).name == "Laptop"
+
+    # A deleted device's name is free again
+    await memory_repo.delete_device(first.id)
+    await memory_repo.create_device(DeviceCreate(name="Laptop", site="s1"))
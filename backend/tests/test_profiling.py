@@ -0,0 +1,70 @@
+"""Tests for on-demand request profiling."""
+import json
+
+from src.middleware.profiling import ProfilingMiddleware, _category, get_profiling_config
+
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 201, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": json.dumps(sorted(range(1000), reverse=True)).encode()})
+
+
+def middleware(tmp_path, **config):
+    config = {"enabled": True, "token": "secret", "output_dir": str(tmp_path), **config}
+    return ProfilingMiddleware(app, dict(get_profiling_config(), **config))
+
+
+async def call(middleware, *headers):
+    scope = {"type": "http", "method": "POST", "path": "/devices", "headers": list(headers)}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"]), sent[1]["body"]
+
+
+async def test_request_with_the_token_is_profiled_to_files(tmp_path):
+    status, headers, body = await call(middleware(tmp_path), (b"x-profile", b"secret"))
+    assert status == 201 and body.startswith(b"[999")
+    profile_id = headers[b"x-profile-id"].decode()
+    assert "-POST-devices-" in profile_id
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"{profile_id}.prof", f"{profile_id}.txt"]
+    assert (tmp_path / f"{profile_id}.txt").read_text().startswith("POST /devices: ")
+
+
+async def test_requests_without_the_token_are_not_profiled(tmp_path):
+    status, headers, _ = await call(middleware(tmp_path), (b"x-profile", b"guess"))
+    assert status == 201 and b"x-profile-id" not in headers
+    assert list(tmp_path.iterdir()) == []
+
+
+async def test_inline_report_replaces_the_response(tmp_path):
+    status, headers, body = await call(
+        middleware(tmp_path, top_n=5), (b"x-profile", b"secret"), (b"x-profile-response", b"inline")
+    )
+    report = json.loads(body)
+    assert status == 200
+    assert report["status"] == 201
+    assert report["request"] == "POST /devices"
+    assert report["profile_id"] == headers[b"x-profile-id"].decode()
+    assert len(report["top"]) == 5
+    assert set(report["breakdown_ms"]) >= {"repository", "serialization", "middleware", "handler", "other"}
+
+
+async def test_sampled_requests_are_profiled_without_a_token(tmp_path):
+    _, headers, _ = await call(middleware(tmp_path, token="", sample_rate=1.0))
+    assert b"x-profile-id" in headers
+
+
+def test_functions_are_booked_by_location():
+    assert _category("/app/src/repositories/in_memory.py", "get_device") == "repository"
+    assert _category("/venv/pydantic/main.py", "model_dump") == "serialization"
+    assert _category("/app/src/middleware/admission.py", "__call__") == "middleware"
+    assert _category("/app/src/main.py", "list_devices") == "handler"
+    assert _category("/usr/lib/python3.11/asyncio/events.py", "_run") == "event_loop"
+    assert _category("/app/other.py", "f") == "other"
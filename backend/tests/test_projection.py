@@ -0,0 +1,34 @@
+"""Tests for field projection (`fields=` on the API)."""
+import pytest
+
+from src.repositories.projection import parse_fields, project, select_clause
+from src.schemas import DeviceCreate
+
+
+def test_fields_keep_the_schema_order_and_always_include_the_id():
+    assert parse_fields("site, name,site") == ["name", "site", "id"]
+    assert parse_fields(None) is None
+    with pytest.raises(ValueError, match="secret"):
+        parse_fields("name,secret")
+
+
+def test_select_clause_reads_only_the_projected_fields():
+    assert select_clause(None) == "*"
+    assert select_clause(["id", "name"]) == "c.id, c.name"
+
+
+def test_projection_renders_like_the_full_response():
+    doc = {"id": "a", "name": "Laptop-001", "created_at": "2024-05-01T12:00:00+00:00"}
+    # Older documents have no site
+    assert project(doc, ["id", "site", "created_at"]) == {"id": "a", "site": "default", "created_at": "2024-05-01T12:00:00Z"}
+
+
+async def test_backends_return_the_same_projection(memory_repo, cosmos_repo):
+    fields = ["id", "name", "created_at"]
+    for repo in (memory_repo, cosmos_repo):
+        created = await repo.create_device(DeviceCreate(name="Laptop-001", assigned_to="Jane"))
+        expected = {"id": created.id, "name": "Laptop-001", "created_at": created.model_dump(mode="json")["created_at"]}
+        assert await repo.get_device(created.id, fields=fields) == expected
+        assert await repo.list_devices(fields=fields) == [expected]
+        assert await repo.get_devices([created.id], fields=fields) == [expected]
+        assert await repo.get_devices_by_name("Laptop-001", fields=fields) == [expected]
@@ -0,0 +1,36 @@
+"""Tests for copying devices into a re-partitioned container."""
+from src.db.cosmos import get_database
+from src.repartition import copy_devices
+from src.repositories.cosmos_repo import run_query
+
+
+async def containers(cosmos_repo, monkeypatch, count=5):
+    monkeypatch.setenv("COSMOS_PARTITION_KEY", "site")
+    source = (await get_database()).get_container_client("devices-by-id")
+    for i in range(count):
+        at = f"2024-01-0{i + 1}T00:00:00+00:00"
+        doc = {"id": f"d{i}", "name": f"Laptop-{i:03d}", "assigned_to": None, "created_at": at, "updated_at": at}
+        if i % 2:
+            doc["site"] = "lab"
+        await source.create_item(body=doc)
+    return source, await cosmos_repo.get_devices_container()
+
+
+async def test_copy_moves_every_device_into_its_site_partition(cosmos_repo, monkeypatch):
+    source, target = await containers(cosmos_repo, monkeypatch)
+    assert await copy_devices(source, target, default_site="hq", page_size=2) == 5
+
+    copied = await run_query(target, "SELECT * FROM c ORDER BY c.id", [])
+    assert [(doc["id"], doc["site"]) for doc in copied] == [("d0", "hq"), ("d1", "lab"), ("d2", "hq"), ("d3", "lab"), ("d4", "hq")]
+    assert [doc["id"] for doc in await run_query(target, "SELECT * FROM c", [], partition_key="lab")] == ["d1", "d3"]
+    assert (await cosmos_repo.get_device("d1", site="lab")).name == "Laptop-001"
+
+
+async def test_copy_can_resume_and_be_repeated(cosmos_repo, monkeypatch):
+    source, target = await containers(cosmos_repo, monkeypatch)
+    assert await copy_devices(source, target, page_size=2, after="d2") == 2
+    assert [doc["id"] for doc in await run_query(target, "SELECT c.id FROM c ORDER BY c.id", [])] == ["d3", "d4"]
+
+    # Upserts: copying again leaves one document per device
+    assert await copy_devices(source, target, page_size=2) == 5
+    assert len(await run_query(target, "SELECT c.id FROM c", [])) == 5
@@ -0,0 +1,43 @@
+"""Tests for the synthetic inventory generator."""
+from collections import Counter
+
+import pytest
+
+import src.repositories as device_repo
+from src.seeding import generate_devices, seed_devices
+
+
+def test_same_random_seed_gives_the_same_devices():
+    first = list(generate_devices(100, random_seed=7, now=1_700_000_000))
+    assert first == list(generate_devices(100, random_seed=7, now=1_700_000_000))
+    assert first != list(generate_devices(100, random_seed=8, now=1_700_000_000))
+    assert len({device["id"] for device in first}) == 100
+
+
+def test_generated_devices_follow_the_options():
+    devices = list(generate_devices(2000, assignees=50, unassigned_ratio=0.2, sites=5, days=10, random_seed=1))
+    assert {device["site"] for device in devices} == {f"site-{i:03d}" for i in range(5)}
+    assert all(device["updated_at"] >= device["created_at"] for device in devices)
+
+    assignees = Counter(device["assigned_to"] for device in devices)
+    assert 300 < assignees.pop(None) < 500
+    # Zipf: the first-ranked assignee holds far more devices than the last
+    assert assignees["Engineering Team"] > 10 * assignees["User 00043"]
+
+
+def test_unknown_timestamp_distribution_is_rejected():
+    with pytest.raises(ValueError):
+        next(generate_devices(1, timestamp_distribution="weekly"))
+
+
+async def test_seeded_devices_are_loaded_in_batches(memory_repo, monkeypatch):
+    batches = []
+
+    async def bulk_create_devices(docs):
+        batches.append(len(docs))
+        return await memory_repo.bulk_create_devices(docs)
+
+    monkeypatch.setattr(device_repo, "bulk_create_devices", bulk_create_devices, raising=False)
+    device_ids = await seed_devices(25, batch_size=10, random_seed=3)
+    assert batches == [10, 10, 5]
+    assert [device.id for device in await memory_repo.get_devices(device_ids)] == device_ids
@@ -0,0 +1,81 @@
+"""Tests for the shared-memory device log and its per-worker replicas."""
+from src.repositories.shared_memory import SharedDeviceLog
+
+
+def version(device_id: str, name: str, at: str) -> dict:
+    return {"id": device_id, "name": name, "assigned_to": None, "site": "default", "created_at": at, "updated_at": at}
+
+
+def put(log: SharedDeviceLog, doc: dict) -> None:
+    with log.write():
+        log.append({"op": "put", "doc": doc})
+
+
+def delete(log: SharedDeviceLog, device_id: str, at: str) -> None:
+    with log.write():
+        log.append({"op": "del", "id": device_id, "at": at})
+
+
+def compact(log: SharedDeviceLog, updates: int = 50) -> None:
+    # Enough superseded versions of one device for compaction to pay off
+    for i in range(updates):
+        put(log, version("busy", f"Busy-{i}", f"2024-02-01T00:00:{i:02d}"))
+    generation = log._generation
+    with log.write():
+        log._maybe_compact()
+    assert log._generation == generation + 1
+
+
+def test_workers_see_each_others_writes(tmp_path):
+    path = str(tmp_path / "devices.log")
+    first, second = SharedDeviceLog(path), SharedDeviceLog(path)
+    put(first, version("a", "Laptop-001", "2024-01-01T00:00:00"))
+    second.sync()
+    assert second.devices["a"]["name"] == "Laptop-001"
+    assert second.committed() == first.committed() == 1
+
+    put(second, dict(second.devices["a"], name="Laptop-002", updated_at="2024-01-02T00:00:00"))
+    first.sync()
+    assert first.devices["a"]["name"] == "Laptop-002"
+    assert [device_id for device_id in first.indexes.page("name", 0, 10)] == ["a"]
+
+
+def test_compaction_keeps_live_devices_and_history(tmp_path):
+    path = str(tmp_path / "devices.log")
+    first, second = SharedDeviceLog(path), SharedDeviceLog(path)
+    put(first, version("a", "Laptop-001", "2024-01-01T00:00:00"))
+    put(first, version("b", "Laptop-002", "2024-01-01T00:00:01"))
+    second.sync()
+
+    delete(first, "a", "2024-01-03T00:00:00")
+    compact(first)
+    second.sync()
+    assert sorted(second.devices) == sorted(first.devices) == ["b", "busy"]
+    # The delete happened while the other worker was not looking
+    assert second.history.history("a")[-1] == {"at": "2024-01-03T00:00:00", "op": "delete", "changes": {}}
+    assert second.history.device_at("a", "2024-01-02T00:00:00")["name"] == "Laptop-001"
+    assert second.history.device_at("a", "2024-01-03T00:00:00") is None
+    # Replaying the snapshot does not add versions for unchanged devices
+    assert len(second.history.history("b")) == 1
+
+    # A new worker starting from the snapshot only sees the live devices
+    third = SharedDeviceLog(path)
+    third.sync()
+    assert sorted(third.devices) == ["b", "busy"]
+    assert third.history.history("a") is None
+
+
+def test_deletes_missed_across_two_compactions_are_still_recorded(tmp_path):
+    path = str(tmp_path / "devices.log")
+    first, second = SharedDeviceLog(path), SharedDeviceLog(path)
+    put(first, version("a", "Laptop-001", "2024-01-01T00:00:00"))
+    second.sync()
+
+    delete(first, "a", "2024-01-03T00:00:00")
+    compact(first)
+    # The second snapshot no longer carries the tombstone
+    compact(first)
+    second.sync()
+    assert "a" not in second.devices
+    assert second.history.history("a")[-1]["op"] == "delete"
+    assert second.history.device_at("a", "9999") is None
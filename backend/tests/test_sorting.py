@@ -0,0 +1,76 @@
+"""Tests for listing sort orders and the in-process sorted indexes."""
+import random
+
+import pytest
+
+from src.repositories.sorting import SortedIndexes, order_by_clause, parse_sort
+
+
+def _doc(i: int, name: str) -> dict:
+    return {
+        "id": f"id-{i:04d}",
+        "name": name,
+        "created_at": f"2025-01-01T00:00:{i % 60:02d}",
+        "updated_at": f"2025-02-01T00:00:{(i * 7) % 60:02d}",
+    }
+
+
+def _expected(docs, sort):
+    field, descending = parse_sort(sort)
+    ordered = sorted(docs, key=lambda doc: (doc[field], doc["id"]), reverse=descending)
+    return [doc["id"] for doc in ordered]
+
+
+def test_parse_sort():
+    assert parse_sort("name") == ("name", False)
+    assert parse_sort("-updated_at") == ("updated_at", True)
+    with pytest.raises(ValueError):
+        parse_sort("assigned_to")
+
+
+def test_order_by_clause_breaks_ties_by_id():
+    assert order_by_clause("-name") == "ORDER BY c.name DESC, c.id DESC"
+
+
+@pytest.mark.parametrize("sort", ["name", "-name", "created_at", "-created_at", "updated_at", "-updated_at"])
+def test_pages_match_a_full_sort_after_writes(sort):
+    rng = random.Random(7)
+    docs = {i: _doc(i, rng.choice(["a", "b", "c"])) for i in range(200)}
+    indexes = SortedIndexes()
+    indexes.extend(list(docs.values())[:100])
+    for doc in list(docs.values())[100:]:
+        indexes.add(doc)
+    for i in rng.sample(range(200), 30):
+        indexes.remove(docs.pop(i))
+    for i in rng.sample(sorted(docs), 30):
+        new = dict(docs[i], name=rng.choice(["a", "d"]), updated_at="2025-03-01T00:00:00")
+        indexes.replace(docs[i], new)
+        docs[i] = new
+
+    expected = _expected(docs.values(), sort)
+    for skip, limit in [(0, 10), (25, 50), (160, 20), (500, 10)]:
+        assert indexes.page(sort, skip, limit) == expected[skip : skip + limit]
+
+
+def test_filtered_page_walks_the_index_in_order():
+    docs = [_doc(i, "x") for i in range(50)]
+    indexes = SortedIndexes()
+    indexes.rebuild(docs)
+    even = {doc["id"] for doc in docs[::2]}
+    expected = [device_id for device_id in _expected(docs, "-created_at") if device_id in even]
+    assert indexes.page("-created_at", 5, 10, lambda device_id: device_id in even) == expected[5:15]
+
+
+@pytest.mark.parametrize("sort", ["name", "-created_at", "updated_at"])
+def test_bulk_batches_are_merged_in_order(sort):
+    rng = random.Random(3)
+    docs = [_doc(i, rng.choice(["a", "b", "c"])) for i in range(300)]
+    rng.shuffle(docs)
+    indexes = SortedIndexes()
+    indexes.add(docs[0])
+    for start in range(1, 300, 50):
+        indexes.extend(docs[start : start + 50])
+    assert indexes.page(sort, 0, 300) == _expected(docs, sort)
+    # Writes after a bulk load see the merged devices
+    indexes.remove(docs[1])
+    assert indexes.page(sort, 0, 300) == _expected(docs[:1] + docs[2:], sort)
@@ -0,0 +1,69 @@
+"""Tests for lazy backend loading and application startup."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import src.repositories as device_repo
+from src import metrics
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Select a backend by name for one test, reloading it from the environment."""
+
+    def select(name):
+        monkeypatch.setenv("REPOSITORY_BACKEND", name)
+        device_repo.reset_backend()
+
+    yield select
+    device_repo.reset_backend()
+
+
+def test_importing_the_app_loads_no_backend():
+    code = (
+        "import sys, src.main; "
+        "print(sorted(m for m in sys.modules if m.startswith('azure') or m in "
+        "('src.repositories.in_memory', 'src.repositories.cosmos_repo', 'src.repositories.shared_memory')))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parents[1],
+        env={**os.environ, "TEST_MODE": "false", "REPOSITORY_BACKEND": "cosmos"},
+    )
+    # After the app's log lines
+    assert result.stdout.splitlines()[-1] == "[]"
+
+
+def test_selected_backend_is_imported_on_first_use(backend):
+    backend("memory")
+    assert device_repo.get_backend_name() == "memory"
+    from src.repositories import in_memory
+
+    assert device_repo.get_backend() is in_memory
+    # Hooks the backend defines are reachable through the package too
+    assert device_repo.warm_cache is in_memory.warm_cache
+
+
+def test_unknown_backend_is_rejected(backend):
+    backend("nosql")
+    with pytest.raises(ValueError, match="nosql"):
+        device_repo.get_backend()
+
+
+async def test_startup_seeds_test_data_and_records_its_duration(memory_repo, backend, monkeypatch):
+    from src.main import app, lifespan
+
+    backend("memory")
+    monkeypatch.setenv("TEST_MODE", "true")
+    monkeypatch.setenv("SEED_DEVICE_COUNT", "0")
+    monkeypatch.setenv("LOOP_MONITOR_ENABLED", "false")
+    async with lifespan(app):
+        assert len(await memory_repo.list_devices()) == 5
+        assert metrics.gauge("startup_lifespan_ms").value > 0
+        assert metrics.gauge("startup_import_ms").value > 0
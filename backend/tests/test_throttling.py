@@ -0,0 +1,124 @@
+"""Tests for the adaptive concurrency limiter and the 429-aware call policy."""
+import asyncio
+
+import pytest
+
+from src.db.throttling import AdaptiveConcurrencyLimiter, CosmosCallPolicy, CosmosThrottledError
+
+
+class Throttled(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after_ms=None):
+        super().__init__("throttled")
+        self.headers = {"x-ms-retry-after-ms": str(retry_after_ms)} if retry_after_ms is not None else {}
+
+
+def policy(limit=2, budget_ms=200, cooldown=0.0) -> CosmosCallPolicy:
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=limit, max_limit=limit * 4, cooldown=cooldown)
+    return CosmosCallPolicy(budget_ms=budget_ms, base_delay_ms=1, max_delay_ms=5, limiter=limiter)
+
+
+async def test_limiter_queues_callers_beyond_the_limit():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+    await limiter.acquire()
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    limiter.release(success=False)
+    await waiter
+    assert limiter.in_flight == 2
+
+
+async def test_limiter_grows_on_success_and_shrinks_on_throttle():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=8, cooldown=60)
+    for _ in range(8):
+        await limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 5
+
+    for _ in range(3):
+        await limiter.acquire()
+        limiter.release(throttled=True)
+    # One decrease per cooldown
+    assert limiter.limit == 3
+
+    before = limiter._limit
+    await limiter.acquire()
+    limiter.release(success=False)
+    assert limiter._limit == before
+    assert limiter.in_flight == 0
+
+
+async def test_cancelled_waiter_gives_up_its_place():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    limiter.release()
+    assert limiter.in_flight == 0
+
+
+async def test_cancelled_calls_release_their_slots():
+    calls = policy(limit=2)
+
+    async def hang():
+        await asyncio.sleep(60)
+
+    for _ in range(3):
+        task = asyncio.ensure_future(calls.call(hang))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert calls.limiter.in_flight == 0
+
+    async def ok():
+        return "ok"
+
+    assert await calls.call(ok) == "ok"
+
+
+async def test_throttled_call_is_retried():
+    calls = policy()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise Throttled(retry_after_ms=1)
+        return "ok"
+
+    assert await calls.call(flaky) == "ok"
+    assert len(attempts) == 3
+    assert calls.limiter.in_flight == 0
+
+
+async def test_exhausted_budget_raises_throttled_error():
+    calls = policy(budget_ms=50)
+
+    async def always_throttled():
+        raise Throttled(retry_after_ms=100)
+
+    with pytest.raises(CosmosThrottledError) as raised:
+        await calls.call(always_throttled)
+    assert raised.value.retry_after_header == "1"
+    assert calls.limiter.in_flight == 0
+
+
+async def test_other_errors_are_raised_without_retrying():
+    calls = policy()
+    attempts = []
+
+    async def broken():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        await calls.call(broken)
+    assert len(attempts) == 1
+    assert calls.limiter.in_flight == 0
@@ -0,0 +1,99 @@
+"""Tests for request tracing and span export."""
+import asyncio
+import json
+
+import pytest
+
+from src import tracing
+from src.middleware.tracing import TracingMiddleware
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def spans(tmp_path):
+    """Trace every request to a JSON lines file; returns a function reading the exported spans."""
+    path = tmp_path / "traces.jsonl"
+    tracing.configure_tracing(
+        dict(tracing.get_tracing_config(), enabled=True, sample_rate=1.0, file=str(path), export_interval_ms=10)
+    )
+
+    def exported():
+        tracing.stop_tracing()
+        return [json.loads(line) for line in path.read_text().splitlines()]
+
+    yield exported
+    tracing.stop_tracing()
+
+
+def test_traceparent_headers_are_validated():
+    assert tracing.parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (TRACE_ID, PARENT_ID, True)
+    assert tracing.parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-00")[2] is False
+    assert tracing.parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+    assert tracing.parse_traceparent("garbage") is None
+    assert tracing.parse_traceparent(None) is None
+
+
+def test_sampling_follows_the_parent_or_the_trace_id():
+    sampler = tracing.Sampler(0.5)
+    assert sampler.should_sample(TRACE_ID, parent_sampled=False) is False
+    assert tracing.Sampler(0.5, respect_parent=False).should_sample("0" * 32, parent_sampled=False) is True
+    # Decided by the low 64 bits of the trace ID, the same in every service
+    assert sampler.should_sample("f" * 16 + "0" * 16) is True
+    assert sampler.should_sample("0" * 16 + "f" * 16) is False
+
+
+async def test_spans_are_no_ops_without_a_trace():
+    assert tracing.span("work") is tracing.span("other")
+    assert tracing.start_trace("GET /devices") is None
+
+
+async def test_child_spans_follow_the_request_into_tasks(spans):
+    @tracing.traced("repository.get_device", backend="memory")
+    async def get_device():
+        with tracing.span("query"):
+            await asyncio.sleep(0)
+
+    root = tracing.start_trace("GET /devices/{id}", f"00-{TRACE_ID}-{PARENT_ID}-01")
+    token = tracing.activate(root)
+    try:
+        await asyncio.gather(get_device(), asyncio.create_task(get_device()))
+    finally:
+        tracing.deactivate(token)
+        root.end()
+
+    exported = spans()
+    by_id = {span["span_id"]: span for span in exported}
+    assert {span["trace_id"] for span in exported} == {TRACE_ID}
+    assert by_id[root.span_id]["parent_id"] == PARENT_ID
+    repository = [span for span in exported if span["name"] == "repository.get_device"]
+    assert [span["parent_id"] for span in repository] == [root.span_id, root.span_id]
+    assert repository[0]["attributes"] == {"backend": "memory"}
+    assert sorted(by_id[span["parent_id"]]["name"] for span in exported if span["name"] == "query") == [
+        "repository.get_device", "repository.get_device"
+    ]
+
+
+async def test_middleware_returns_the_trace_id_and_records_errors(spans):
+    async def app(scope, receive, send):
+        if scope["path"] == "/fail":
+            raise RuntimeError("boom")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = TracingMiddleware(app)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/devices", "headers": [(b"traceparent", f"00-{TRACE_ID}-{PARENT_ID}-01".encode())]}
+    await middleware(scope, None, send)
+    with pytest.raises(RuntimeError):
+        await middleware(dict(scope, path="/fail", headers=[]), None, send)
+
+    assert dict(sent[0]["headers"])[b"x-trace-id"] == TRACE_ID.encode()
+    ok, failed = spans()
+    assert (ok["name"], ok["trace_id"], ok["attributes"]["http.response.status_code"]) == ("GET /devices", TRACE_ID, 200)
+    assert failed["error"] == "RuntimeError: boom"
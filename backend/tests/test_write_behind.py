@@ -0,0 +1,86 @@
+"""Tests for write-behind coalescing of updates."""
+import asyncio
+
+import pytest
+
+from src.repositories.write_behind import WriteBehindBuffer
+
+
+class Store:
+    def __init__(self, latency_s: float = 0.0, failures: int = 0):
+        self.writes = []
+        self.latency_s = latency_s
+        self.failures = failures
+
+    async def __call__(self, doc):
+        await asyncio.sleep(self.latency_s)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("write failed")
+        self.writes.append(dict(doc))
+        return doc
+
+
+async def test_updates_within_the_window_are_written_once():
+    store = Store()
+    buffer = WriteBehindBuffer(store, window_ms=10)
+    base = {"id": "a", "name": "old", "site": "x"}
+    results = await asyncio.gather(
+        buffer.stage("a", base, {"name": "new"}),
+        buffer.stage("a", base, {"site": "y"}),
+    )
+    assert results == [
+        {"id": "a", "name": "new", "site": "x"},
+        {"id": "a", "name": "new", "site": "y"},
+    ]
+    assert store.writes == [{"id": "a", "name": "new", "site": "y"}]
+    assert buffer.get("a") is None
+
+
+async def test_reads_see_the_buffered_document():
+    store = Store()
+    buffer = WriteBehindBuffer(store, window_ms=1000, ack="buffered")
+    await buffer.stage("a", {"id": "a", "name": "old"}, {"name": "new"})
+    assert store.writes == []
+    assert buffer.get("a") == {"id": "a", "name": "new"}
+    assert buffer.buffered() == {"a": {"id": "a", "name": "new"}}
+    await buffer.flush()
+    assert store.writes == [{"id": "a", "name": "new"}]
+
+
+async def test_durable_update_raises_when_the_write_fails():
+    buffer = WriteBehindBuffer(Store(failures=1), window_ms=1)
+    with pytest.raises(RuntimeError):
+        await buffer.stage("a", {"id": "a"}, {"name": "new"})
+
+
+async def test_failed_buffered_write_is_retried():
+    store = Store(failures=1)
+    buffer = WriteBehindBuffer(store, window_ms=1, ack="buffered", max_attempts=3)
+    await buffer.stage("a", {"id": "a"}, {"name": "new"})
+    await asyncio.sleep(0.05)
+    assert store.writes == [{"id": "a", "name": "new"}]
+
+
+async def test_update_during_a_write_builds_on_it():
+    store = Store(latency_s=0.02)
+    buffer = WriteBehindBuffer(store, window_ms=1, ack="buffered")
+    await buffer.stage("a", {"id": "a", "name": "old", "site": "x"}, {"name": "new"})
+    await asyncio.sleep(0.01)
+    # Base is stale; the in-flight document is used instead
+    await buffer.stage("a", {"id": "a", "name": "old", "site": "x"}, {"site": "y"})
+    await buffer.flush()
+    assert store.writes == [
+        {"id": "a", "name": "new", "site": "x"},
+        {"id": "a", "name": "new", "site": "y"},
+    ]
+
+
+async def test_discard_drops_the_pending_update():
+    store = Store()
+    buffer = WriteBehindBuffer(store, window_ms=1000, ack="buffered")
+    await buffer.stage("a", {"id": "a"}, {"name": "new"})
+    await buffer.discard("a")
+    await buffer.flush()
+    assert store.writes == []
+    assert buffer.get("a") is None
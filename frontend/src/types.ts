@@ -2,6 +2,7 @@ export interface Device {
   id: string
   name: string
   assigned_to: string | null
+  site: string
   created_at: string
   updated_at: string
 }
@@ -9,4 +10,5 @@ export interface Device {
 export interface DeviceCreate {
   name: string
   assigned_to: string | null
+  site?: string
 }